@@ -4,14 +4,41 @@
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from app.models.chat import ChatRequest, ChatResponse, Message
 from app.prompts import get_system_prompt
-from app.core.llm_client import llm_client
+from app.core.llm_client import llm_client, llm_deadline, CircuitOpenError, LLMDeadlineExceeded
 from app.core.config import settings
+from app.core.sse import sse_event, sse_response
 
 router = APIRouter()
 
 
+def build_chat_messages(request: ChatRequest) -> list[Message]:
+    """
+    构建发送给 LLM 的消息列表
+
+    Raises:
+        ValueError: 模式不存在时
+    """
+    # 1. 获取对应模式的 system prompt
+    system_prompt = get_system_prompt(request.mode)
+
+    # 2. 构建消息列表
+    messages = [Message(role="system", content=system_prompt)]
+
+    # 3. 添加历史对话(如果有)
+    if request.history:
+        # 只保留最近的 10 条对话,避免上下文过长
+        recent_history = request.history[-10:]
+        messages.extend(recent_history)
+
+    # 4. 添加当前用户消息
+    messages.append(Message(role="user", content=request.message))
+
+    return messages
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest) -> ChatResponse:
     """
@@ -29,25 +56,15 @@ async def chat(request: ChatRequest) -> ChatResponse:
         HTTPException: 当模式不支持或处理出错时
     """
     try:
-        # 1. 获取对应模式的 system prompt
-        system_prompt = get_system_prompt(request.mode)
-
-        # 2. 构建消息列表
-        messages = [Message(role="system", content=system_prompt)]
+        # 1. 构建消息列表（system prompt + 历史 + 当前消息）
+        messages = build_chat_messages(request)
+        system_prompt = messages[0].content
 
-        # 3. 添加历史对话(如果有)
-        if request.history:
-            # 只保留最近的 10 条对话,避免上下文过长
-            recent_history = request.history[-10:]
-            messages.extend(recent_history)
+        # 2. 调用 LLM 获取回复
+        with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+            reply = await llm_client.call_llm(messages)
 
-        # 4. 添加当前用户消息
-        messages.append(Message(role="user", content=request.message))
-
-        # 5. 调用 LLM 获取回复
-        reply = await llm_client.call_llm(messages)
-
-        # 6. 构建响应
+        # 3. 构建响应
         response = ChatResponse(
             reply=reply,
             mode=request.mode,
@@ -59,17 +76,64 @@ async def chat(request: ChatRequest) -> ChatResponse:
     except ValueError as e:
         # 模式不存在
         raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError as e:
+        # 后端熔断中，提示客户端稍后重试
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         # 其他错误
         raise HTTPException(status_code=500, detail=f"处理请求时出错: {str(e)}")
 
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    流式聊天接口（Server-Sent Events）
+
+    事件:
+        token: {"content": 新生成的文本片段}
+        done: {"reply": 完整回复, "mode": 当前模式}
+        error: {"detail": 错误信息}
+    """
+    try:
+        messages = build_chat_messages(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        reply = ""
+        async for chunk in llm_client.call_llm_stream(messages, timeout=settings.LLM_DEADLINE_INTERACTIVE):
+            reply += chunk
+            yield sse_event("token", {"content": chunk})
+        yield sse_event("done", {"reply": reply, "mode": request.mode})
+
+    return sse_response(events())
+
+
 @router.get("/health")
 async def health_check():
-    """健康检查接口"""
-    return {
-        "status": "ok",
+    """
+    健康检查接口
+
+    当前使用的 LLM 后端不可用（熔断或 Ollama 节点全部下线）时返回 503，
+    便于负载均衡器摘除该实例
+    """
+    llm_health = llm_client.health()
+    healthy = llm_health["healthy"]
+
+    body = {
+        "status": "ok" if healthy else "degraded",
         "app_name": settings.APP_NAME,
         "version": settings.APP_VERSION,
         "use_mock_llm": settings.USE_MOCK_LLM,
+        "llm_backend": llm_client.backend,
+        "llm": llm_health,
     }
+    if not healthy:
+        return JSONResponse(status_code=503, content=body)
+    return body
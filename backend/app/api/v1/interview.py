@@ -3,15 +3,25 @@ AI 面试对话 API
 支持多轮语音对话和最终评价
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 from typing import List, Optional
 from app.models.chat import Message
+from app.models.audio import TranscriptionResult
 from app.models.user_profile import PracticeRecord, PracticeType
 from app.prompts import get_system_prompt
-from app.core.llm_client import llm_client, transcribe_audio, synthesize_speech
+from app.core.llm_client import (
+    llm_client, transcribe_audio_result, synthesize_speech,
+    llm_deadline, CircuitOpenError, LLMDeadlineExceeded
+)
+from app.core.asr import ASRBusyError, StreamingTranscriber
+from app.core.audio import AudioDecodeError, StreamingDecoder, decode_audio, pcm16_to_float32, float32_to_wav
+from app.core.config import settings
 from app.core.auth_utils import get_current_user_id
+from app.core.sse import sse_event, sse_response
 from app.services.user_profile_service import user_profile_service
+import asyncio
+import json
 import logging
 import uuid
 from datetime import datetime
@@ -82,7 +92,8 @@ async def start_interview(
             Message(role="user", content=f"我来面试 {request.position} 岗位，请开始。")
         ]
 
-        first_question = await llm_client.call_llm(messages)
+        with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+            first_question = await llm_client.call_llm(messages, session_id=session_id)
 
         # 存储会话
         interview_sessions[session_id] = {
@@ -90,7 +101,8 @@ async def start_interview(
             "messages": messages + [Message(role="assistant", content=first_question)],
             "question_count": 1,
             "user_id": user_id,  # 保存用户ID
-            "all_answers": []  # 保存所有回答用于最后分析
+            "all_answers": [],  # 保存所有回答用于最后分析
+            "speech_metrics": {}  # 语音回答的语速统计（问题序号 -> SpeechMetrics）
         }
 
         logger.info(f"面试开始: session={session_id}, position={request.position}, user={user_id or 'anonymous'}")
@@ -100,50 +112,22 @@ async def start_interview(
             first_question=first_question
         )
 
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"开始面试失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"开始面试失败: {str(e)}")
 
 
-@router.post("/interview/answer", response_model=InterviewAnswerResponse)
-async def submit_answer(request: InterviewAnswerRequest):
-    """
-    提交用户回答，获取 AI 的下一个问题或最终评价
-    """
-    try:
-        # 获取会话
-        session = interview_sessions.get(request.session_id)
-        if not session:
-            raise HTTPException(status_code=404, detail="会话不存在")
-
-        # 处理用户回答（如果是音频，先转文字）
-        user_answer = request.text_answer
-        if not user_answer and request.audio_data:
-            # TODO: 将 base64 音频转为 bytes，然后调用 ASR
-            # audio_bytes = base64.b64decode(request.audio_data)
-            # user_answer = await transcribe_audio(audio_bytes)
-            raise HTTPException(status_code=400, detail="音频回答功能开发中，请使用文字回答")
-
-        if not user_answer:
-            raise HTTPException(status_code=400, detail="请提供回答内容")
-
-        logger.info(f"收到回答: session={request.session_id}, answer={user_answer[:50]}...")
-
-        # 添加用户消息到历史
-        session["messages"].append(Message(role="user", content=user_answer))
-
-        # 保存回答用于最后分析
-        session["all_answers"].append(user_answer)
-
-        # 判断是否继续提问还是结束
-        # question_count 表示当前已问的问题数（包括刚回答的这个）
-        question_count = session["question_count"]
-        max_questions = 4  # 共 4 个问题
-
-        # 用户回答完第 4 个问题后才结束
-        if question_count >= max_questions:
-            # 面试结束，生成总评
-            final_system_prompt = """面试已结束。你现在是面试教练，要给候选人总体评价。
+# 面试结束时附在最后一条回答后面，让 AI 只给总评、不再提问
+# （不替换开头的 system prompt，保持消息前缀不变，Ollama 可以复用已计算的上下文）
+FINAL_FEEDBACK_PROMPT = """面试已结束。你现在是面试教练，要给候选人总体评价。
 
 【最重要的规则】绝对禁止再问任何问题！不能有问号！不能有"你觉得呢"、"怎么样"、"想不想"这类疑问句！
 
@@ -167,46 +151,129 @@ async def submit_answer(request: InterviewAnswerRequest):
 - 不要用问号！
 - 只给评价、示范、鼓励！
 - 用口语表达，这会被语音播放！"""
-            session["messages"][0] = Message(role="system", content=final_system_prompt)
-            final_feedback = await llm_client.call_llm(session["messages"])
 
-            # 如果用户已登录，保存面试记录
-            user_id = session.get("user_id")
-            if user_id:
-                try:
-                    # 计算总字数
-                    all_text = " ".join(session["all_answers"])
-                    word_count = len(all_text)
-
-                    # 简单评分（基于反馈内容，这里给一个估算分数）
-                    # 实际可以让AI返回结构化评分
-                    overall_score = 75  # 默认75分，后续可以改进为AI打分
-
-                    # 创建练习记录
-                    record = PracticeRecord(
-                        id=str(uuid.uuid4()),
-                        user_id=user_id,
-                        practice_type=PracticeType.INTERVIEW,
-                        timestamp=datetime.utcnow(),
-                        transcript=all_text,
-                        word_count=word_count,
-                        overall_score=overall_score,
-                        strengths=[],  # 可以从final_feedback中提取
-                        improvements=[],  # 可以从final_feedback中提取
-                        metadata={
-                            "position": session["position"],
-                            "question_count": question_count
-                        }
-                    )
-
-                    # 保存到用户档案
-                    user_profile_service.add_practice_record(user_id, record)
-                    logger.info(f"已保存用户面试记录: user={user_id}")
-
-                except Exception as e:
-                    logger.error(f"保存用户记录失败: {str(e)}", exc_info=True)
-
-            logger.info(f"面试结束: session={request.session_id}")
+# 共 4 个问题
+MAX_QUESTIONS = 4
+
+
+def accept_answer(request: InterviewAnswerRequest) -> tuple[dict, bool]:
+    """
+    校验并记录用户回答
+
+    Args:
+        request: 用户回答请求
+
+    Returns:
+        (会话数据, 是否应该结束面试)
+
+    Raises:
+        HTTPException: 会话不存在或回答为空时
+    """
+    # 获取会话
+    session = interview_sessions.get(request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="会话不存在")
+
+    # 处理用户回答（如果是音频，先转文字）
+    user_answer = request.text_answer
+    if not user_answer and request.audio_data:
+        # TODO: 将 base64 音频转为 bytes，然后调用 ASR
+        # audio_bytes = base64.b64decode(request.audio_data)
+        # user_answer = await transcribe_audio(audio_bytes)
+        raise HTTPException(status_code=400, detail="音频回答功能开发中，请使用文字回答")
+
+    if not user_answer:
+        raise HTTPException(status_code=400, detail="请提供回答内容")
+
+    logger.info(f"收到回答: session={request.session_id}, answer={user_answer[:50]}...")
+
+    # 判断是否继续提问还是结束
+    # question_count 表示当前已问的问题数（包括刚回答的这个）
+    # 用户回答完第 4 个问题后才结束
+    is_final = session["question_count"] >= MAX_QUESTIONS
+
+    # 添加用户消息到历史（只在末尾追加，之前的消息保持不变）
+    content = f"{user_answer}\n\n{FINAL_FEEDBACK_PROMPT}" if is_final else user_answer
+    session["messages"].append(Message(role="user", content=content))
+
+    # 保存回答用于最后分析
+    session["all_answers"].append(user_answer)
+
+    return session, is_final
+
+
+def record_next_question(session: dict, next_question: str):
+    """把 AI 的下一个问题写入会话历史"""
+    session["messages"].append(Message(role="assistant", content=next_question))
+    session["question_count"] += 1
+
+
+def finish_interview(session_id: str, session: dict):
+    """面试结束：如果用户已登录，保存面试记录"""
+    question_count = session["question_count"]
+
+    user_id = session.get("user_id")
+    if user_id:
+        try:
+            # 计算总字数
+            all_text = " ".join(session["all_answers"])
+            word_count = len(all_text)
+
+            # 所有回答都是语音时才有说话时长（混入文字回答会让语速失真）
+            speech_metrics = list(session.get("speech_metrics", {}).values())
+            duration = None
+            if speech_metrics and len(speech_metrics) >= len(session["all_answers"]):
+                duration = sum(m.duration for m in speech_metrics)
+
+            # 简单评分（基于反馈内容，这里给一个估算分数）
+            # 实际可以让AI返回结构化评分
+            overall_score = 75  # 默认75分，后续可以改进为AI打分
+
+            # 创建练习记录
+            record = PracticeRecord(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                practice_type=PracticeType.INTERVIEW,
+                timestamp=datetime.utcnow(),
+                transcript=all_text,
+                duration=duration,
+                word_count=word_count,
+                overall_score=overall_score,
+                strengths=[],  # 可以从final_feedback中提取
+                improvements=[],  # 可以从final_feedback中提取
+                metadata={
+                    "position": session["position"],
+                    "question_count": question_count,
+                    "speech_metrics": [m.model_dump() for m in speech_metrics]
+                }
+            )
+
+            # 保存到用户档案
+            user_profile_service.add_practice_record(user_id, record)
+            logger.info(f"已保存用户面试记录: user={user_id}")
+
+        except Exception as e:
+            logger.error(f"保存用户记录失败: {str(e)}", exc_info=True)
+
+    llm_client.router.release_session(session_id)
+    logger.info(f"面试结束: session={session_id}")
+
+
+@router.post("/interview/answer", response_model=InterviewAnswerResponse)
+async def submit_answer(request: InterviewAnswerRequest):
+    """
+    提交用户回答，获取 AI 的下一个问题或最终评价
+    """
+    try:
+        session, is_final = accept_answer(request)
+
+        if is_final:
+            # 面试结束，生成总评
+            with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+                final_feedback = await llm_client.call_llm(
+                    session["messages"], session_id=request.session_id
+                )
+            finish_interview(request.session_id, session)
 
             return InterviewAnswerResponse(
                 is_finished=True,
@@ -214,9 +281,11 @@ async def submit_answer(request: InterviewAnswerRequest):
             )
         else:
             # 继续提问
-            next_question = await llm_client.call_llm(session["messages"])
-            session["messages"].append(Message(role="assistant", content=next_question))
-            session["question_count"] += 1
+            with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+                next_question = await llm_client.call_llm(
+                    session["messages"], session_id=request.session_id
+                )
+            record_next_question(session, next_question)
 
             return InterviewAnswerResponse(
                 next_question=next_question,
@@ -225,11 +294,53 @@ async def submit_answer(request: InterviewAnswerRequest):
 
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"处理回答失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
 
 
+@router.post("/interview/answer/stream")
+async def submit_answer_stream(request: InterviewAnswerRequest):
+    """
+    流式提交用户回答（Server-Sent Events）
+
+    事件:
+        token: {"content": 新生成的文本片段}
+        done: 与 InterviewAnswerResponse 相同的结构
+        error: {"detail": 错误信息}
+    """
+    session, is_final = accept_answer(request)
+
+    async def events():
+        reply = ""
+        async for chunk in llm_client.call_llm_stream(
+            session["messages"],
+            session_id=request.session_id,
+            timeout=settings.LLM_DEADLINE_INTERACTIVE
+        ):
+            reply += chunk
+            yield sse_event("token", {"content": chunk})
+
+        if is_final:
+            finish_interview(request.session_id, session)
+            result = InterviewAnswerResponse(is_finished=True, final_feedback=reply)
+        else:
+            record_next_question(session, reply)
+            result = InterviewAnswerResponse(next_question=reply, is_finished=False)
+
+        yield sse_event("done", result.model_dump())
+
+    return sse_response(events())
+
+
 @router.get("/interview/session/{session_id}")
 async def get_session_info(session_id: str):
     """获取会话信息（调试用）"""
@@ -245,6 +356,12 @@ async def get_session_info(session_id: str):
     }
 
 
+def record_speech_metrics(session: dict, result: TranscriptionResult):
+    """记录当前问题语音回答的语速统计（重新录音时覆盖）"""
+    if result.metrics:
+        session.setdefault("speech_metrics", {})[session["question_count"]] = result.metrics
+
+
 @router.post("/interview/answer/audio")
 async def submit_audio_answer(
     file: UploadFile = File(..., description="录制的音频文件"),
@@ -268,18 +385,164 @@ async def submit_audio_answer(
 
         logger.info(f"收到面试音频: session={session_id}, 大小={file_size_mb:.2f}MB")
 
-        # 调用 ASR 转写
-        transcript = await transcribe_audio(audio_content, file.filename or "audio.webm")
+        # 调用 ASR 转写（同时得到语速和停顿统计）
+        result = await transcribe_audio_result(
+            audio_content, file.filename or "audio.webm", settings.ASR_PROFILE_INTERVIEW
+        )
+        transcript = result.text
+        record_speech_metrics(session, result)
 
         logger.info(f"转写成功: {transcript[:50]}...")
 
         return {
             "transcript": transcript,
-            "session_id": session_id
+            "session_id": session_id,
+            "speech_metrics": result.metrics
         }
 
     except HTTPException:
         raise
+    except ASRBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
     except Exception as e:
         logger.error(f"音频转写失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"音频处理失败: {str(e)}")
+
+
+@router.websocket("/interview/answer/ws")
+async def stream_audio_answer(websocket: WebSocket, session_id: str, format: str = "pcm16"):
+    """
+    边说边转写（WebSocket）
+
+    查询参数:
+        session_id: 面试会话ID
+        format: pcm16（默认，16kHz 单声道 16 位小端 PCM，浏览器用 AudioWorklet 采集）
+                或容器格式如 webm（MediaRecorder 分片，边收边增量解码）
+
+    客户端发送:
+        二进制消息: 音频数据
+        文本消息 {"type": "end"}: 回答结束
+
+    服务端发送:
+        {"type": "partial", "transcript": "..."}  说话过程中的临时结果（可能被后续结果修正）
+        {"type": "final", "transcript": "...", "session_id": "...", "speech_metrics": {...}}  最终结果（含语速统计），随后关闭连接
+        {"type": "error", "detail": "...", "retry_after": 秒}  出错，随后关闭连接
+
+    与 /interview/answer/audio 一样只返回转写结果，前端拿到 final 后再调用 /interview/answer。
+    本地 Whisper 模式下对未固定的滚动窗口做增量识别，停止说话后只需要识别最后一小段；
+    其他模式下收完音频后整体识别一次
+    """
+    await websocket.accept()
+
+    if session_id not in interview_sessions:
+        await websocket.send_json({"type": "error", "detail": "会话不存在"})
+        await websocket.close(code=4404)
+        return
+
+    is_pcm = format == "pcm16"
+    incremental = llm_client.use_opensource and not llm_client.use_mock
+    transcriber = StreamingTranscriber()
+    received = bytearray()  # 容器格式：已收到的全部数据；pcm16：不足一个采样的剩余字节
+    # 容器格式：增量解码，新分片只解码一次
+    decoder = StreamingDecoder() if incremental and not is_pcm else None
+    partial_task: Optional[asyncio.Task] = None
+
+    async def send_partial():
+        try:
+            text = await transcriber.partial()
+        except ASRBusyError:
+            return  # 临时结果可以跳过，最终识别时再处理
+        if text is not None:
+            await websocket.send_json({"type": "partial", "transcript": text})
+
+    async def send_error(detail: str, code: int, retry_after: Optional[int] = None):
+        """发送错误并关闭连接（客户端可能已经断开）"""
+        payload = {"type": "error", "detail": detail}
+        if retry_after is not None:
+            payload["retry_after"] = retry_after
+        try:
+            await websocket.send_json(payload)
+            await websocket.close(code=code)
+        except (WebSocketDisconnect, RuntimeError):
+            logger.info(f"实时转写连接已断开，无法发送错误: session={session_id}")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes"):
+                received.extend(message["bytes"])
+                if is_pcm:
+                    usable = len(received) - len(received) % 2
+                    transcriber.append(pcm16_to_float32(bytes(received[:usable])))
+                    del received[:usable]
+                elif decoder is not None:
+                    decoder.feed(message["bytes"])
+                    transcriber.append(decoder.take())
+
+                # 同一时间只进行一次临时识别，识别期间继续接收音频
+                if incremental and transcriber.ready() and (partial_task is None or partial_task.done()):
+                    partial_task = asyncio.create_task(send_partial())
+
+            elif message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    command = {}
+                if command.get("type") == "end":
+                    break
+
+        if partial_task is not None:
+            await partial_task
+
+        if incremental:
+            if decoder is not None:
+                try:
+                    transcriber.append(await decoder.finish())
+                except AudioDecodeError as e:
+                    # 增量解码失败（如未安装 PyAV）：整体解码一次，补上缺少的部分
+                    logger.warning(f"增量解码失败，改为整体解码: {str(e)}")
+                    audio = await decode_audio(bytes(received))
+                    transcriber.append(audio[len(transcriber.audio):])
+            result = await transcriber.finish()
+        elif is_pcm:
+            result = await transcribe_audio_result(
+                float32_to_wav(transcriber.audio), "audio.wav", settings.ASR_PROFILE_INTERVIEW
+            )
+        else:
+            result = await transcribe_audio_result(
+                bytes(received), f"audio.{format}", settings.ASR_PROFILE_INTERVIEW
+            )
+
+        session = interview_sessions.get(session_id)
+        if session:
+            record_speech_metrics(session, result)
+
+        transcript = result.text
+        logger.info(f"实时转写完成: session={session_id}, 时长={transcriber.duration:.1f}s, {transcript[:50]}...")
+        await websocket.send_json({
+            "type": "final",
+            "transcript": transcript,
+            "session_id": session_id,
+            "speech_metrics": result.metrics.model_dump() if result.metrics else None
+        })
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info(f"实时转写连接断开: session={session_id}")
+    except ASRBusyError as e:
+        await send_error(str(e), 1013, retry_after=max(1, int(e.retry_after)))
+    except Exception as e:
+        logger.error(f"实时转写失败: {str(e)}", exc_info=True)
+        await send_error(f"音频处理失败: {str(e)}", 1011)
+    finally:
+        if partial_task is not None and not partial_task.done():
+            partial_task.cancel()
+        if decoder is not None:
+            decoder.close()
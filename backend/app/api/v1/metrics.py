@@ -0,0 +1,42 @@
+"""
+运行指标 API
+汇总 LLM 调度等内部组件的指标，便于观察排队和延迟
+"""
+
+from fastapi import APIRouter
+from app.core.llm_client import llm_client
+from app.core.asr import asr_pool, decode_stats, transcription_cache, whisper_models
+from app.core.tts import tts_cache, tts_stats
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    获取运行指标
+
+    Returns:
+        llm_scheduler: 每个后端的并发上限、在途请求数、各优先级排队数和等待时间
+        llm_cache: LLM 回复缓存（内存 / 磁盘）的命中统计
+        llm_router: 每个 Ollama 节点的健康状态、在途请求数、prompt 计算量和熔断状态
+        singleflight: LLM / ASR / TTS / Vision 相同请求的合并次数
+        asr_models: 已加载的 Whisper 模型、加载耗时和进程常驻内存
+        asr_pool: 识别执行器的并发数、排队数、拒绝次数、排队和解码耗时
+        asr_cache: 识别结果缓存的容量和命中率
+        asr_profiles: 各解码配置的延迟和实时率（RTF）
+        tts_cache: 合成音频缓存的容量和命中率
+        tts_formats: 各输出格式的请求数、平均体积和合成耗时
+    """
+    return {
+        "llm_scheduler": llm_client.scheduler.snapshot(),
+        "llm_cache": llm_client.cache.snapshot(),
+        "llm_router": llm_client.router.snapshot(),
+        "singleflight": llm_client.singleflight.snapshot(),
+        "asr_models": whisper_models.snapshot(),
+        "asr_pool": asr_pool.snapshot(),
+        "asr_cache": transcription_cache.snapshot(),
+        "asr_profiles": decode_stats.snapshot(),
+        "tts_cache": tts_cache.snapshot(),
+        "tts_formats": tts_stats.snapshot(),
+    }
@@ -4,22 +4,26 @@ PPT 演讲练习相关 API
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header
 from fastapi.staticfiles import StaticFiles
-from app.models.ppt import PPTUploadResponse, SlideContent, SlideAnalysisRequest, SlideAnalysisResponse, VideoAnalysisResponse
+from app.models.ppt import PPTUploadResponse, SlideContent, SlideAnalysisRequest, SlideAnalysisResponse, SlideDemoScriptResponse, VideoAnalysisResponse
 from app.models.user_profile import PracticeRecord, PracticeType
-from app.core.llm_client import llm_client, analyze_slide_with_vision, synthesize_speech, generate_slide_demo_script, transcribe_audio
+from app.core.llm_client import llm_client, analyze_slide_with_vision, synthesize_speech, generate_slide_demo_scripts, transcribe_audio_segments, LLMPriority, llm_deadline
 from app.models.chat import Message
+from app.core.asr import ASRBusyError
+from app.core.audio import SAMPLE_RATE, AudioDecodeError, decode_audio
 from app.core.config import settings
 from app.core.auth_utils import get_current_user_id
 from app.services.ppt_processor import PPTProcessor, get_file_type
 from app.services.user_profile_service import user_profile_service
+from app.services.demo_script_service import demo_script_service, fallback_demo_script
+from app.services.demo_audio_service import demo_audio_service
 from typing import List, Optional
 from pathlib import Path
 from datetime import datetime
+import asyncio
 import uuid
 import os
 import shutil
 import logging
-import subprocess
 import tempfile
 
 logger = logging.getLogger(__name__)
@@ -31,7 +35,11 @@ ppt_storage = {}
 
 
 @router.post("/upload", response_model=PPTUploadResponse)
-async def upload_ppt(file: UploadFile = File(...)):
+async def upload_ppt(
+    file: UploadFile = File(...),
+    lazy_demo: Optional[bool] = None,
+    prerender_audio: Optional[bool] = None
+):
     """
     上传 PPT 文件并解析为图片
 
@@ -39,7 +47,20 @@ async def upload_ppt(file: UploadFile = File(...)):
     - 支持 PDF、PPT、PPTX 格式
     - 将每页转换为 PNG 图片
     - 提取文本内容
+    - 生成每页的 AI 示范讲解话术
+
+    Args:
+        lazy_demo: 为 True 时渲染完成后立即返回（demo_script 为空），示范话术在后台生成，
+                   通过 GET /{presentation_id}/slides/{slide_number}/demo-script 获取；
+                   默认使用 DEMO_SCRIPTS_LAZY 配置
+        prerender_audio: 为 True 时话术生成后在后台按页序合成示范语音，保存在幻灯片图片旁边，
+                         合成完成的页面 audio_url 不为空，POST /generate-demo-speech 直接返回；
+                         默认使用 DEMO_AUDIO_PRERENDER 配置
     """
+    if lazy_demo is None:
+        lazy_demo = settings.DEMO_SCRIPTS_LAZY
+    if prerender_audio is None:
+        prerender_audio = settings.DEMO_AUDIO_PRERENDER
 
     # 验证文件类型
     allowed_types = [
@@ -99,41 +120,11 @@ async def upload_ppt(file: UploadFile = File(...)):
                 text_content=text_content
             ))
 
-        # 为每一页生成 AI 示范讲解话术（并行生成以提高速度）
-        logger.info(f"开始为 {len(slides)} 页幻灯片生成示范讲解（并行处理）...")
-
-        async def generate_demo_for_slide(slide: SlideContent) -> tuple[int, str]:
-            """为单个幻灯片生成示范讲解"""
-            try:
-                slide_image_path = static_dir / f"slide_{slide.slide_number}.png"
-                demo_script = await generate_slide_demo_script(
-                    slide_number=slide.slide_number,
-                    slide_text=slide.text_content,
-                    slide_image_path=str(slide_image_path) if slide_image_path.exists() else None
-                )
-                logger.info(f"第 {slide.slide_number} 页示范生成完成: {len(demo_script)} 字符")
-                return (slide.slide_number, demo_script)
-            except Exception as e:
-                logger.error(f"第 {slide.slide_number} 页示范生成失败: {str(e)}")
-                # 生成失败时使用简单示范
-                fallback = f"大家好，请看第 {slide.slide_number} 页。{slide.text_content[:100] if slide.text_content else '这页展示了重要内容'}。"
-                return (slide.slide_number, fallback)
-
-        # 并行生成所有页面的示范讲解
-        import asyncio
-        import time
-        start_time = time.time()
-        demo_results = await asyncio.gather(*[generate_demo_for_slide(slide) for slide in slides])
-        end_time = time.time()
-
-        # 将生成的示范话术赋值给对应的幻灯片
-        for slide_number, demo_script in demo_results:
-            for slide in slides:
-                if slide.slide_number == slide_number:
-                    slide.demo_script = demo_script
-                    break
-
-        logger.info(f"并行生成完成！总耗时: {end_time - start_time:.2f} 秒，平均每页: {(end_time - start_time) / len(slides):.2f} 秒")
+        slide_image_paths = {}
+        for slide in slides:
+            slide_image_path = static_dir / f"slide_{slide.slide_number}.png"
+            if slide_image_path.exists():
+                slide_image_paths[slide.slide_number] = str(slide_image_path)
 
         # 存储到内存（生产环境应存储到数据库）
         ppt_storage[presentation_id] = {
@@ -143,6 +134,44 @@ async def upload_ppt(file: UploadFile = File(...)):
             "static_dir": str(static_dir)
         }
 
+        if lazy_demo:
+            # 示范话术转入后台生成，先返回渲染结果
+            demo_script_service.start(presentation_id, slides, slide_image_paths)
+            if prerender_audio:
+                demo_audio_service.start(presentation_id, slides, str(static_dir))
+            logger.info(f"PPT 上传完成: {len(slides)} 页，示范讲解在后台生成")
+            return PPTUploadResponse(
+                presentation_id=presentation_id,
+                total_slides=len(slides),
+                slides=slides
+            )
+
+        # 为所有页面生成 AI 示范讲解话术（多页合并为一次请求，由 LLM 调度器限制并发，优先级低于交互请求）
+        logger.info(f"开始为 {len(slides)} 页幻灯片生成示范讲解（批量处理）...")
+
+        import time
+        start_time = time.time()
+        try:
+            with llm_deadline(settings.LLM_DEADLINE_BULK):
+                demo_scripts = await generate_slide_demo_scripts(
+                    [(slide.slide_number, slide.text_content) for slide in slides],
+                    slide_image_paths=slide_image_paths,
+                    cache=True  # 相同 PPT 重复上传时直接复用
+                )
+        except Exception as e:
+            logger.error(f"示范话术生成失败: {str(e)}")
+            demo_scripts = {}
+        end_time = time.time()
+
+        # 将生成的示范话术赋值给对应的幻灯片，生成失败的页面使用简单示范
+        for slide in slides:
+            slide.demo_script = demo_scripts.get(slide.slide_number) or fallback_demo_script(slide)
+
+        logger.info(f"示范话术生成完成！总耗时: {end_time - start_time:.2f} 秒，平均每页: {(end_time - start_time) / len(slides):.2f} 秒")
+
+        if prerender_audio:
+            demo_audio_service.start(presentation_id, slides, str(static_dir))
+
         logger.info(f"PPT 上传完成: {len(slides)} 页，全部生成示范讲解")
 
         return PPTUploadResponse(
@@ -153,6 +182,7 @@ async def upload_ppt(file: UploadFile = File(...)):
 
     except Exception as e:
         # 清理文件
+        ppt_storage.pop(presentation_id, None)
         if upload_path.exists():
             os.remove(upload_path)
         if static_dir.exists():
@@ -179,6 +209,44 @@ async def upload_ppt(file: UploadFile = File(...)):
         )
 
 
+@router.get(
+    "/{presentation_id}/slides/{slide_number}/demo-script",
+    response_model=SlideDemoScriptResponse
+)
+async def get_slide_demo_script(presentation_id: str, slide_number: int):
+    """
+    获取单页的 AI 示范讲解话术
+
+    后台生成模式下，该页尚未生成完时等待生成结果（不会重复生成），
+    并把该页设为当前页，后台优先生成附近的页面
+    """
+    if presentation_id not in ppt_storage:
+        raise HTTPException(status_code=404, detail="演示文稿不存在")
+
+    slides = ppt_storage[presentation_id]["slides"]
+    slide = next((s for s in slides if s.slide_number == slide_number), None)
+    if not slide:
+        raise HTTPException(status_code=404, detail=f"幻灯片 {slide_number} 不存在")
+
+    demo_script = slide.demo_script
+    if not demo_script:
+        try:
+            # 后台任务可能恰好生成完并已释放，此时返回 None，结果在 slide.demo_script 上
+            demo_script = await asyncio.wait_for(
+                demo_script_service.get_script(presentation_id, slide_number),
+                timeout=settings.LLM_DEADLINE_INTERACTIVE
+            ) or slide.demo_script
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="示范话术生成超时，请稍后重试")
+
+    return SlideDemoScriptResponse(
+        slide_number=slide_number,
+        demo_script=demo_script or fallback_demo_script(slide),
+        ready_slides=sum(1 for s in slides if s.demo_script),
+        total_slides=len(slides)
+    )
+
+
 @router.post("/analyze-slide", response_model=SlideAnalysisResponse)
 async def analyze_slide(request: SlideAnalysisRequest):
     """
@@ -228,12 +296,13 @@ async def analyze_slide(request: SlideAnalysisRequest):
                    f"image_path={slide_image_path}")
 
         # 使用 Vision API 分析幻灯片和用户讲解
-        vision_feedback = await analyze_slide_with_vision(
-            slide_image_url=str(slide_image_path),
-            user_transcript=request.transcript,
-            slide_number=request.slide_number,
-            slide_text=slide.text_content
-        )
+        with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+            vision_feedback = await analyze_slide_with_vision(
+                slide_image_url=str(slide_image_path),
+                user_transcript=request.transcript,
+                slide_number=request.slide_number,
+                slide_text=slide.text_content
+            )
 
         logger.info(f"Vision 分析完成: {len(vision_feedback)} 字符")
 
@@ -300,7 +369,8 @@ async def generate_demo_speech(request: SlideAnalysisRequest):
     为指定幻灯片生成 AI 示范讲解语音
 
     功能：
-    - 先分析幻灯片内容（Vision API）
+    - 上传时开启了语音预合成且该页已合成：直接返回预合成的音频 URL
+    - 否则先分析幻灯片内容（Vision API）
     - 生成示范讲解话术
     - 将话术转为语音（TTS）
     - 返回音频 URL
@@ -328,6 +398,25 @@ async def generate_demo_speech(request: SlideAnalysisRequest):
                 detail=f"幻灯片 {request.slide_number} 不存在"
             )
 
+        # 已在后台预合成的语音直接返回（正在合成该页时等待）
+        audio_url = slide.audio_url
+        if not audio_url:
+            try:
+                # 任务可能恰好完成并已释放，此时返回 None，结果在 slide.audio_url 上
+                audio_url = await asyncio.wait_for(
+                    demo_audio_service.get_audio_url(request.presentation_id, request.slide_number),
+                    timeout=settings.LLM_DEADLINE_INTERACTIVE
+                ) or slide.audio_url
+            except asyncio.TimeoutError:
+                audio_url = None
+        if audio_url:
+            logger.info(f"返回预合成示范语音: {audio_url}")
+            return {
+                "slide_number": request.slide_number,
+                "demo_script": slide.demo_script,
+                "audio_url": audio_url
+            }
+
         # 构建幻灯片图片的本地路径
         static_dir = Path(ppt_data["static_dir"])
         slide_image_path = static_dir / f"slide_{request.slide_number}.png"
@@ -346,13 +435,15 @@ async def generate_demo_speech(request: SlideAnalysisRequest):
 
 请直接返回示范话术，不要加任何说明。"""
 
-        # 调用 Vision API
-        demo_script = await analyze_slide_with_vision(
-            slide_image_url=str(slide_image_path),
-            user_transcript=demo_prompt,
-            slide_number=request.slide_number,
-            slide_text=slide.text_content
-        )
+        # 调用 Vision API（提示词只依赖幻灯片内容，开启缓存）
+        with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+            demo_script = await analyze_slide_with_vision(
+                slide_image_url=str(slide_image_path),
+                user_transcript=demo_prompt,
+                slide_number=request.slide_number,
+                slide_text=slide.text_content,
+                cache=True
+            )
 
         # 提取纯文本（去除 Markdown 格式）
         demo_text = extract_demo_script(demo_script)
@@ -484,57 +575,32 @@ async def analyze_presentation_video(
 
         ppt_data = ppt_storage[presentation_id]
         slides = ppt_data["slides"]
-        static_dir = Path(ppt_data["static_dir"])
 
         logger.info(f"开始分析视频: presentation_id={presentation_id}")
 
-        # 1. 保存上传的视频
+        # 1. 读取上传的视频
         video_content = await file.read()
-        video_filename = f"presentation_{uuid.uuid4().hex[:8]}.webm"
-        video_path = static_dir / video_filename
-
-        with open(video_path, "wb") as f:
-            f.write(video_content)
-
-        logger.info(f"视频已保存: {video_path}, 大小: {len(video_content)} bytes")
-
-        # 2. 从视频提取音频
-        audio_path = static_dir / f"presentation_{uuid.uuid4().hex[:8]}.wav"
+        logger.info(f"收到视频: 大小: {len(video_content)} bytes")
 
+        # 2. 在内存中提取 16kHz 单声道音频（不落盘，直接交给 ASR）
         try:
-            # 使用 ffmpeg 提取音频（使用完整路径以确保能找到）
-            ffmpeg_path = '/opt/homebrew/bin/ffmpeg'
-            # 如果完整路径不存在，尝试使用 which 查找
-            import shutil
-            if not os.path.exists(ffmpeg_path):
-                ffmpeg_path = shutil.which('ffmpeg') or 'ffmpeg'
-
-            subprocess.run([
-                ffmpeg_path,
-                '-y',  # 覆盖输出文件
-                '-i', str(video_path),
-                '-vn',  # 不要视频
-                '-acodec', 'pcm_s16le',  # 音频编码
-                '-ar', '16000',  # 采样率
-                '-ac', '1',  # 单声道
-                str(audio_path)
-            ], check=True, capture_output=True)
-
-            logger.info(f"音频提取完成: {audio_path}")
-
-        except subprocess.CalledProcessError as e:
-            logger.error(f"ffmpeg 提取音频失败: {e.stderr.decode()}")
+            audio = await decode_audio(video_content)
+        except AudioDecodeError as e:
+            logger.error(f"提取音频失败: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail="视频处理失败，请确保视频格式正确"
             )
 
-        # 3. 使用 ASR 转写音频
-        with open(audio_path, "rb") as f:
-            audio_content = f.read()
+        logger.info(f"音频提取完成: 时长 {len(audio) / SAMPLE_RATE:.1f} 秒")
 
-        transcript = await transcribe_audio(audio_content, audio_path.name)
-        logger.info(f"音频转写完成: {len(transcript)} 字符")
+        # 3. 使用 ASR 转写音频
+        # 长录音按语音边界切块并行识别，同时得到分段时间戳
+        transcription = await transcribe_audio_segments(
+            audio, file.filename or "presentation.webm", settings.ASR_PROFILE_PRESENTATION
+        )
+        transcript = transcription.text
+        logger.info(f"音频转写完成: {len(transcript)} 字符，{len(transcription.segments)} 段")
 
         # 检查是否有实际语音内容
         if len(transcript.strip()) < 10:
@@ -594,6 +660,14 @@ async def analyze_presentation_video(
         covered_keywords = sum(1 for kw in ppt_keywords if kw in transcript)
         coverage_rate = (covered_keywords / len(ppt_keywords) * 100) if ppt_keywords else 0
 
+        # 语速和停顿来自识别时间戳
+        metrics = transcription.metrics
+        pace_summary = (
+            f"- 语速：{metrics.chars_per_minute:.0f} 字/分钟（说话 {metrics.duration:.0f} 秒），"
+            f"停顿 {metrics.pause_count} 次，最长停顿 {metrics.longest_pause:.1f} 秒\n"
+            f"- 参考标准：中文演讲正常语速 150-200 字/分钟\n"
+        ) if metrics else ""
+
         logger.info(f"分析指标: 讲解字数={transcript_word_count}, PPT字数={ppt_total_words}, "
                    f"页数={slide_count}, 平均每页={avg_words_per_slide:.1f}字, "
                    f"关键词覆盖率={coverage_rate:.1f}%")
@@ -615,7 +689,7 @@ async def analyze_presentation_video(
 - PPT 总页数：{slide_count} 页
 - 平均每页讲解：{avg_words_per_slide:.1f} 字
 - 关键词覆盖率：{coverage_rate:.1f}%
-- 参考标准：一般每页 PPT 建议讲解 100-200 字
+{pace_summary}- 参考标准：一般每页 PPT 建议讲解 100-200 字
 
 ===== 严格评分标准 =====
 【90-100分 - 优秀】满足以下全部条件：
@@ -672,9 +746,10 @@ async def analyze_presentation_video(
 ```"""
 
         # 使用 call_llm 方法（需要传入 Message 对象列表）
-        analysis_result = await llm_client.call_llm([
-            Message(role="user", content=analysis_prompt)
-        ])
+        with llm_deadline(settings.LLM_DEADLINE_BULK):
+            analysis_result = await llm_client.call_llm([
+                Message(role="user", content=analysis_prompt)
+            ])
 
         logger.info(f"AI 分析完成: {len(analysis_result)} 字符")
 
@@ -777,10 +852,12 @@ async def analyze_presentation_video(
 
 请直接开始示范讲解："""
 
-        # 使用 call_llm 方法生成示范讲解
-        demo_script = await llm_client.call_llm([
-            Message(role="user", content=demo_prompt)
-        ])
+        # 使用 call_llm 方法生成示范讲解（整份 PPT 示范属于批量任务，让位于交互请求）
+        # 示范只依赖 PPT 文字内容，开启缓存
+        with llm_deadline(settings.LLM_DEADLINE_BULK):
+            demo_script = await llm_client.call_llm([
+                Message(role="user", content=demo_prompt)
+            ], priority=LLMPriority.BULK, cache=True)
 
         logger.info(f"AI 示范生成完成: {len(demo_script)} 字符")
 
@@ -794,6 +871,7 @@ async def analyze_presentation_video(
                     practice_type=PracticeType.PPT,
                     timestamp=datetime.utcnow(),
                     transcript=transcript,
+                    duration=metrics.duration if metrics else None,
                     word_count=len(transcript),
                     overall_score=analysis_data.get("score", 75),
                     content_score=None,
@@ -803,7 +881,8 @@ async def analyze_presentation_video(
                     improvements=analysis_data.get("improvements", []),
                     metadata={
                         "presentation_id": presentation_id,
-                        "slide_count": len(slides)
+                        "slide_count": len(slides),
+                        "speech_metrics": metrics.model_dump() if metrics else None
                     }
                 )
 
@@ -814,14 +893,7 @@ async def analyze_presentation_video(
             except Exception as e:
                 logger.error(f"保存用户记录失败: {str(e)}", exc_info=True)
 
-        # 9. 清理临时文件
-        try:
-            os.remove(video_path)
-            os.remove(audio_path)
-        except:
-            pass
-
-        # 10. 返回分析结果
+        # 9. 返回分析结果
         return VideoAnalysisResponse(
             presentation_id=presentation_id,
             transcript=transcript,
@@ -830,11 +902,19 @@ async def analyze_presentation_video(
             strengths=analysis_data.get("strengths", []),
             improvements=analysis_data.get("improvements", []),
             demo_script=demo_script,
-            suggestions=analysis_data.get("suggestions", [])
+            suggestions=analysis_data.get("suggestions", []),
+            segments=transcription.segments,
+            speech_metrics=metrics
         )
 
     except HTTPException:
         raise
+    except ASRBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
     except Exception as e:
         logger.error(f"视频分析失败: {str(e)}", exc_info=True)
         raise HTTPException(
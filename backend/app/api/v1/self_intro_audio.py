@@ -7,7 +7,10 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 from app.models.audio import AudioTranscriptionResponse
 from app.models.chat import Message
 from app.prompts import get_system_prompt
-from app.core.llm_client import llm_client, transcribe_audio
+from app.core.llm_client import llm_client, transcribe_audio, llm_deadline
+from app.core.asr import asr_pool, ASRBusyError
+from app.core.config import settings
+from app.core.sse import sse_event, sse_response
 import logging
 
 router = APIRouter()
@@ -35,33 +38,18 @@ async def upload_self_intro_audio(
         AudioTranscriptionResponse: 包含转写文本和 AI 反馈
     """
     try:
-        # 验证文件类型
-        if not file.content_type or not file.content_type.startswith("audio/"):
-            # 也接受一些常见的音频格式
-            allowed_types = ["audio/", "video/webm", "video/mp4"]
-            if not any(file.content_type.startswith(t) for t in allowed_types):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"不支持的文件类型: {file.content_type}. 请上传音频文件。",
-                )
-
-        # 读取文件内容（暂时不使用，但验证文件可读）
-        audio_content = await file.read()
-        file_size_mb = len(audio_content) / (1024 * 1024)
-
-        logger.info(
-            f"收到音频文件: {file.filename}, "
-            f"类型: {file.content_type}, "
-            f"大小: {file_size_mb:.2f}MB"
-        )
+        audio_content = await read_audio_upload(file)
 
         # 调用语音识别 API（根据 USE_MOCK_LLM 配置自动切换 mock/真实）
-        transcript_text = await transcribe_audio(audio_content, file.filename or "audio.webm")
+        transcript_text = await transcribe_audio(
+            audio_content, file.filename or "audio.webm", settings.ASR_PROFILE_SELF_INTRO
+        )
 
         logger.info(f"转写结果: {transcript_text[:50]}...")
 
         # 调用 LLM 获取自我介绍反馈
-        ai_reply, demo_text = await get_self_intro_feedback(transcript_text)
+        with llm_deadline(settings.LLM_DEADLINE_INTERACTIVE):
+            ai_reply, demo_text = await get_self_intro_feedback(transcript_text)
 
         return AudioTranscriptionResponse(
             transcript=transcript_text,
@@ -72,11 +60,107 @@ async def upload_self_intro_audio(
 
     except HTTPException:
         raise
+    except ASRBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
     except Exception as e:
         logger.error(f"处理音频时出错: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"处理音频失败: {str(e)}")
 
 
+@router.post("/self_intro/audio/stream")
+async def upload_self_intro_audio_stream(
+    file: UploadFile = File(..., description="录制的音频文件")
+):
+    """
+    流式处理自我介绍音频（Server-Sent Events）
+
+    事件:
+        transcript: {"transcript": 转写文本}（转写完成后立即推送）
+        token: {"content": AI 反馈的新片段}
+        done: 与 AudioTranscriptionResponse 相同的结构
+        error: {"detail": 错误信息}
+    """
+    audio_content = await read_audio_upload(file)
+    filename = file.filename or "audio.webm"
+
+    # 流开始后无法再返回 503，识别队列已满时先拒绝
+    try:
+        asr_pool.check_capacity()
+    except ASRBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+
+    async def events():
+        transcript_text = await transcribe_audio(audio_content, filename, settings.ASR_PROFILE_SELF_INTRO)
+        logger.info(f"转写结果: {transcript_text[:50]}...")
+        yield sse_event("transcript", {"transcript": transcript_text})
+
+        ai_reply = ""
+        async for chunk in llm_client.call_llm_stream(
+            build_self_intro_messages(transcript_text),
+            timeout=settings.LLM_DEADLINE_INTERACTIVE
+        ):
+            ai_reply += chunk
+            yield sse_event("token", {"content": chunk})
+
+        result = AudioTranscriptionResponse(
+            transcript=transcript_text,
+            reply=ai_reply,
+            demo_text=extract_demo_text(ai_reply),
+            mode="self_intro"
+        )
+        yield sse_event("done", result.model_dump())
+
+    return sse_response(events())
+
+
+async def read_audio_upload(file: UploadFile) -> bytes:
+    """
+    校验上传的音频文件类型并读取内容
+
+    Raises:
+        HTTPException: 文件类型不支持时
+    """
+    # 验证文件类型
+    if not file.content_type or not file.content_type.startswith("audio/"):
+        # 也接受一些常见的音频格式
+        allowed_types = ["audio/", "video/webm", "video/mp4"]
+        if not any((file.content_type or "").startswith(t) for t in allowed_types):
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的文件类型: {file.content_type}. 请上传音频文件。",
+            )
+
+    audio_content = await file.read()
+    file_size_mb = len(audio_content) / (1024 * 1024)
+
+    logger.info(
+        f"收到音频文件: {file.filename}, "
+        f"类型: {file.content_type}, "
+        f"大小: {file_size_mb:.2f}MB"
+    )
+
+    return audio_content
+
+
+def build_self_intro_messages(user_text: str) -> list[Message]:
+    """构建自我介绍反馈的消息列表"""
+    # 获取 self_intro 模式的 system prompt
+    system_prompt = get_system_prompt("self_intro")
+
+    return [
+        Message(role="system", content=system_prompt),
+        Message(role="user", content=user_text),
+    ]
+
+
 async def get_self_intro_feedback(user_text: str) -> tuple[str, str]:
     """
     获取自我介绍的 AI 反馈，并提取示范文本
@@ -87,14 +171,8 @@ async def get_self_intro_feedback(user_text: str) -> tuple[str, str]:
     Returns:
         tuple[str, str]: (AI 教练的反馈文本, 示范文本)
     """
-    # 获取 self_intro 模式的 system prompt
-    system_prompt = get_system_prompt("self_intro")
-
     # 构建消息列表
-    messages = [
-        Message(role="system", content=system_prompt),
-        Message(role="user", content=user_text),
-    ]
+    messages = build_self_intro_messages(user_text)
 
     # 调用 LLM
     reply = await llm_client.call_llm(messages)
@@ -3,11 +3,14 @@
 将 AI 的文字反馈转换为语音
 """
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from app.core.llm_client import synthesize_speech
+from typing import AsyncIterator, Optional
+from app.core.llm_client import synthesize_speech, synthesize_speech_stream
+from app.core.tts import TTSCodec, detect_tts_codec, resolve_tts_format, tts_cache, tts_cache_key
 import logging
+import re
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -16,42 +19,97 @@ logger = logging.getLogger(__name__)
 class TTSRequest(BaseModel):
     """TTS 请求模型"""
     text: str
+    format: str = "mp3"  # 输出格式：mp3 / opus-webm / opus-ogg
+    bitrate: Optional[int] = None  # 码率（kbps），如 16 / 24 / 32；mp3 不指定时返回原生音频
+
+
+def validate_tts_request(request: TTSRequest):
+    """校验待合成文本和输出格式"""
+    if not request.text or not request.text.strip():
+        raise HTTPException(status_code=400, detail="文本内容不能为空")
+
+    # 文本长度限制（OpenAI TTS 限制为 4096 字符）
+    if len(request.text) > 4096:
+        raise HTTPException(
+            status_code=400,
+            detail="文本长度超过限制（最大 4096 字符）"
+        )
+
+    try:
+        resolve_tts_format(request.format, request.bitrate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 中是否包含该 ETag（忽略弱校验前缀 W/）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def audio_response(
+    audio_content: bytes,
+    key: str,
+    cache_control: str,
+    codec: TTSCodec,
+    addressable: bool = True
+) -> Response:
+    """
+    返回音频
+
+    addressable 为 True（音频在磁盘缓存中）时附带 ETag 和按内容寻址的地址（重复播放可直接 GET 该地址）；
+    未缓存（缓存已关闭、条目过大或已被淘汰）时不附带，避免客户端拿到会 404 的地址
+    """
+    headers = {
+        "Content-Disposition": f"attachment; filename=speech.{codec.extension}",
+        "Cache-Control": cache_control,
+    }
+    if addressable:
+        headers["ETag"] = f'"{key}"'
+        headers["Content-Location"] = f"/api/v1/tts/audio/{key}"
+    return Response(content=audio_content, media_type=codec.media_type, headers=headers)
 
 
 @router.post("/tts")
-async def text_to_speech(request: TTSRequest) -> Response:
+async def text_to_speech(
+    request: TTSRequest,
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
     """
     将文字转换为语音
 
+    相同文字（同一音色、语速）只合成一次，之后直接从磁盘缓存返回。
+    音频写入了缓存时响应带 ETag：客户端带 If-None-Match 重复请求时返回 304，不传输音频；
+    Content-Location 指向按内容寻址的 GET 地址，可直接用于 <audio src>（缓存关闭或未保留时不带这两个头）。
+    网络较慢的客户端可以请求 Opus（如 format=opus-webm, bitrate=16），体积约为默认 MP3 的三分之一
+
     Args:
-        request: 包含要转换的文字
+        request: 要转换的文字、输出格式和码率
 
     Returns:
-        音频文件（MP3 格式）
+        音频文件（默认 MP3 格式）
     """
     try:
-        if not request.text or not request.text.strip():
-            raise HTTPException(status_code=400, detail="文本内容不能为空")
-
-        # 文本长度限制（OpenAI TTS 限制为 4096 字符）
-        if len(request.text) > 4096:
-            raise HTTPException(
-                status_code=400,
-                detail="文本长度超过限制（最大 4096 字符）"
-            )
-
-        logger.info(f"TTS 请求: {request.text[:50]}...")
-
-        # 调用 TTS API
-        audio_content = await synthesize_speech(request.text)
-
-        # 返回音频文件
-        return Response(
-            content=audio_content,
-            media_type="audio/mpeg",
-            headers={
-                "Content-Disposition": "attachment; filename=speech.mp3"
-            }
+        validate_tts_request(request)
+
+        logger.info(f"TTS 请求 ({request.format}): {request.text[:50]}...")
+
+        # 客户端已有这段音频
+        codec, bitrate = resolve_tts_format(request.format, request.bitrate)
+        key = tts_cache_key(request.text, codec.name, bitrate)
+        if etag_matches(if_none_match, f'"{key}"'):
+            return Response(status_code=304, headers={"ETag": f'"{key}"'})
+
+        # 调用 TTS API（命中缓存时不合成）
+        audio_content = await synthesize_speech(request.text, request.format, request.bitrate)
+
+        # 返回音频文件（只有确实写入了缓存才提供按内容寻址的地址）
+        return audio_response(
+            audio_content, key, "private, max-age=86400", codec,
+            addressable=await tts_cache.contains(key)
         )
 
     except HTTPException:
@@ -59,3 +117,75 @@ async def text_to_speech(request: TTSRequest) -> Response:
     except Exception as e:
         logger.error(f"TTS 生成失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"语音生成失败: {str(e)}")
+
+
+@router.post("/tts/stream")
+async def text_to_speech_stream(request: TTSRequest) -> StreamingResponse:
+    """
+    流式文字转语音
+
+    文本按句切分后逐句合成，音频数据一产生就以分块传输返回，
+    首段音频的等待时间只取决于第一句的长度，客户端可以边收边播（MediaSource / <audio>）。
+    完整合成后同样写入缓存，之后的 POST /tts 和本接口都直接命中
+
+    Args:
+        request: 要转换的文字、输出格式和码率
+
+    Returns:
+        分块传输的音频流（默认 MP3 格式）
+    """
+    validate_tts_request(request)
+    logger.info(f"TTS 流式请求 ({request.format}): {request.text[:50]}...")
+
+    codec, _ = resolve_tts_format(request.format, request.bitrate)
+    chunks = synthesize_speech_stream(request.text, request.format, request.bitrate)
+
+    # 先取第一块：合成失败时还能返回正常的错误响应
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        logger.error(f"TTS 生成失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"语音生成失败: {str(e)}")
+
+    async def body() -> AsyncIterator[bytes]:
+        if first:
+            yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # 响应头已经发出，只能中断传输
+            logger.error(f"TTS 流式生成中断: {str(e)}", exc_info=True)
+
+    return StreamingResponse(
+        body(),
+        media_type=codec.media_type,
+        headers={
+            "Cache-Control": "no-cache",
+            # 关闭反向代理（nginx）缓冲，保证分块及时到达客户端
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@router.get("/tts/audio/{key}")
+async def get_cached_speech(key: str, if_none_match: Optional[str] = Header(None)) -> Response:
+    """
+    按缓存键获取已合成的语音（POST /tts 响应中的 Content-Location）
+
+    缓存键由引擎、音色、语速和文本决定，内容不会变化，允许浏览器长期缓存；
+    缓存已被淘汰时返回 404，客户端应重新调用 POST /tts
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", key):
+        raise HTTPException(status_code=404, detail="音频不存在")
+
+    if etag_matches(if_none_match, f'"{key}"'):
+        return Response(status_code=304, headers={"ETag": f'"{key}"'})
+
+    audio_content = await tts_cache.get(key)
+    if audio_content is None:
+        raise HTTPException(status_code=404, detail="音频不存在或已过期，请重新合成")
+
+    return audio_response(audio_content, key, "public, max-age=31536000, immutable", detect_tts_codec(audio_content))
@@ -0,0 +1,757 @@
+"""
+本地语音识别（faster-whisper）基础设施
+- WhisperModel 加载耗时数秒、占用数百 MB 内存，按 (模型, 设备, 精度) 在进程内只加载一次
+- 识别在专用的线程池 / 进程池中执行，限制同时解码的数量，排队过长时直接拒绝
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.audio import SAMPLE_RATE
+from app.core.cache import DiskLRUCache
+from app.core.config import settings
+from app.core.stats import percentile
+from app.models.audio import SpeechMetrics, TranscriptSegment, TranscriptWord, TranscriptionResult
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """当前进程的常驻内存（RSS），无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        # 不支持 /proc 的系统只能拿到峰值 RSS（macOS 单位为字节，Linux 为 KB）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def asr_cpu_threads() -> int:
+    """每路解码使用的 CPU 线程数（未配置时按核数平均分给各个 worker）"""
+    if settings.ASR_CPU_THREADS > 0:
+        return settings.ASR_CPU_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, settings.ASR_WORKERS))
+
+
+def whisper_model_id() -> str:
+    """当前本地识别模型的标识（用于缓存键）"""
+    return f"faster-whisper:{settings.WHISPER_MODEL}:{settings.WHISPER_COMPUTE_TYPE}"
+
+
+class WhisperModelRegistry:
+    """
+    进程内 WhisperModel 注册表
+
+    - 每个 (模型, 设备, 精度) 只加载一次，之后所有请求共用
+    - 加载过程按键加锁：并发请求同一个模型时只有一个线程加载，其他线程等待
+    - WhisperModel.transcribe 本身可以被多个线程同时调用
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, str], object] = {}
+        self._locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str, str], Dict] = {}
+
+    def get(
+        self,
+        model_size: Optional[str] = None,
+        device: Optional[str] = None,
+        compute_type: Optional[str] = None
+    ):
+        """
+        获取（必要时加载）WhisperModel，会阻塞，应在线程池中调用
+
+        Args:
+            model_size: tiny / base / small，默认 WHISPER_MODEL
+            device: cpu / cuda，默认 WHISPER_DEVICE
+            compute_type: int8 / float16 等，默认 WHISPER_COMPUTE_TYPE
+        """
+        key = (
+            model_size or settings.WHISPER_MODEL,
+            device or settings.WHISPER_DEVICE,
+            compute_type or settings.WHISPER_COMPUTE_TYPE,
+        )
+
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._registry_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(key)
+                self._models[key] = model
+        return model
+
+    def _load(self, key: Tuple[str, str, str]):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            logger.error("faster-whisper 未安装，请运行: pip install faster-whisper")
+            raise ImportError("请安装 faster-whisper: pip install faster-whisper")
+
+        model_size, device, compute_type = key
+        rss_before = resident_memory_bytes()
+        start = time.perf_counter()
+
+        # local_files_only=True 避免重新下载，模型已经预先下载好了
+        # 线程池模式下多个线程共用一个模型，num_workers 决定能同时解码几路；
+        # 进程池模式下每个进程各加载一份，只需要 1 个 worker
+        model = WhisperModel(
+            model_size,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=asr_cpu_threads(),
+            num_workers=1 if settings.ASR_EXECUTOR == "process" else max(1, settings.ASR_WORKERS),
+            local_files_only=True
+        )
+
+        load_seconds = time.perf_counter() - start
+        rss_after = resident_memory_bytes()
+        self._stats[key] = {
+            "model": model_size,
+            "device": device,
+            "compute_type": compute_type,
+            "load_seconds": round(load_seconds, 3),
+            "loaded_at": time.time(),
+            "rss_delta_bytes": (
+                rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            ),
+        }
+        logger.info(f"Whisper 模型已加载: {model_size} ({device}/{compute_type})，耗时 {load_seconds:.2f} 秒")
+        return model
+
+    def warmup(self):
+        """预先加载默认模型（应用启动时在线程池中调用）"""
+        self.get()
+
+    def clear(self):
+        """释放所有已加载的模型（切换 CPU 线程数等加载参数后需要重新加载，基准测试使用）"""
+        with self._registry_lock:
+            self._models.clear()
+            self._locks.clear()
+            self._stats.clear()
+
+    def snapshot(self) -> Dict:
+        """已加载的模型、加载耗时和进程常驻内存"""
+        return {
+            "models": list(self._stats.values()),
+            "process_rss_bytes": resident_memory_bytes(),
+        }
+
+
+# 全局 Whisper 模型注册表
+whisper_models = WhisperModelRegistry()
+
+
+class ASRBusyError(RuntimeError):
+    """识别队列已满，调用方应稍后重试（接口返回 503）"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("语音识别繁忙，请稍后重试")
+        self.retry_after = retry_after
+
+
+class ASRWorkerPool:
+    """
+    语音识别专用执行器
+
+    - 最多 ASR_WORKERS 路同时解码，其余请求排队（不占用默认线程池）
+    - 排队数超过 ASR_QUEUE_SIZE 时直接抛出 ASRBusyError，避免请求无限堆积
+    - ASR_EXECUTOR=process 时使用进程池，解码不受 GIL 影响，但每个进程各加载一份模型
+    """
+
+    def __init__(self):
+        self.workers = max(1, settings.ASR_WORKERS)
+        self.queue_size = max(0, settings.ASR_QUEUE_SIZE)
+        self.kind = settings.ASR_EXECUTOR
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._waits = deque(maxlen=500)
+        self._durations = deque(maxlen=500)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="asr")
+        return self._executor
+
+    def _retry_after(self) -> float:
+        """按平均解码耗时估算排到队首需要的时间"""
+        average = sum(self._durations) / len(self._durations) if self._durations else 5.0
+        return max(1.0, average * (self.queued / self.workers + 1))
+
+    def saturated(self) -> bool:
+        """所有 worker 都在忙且排队已满"""
+        return self.in_flight >= self.workers and self.queued >= self.queue_size
+
+    def check_capacity(self):
+        """队列已满时抛出 ASRBusyError（流式接口在开始响应前调用）"""
+        if self.saturated():
+            self.rejected += 1
+            raise ASRBusyError(self._retry_after())
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        在识别执行器中运行阻塞的识别函数
+
+        Raises:
+            ASRBusyError: 排队数已达上限
+        """
+        self.check_capacity()
+        return await self._run_admitted(func, *args)
+
+    async def run_many(self, func: Callable[..., Any], arg_list: List[tuple]) -> List[Any]:
+        """
+        并行运行一组识别任务（长音频的各个分段）
+
+        只在开始时做一次准入检查；同一批任务最多同时提交 workers 个，
+        不会占满排队名额而挤掉其他请求
+
+        Raises:
+            ASRBusyError: 排队数已达上限
+        """
+        self.check_capacity()
+        batch_slots = asyncio.Semaphore(self.workers)
+
+        async def run_one(args: tuple) -> Any:
+            async with batch_slots:
+                return await self._run_admitted(func, *args)
+
+        return await asyncio.gather(*[run_one(args) for args in arg_list])
+
+    async def _run_admitted(self, func: Callable[..., Any], *args) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        start = time.monotonic()
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self._waits.append(time.monotonic() - start)
+
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+        self.completed += 1
+        self._durations.append(time.monotonic() - started)
+        return result
+
+    def shutdown(self):
+        """应用关闭时释放执行器，不等待正在进行的识别"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._slots = None
+
+    def snapshot(self) -> Dict:
+        waits = list(self._waits)
+        durations = list(self._durations)
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "cpu_threads_per_worker": asr_cpu_threads(),
+            "queue_limit": self.queue_size,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_p50_ms": round(percentile(waits, 50) * 1000, 1),
+            "wait_p95_ms": round(percentile(waits, 95) * 1000, 1),
+            "decode_p50_ms": round(percentile(durations, 50) * 1000, 1),
+            "decode_p95_ms": round(percentile(durations, 95) * 1000, 1),
+        }
+
+
+# 全局语音识别执行器
+asr_pool = ASRWorkerPool()
+
+
+class TranscriptionCache:
+    """
+    识别结果磁盘缓存（按总容量 LRU 淘汰）
+
+    缓存键由解码后 PCM 的指纹、模型和语言计算得到：同一段录音重新上传、
+    换了容器格式或文件名都能命中；换模型或精度后不会读到旧结果
+    """
+
+    def __init__(self):
+        self.disk = DiskLRUCache(
+            str(Path(settings.CACHE_DIR) / "asr"),
+            max_bytes=settings.ASR_CACHE_MAX_BYTES,
+            ttl_seconds=settings.ASR_CACHE_TTL_SECONDS or None,
+        )
+
+    @staticmethod
+    def fingerprint(audio: np.ndarray) -> str:
+        """
+        PCM 指纹：先量化为 16 位整数再取 sha256，
+        不同解码器之间细微的浮点误差不影响结果
+        """
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+        return hashlib.sha256(pcm.tobytes()).hexdigest()
+
+    @staticmethod
+    def make_key(fingerprint: str, model: str, kind: str, language: str = "zh") -> str:
+        """
+        Args:
+            fingerprint: PCM 指纹（无法解码时为原始文件的 sha256）
+            model: 识别模型标识，如 faster-whisper:tiny:int8
+            kind: 结果类型（result 完整识别结果 TranscriptionResult / segments 带时间戳的分段）
+            language: 识别语言
+        """
+        raw = f"{fingerprint}|{model}|{language}|{kind}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self.disk.max_bytes == 0:
+            return None
+        return await asyncio.to_thread(self.disk.get, key)
+
+    async def set(self, key: str, data: bytes):
+        if self.disk.max_bytes == 0:
+            return
+        try:
+            await asyncio.to_thread(self.disk.set, key, data)
+        except OSError as e:
+            # 磁盘缓存写入失败不影响主流程
+            logger.warning(f"识别结果缓存写入失败: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        """容量和命中率统计"""
+        stats = self.disk.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# 全局识别结果缓存
+transcription_cache = TranscriptionCache()
+
+
+# ============ 识别与长音频分段 ============
+
+class DecodeProfile:
+    """
+    一组 Whisper 解码参数
+
+    Args:
+        name: 配置名（ASR_PROFILE_* 中使用）
+        beam_size: 束搜索宽度，1 为贪心解码
+        best_of: 温度回退采样时的候选数
+        batched: 是否使用 faster-whisper 的批量推理（内部按 VAD 切块，一次送入多块）
+    """
+
+    def __init__(self, name: str, beam_size: int, best_of: int, batched: bool = False):
+        self.name = name
+        self.beam_size = beam_size
+        self.best_of = best_of
+        self.batched = batched
+
+
+# 可选的解码配置，各接口通过 ASR_PROFILE_* 选择
+DECODE_PROFILES: Dict[str, DecodeProfile] = {
+    # 贪心解码：CPU 上比束搜索快数倍，适合面试回答等短语音
+    "greedy": DecodeProfile("greedy", beam_size=1, best_of=1),
+    # 束搜索：准确率更高，适合需要精确转写的演讲
+    "beam": DecodeProfile("beam", beam_size=5, best_of=5),
+    # 批量推理：长音频吞吐量最高（GPU 上效果最明显）
+    "batched": DecodeProfile("batched", beam_size=1, best_of=1, batched=True),
+}
+
+
+def get_decode_profile(name: str) -> DecodeProfile:
+    """按名称取解码配置，名称无效时使用 beam 并记录警告"""
+    profile = DECODE_PROFILES.get(name)
+    if profile is None:
+        logger.warning(f"未知的解码配置 {name}，改用 beam（可选: {', '.join(DECODE_PROFILES)}）")
+        profile = DECODE_PROFILES["beam"]
+    return profile
+
+
+class DecodeStats:
+    """
+    各解码配置的延迟和实时率（RTF = 识别耗时 / 音频时长，越小越快）
+
+    耗时从提交识别开始计算，包括排队，反映用户实际等待的时间
+    """
+
+    def __init__(self, max_samples: int = 500):
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, List[float]] = {}  # 配置 -> [次数, 音频总时长, 耗时总和]
+        self.max_samples = max_samples
+
+    def record(self, profile: str, audio_seconds: float, elapsed: float):
+        if profile not in self._samples:
+            self._samples[profile] = deque(maxlen=self.max_samples)
+            self._totals[profile] = [0, 0.0, 0.0]
+        rtf = elapsed / audio_seconds if audio_seconds > 0 else 0.0
+        self._samples[profile].append((elapsed, rtf))
+        totals = self._totals[profile]
+        totals[0] += 1
+        totals[1] += audio_seconds
+        totals[2] += elapsed
+
+    def snapshot(self) -> Dict:
+        result = {}
+        for profile, samples in self._samples.items():
+            latencies = [elapsed for elapsed, _ in samples]
+            rtfs = [rtf for _, rtf in samples]
+            calls, audio_seconds, elapsed = self._totals[profile]
+            result[profile] = {
+                "calls": calls,
+                "audio_seconds": round(audio_seconds, 1),
+                "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "rtf_p50": round(percentile(rtfs, 50), 3),
+                "rtf_p95": round(percentile(rtfs, 95), 3),
+                "rtf_overall": round(elapsed / audio_seconds, 3) if audio_seconds > 0 else 0.0,
+            }
+        return result
+
+
+# 全局解码统计
+decode_stats = DecodeStats()
+
+
+def run_whisper(
+    audio: np.ndarray,
+    offset: float = 0.0,
+    profile: str = "beam",
+    word_timestamps: bool = True
+) -> List[TranscriptSegment]:
+    """
+    同步运行 faster-whisper（在识别执行器中执行）
+
+    Args:
+        audio: 16kHz 单声道 float32 数组
+        offset: 该段音频在整段录音中的起始时间（秒），加到返回的时间戳上
+        profile: 解码配置名（见 DECODE_PROFILES），传名称而不是对象，便于送入进程池
+        word_timestamps: 是否在解码时同时对齐逐词时间戳（用于语速和停顿统计）
+
+    Returns:
+        分段识别结果
+    """
+    decode = get_decode_profile(profile)
+    model = whisper_models.get()
+    options = dict(
+        language="zh",
+        beam_size=decode.beam_size,
+        best_of=decode.best_of,
+        word_timestamps=word_timestamps,
+    )
+    if decode.batched:
+        from faster_whisper import BatchedInferencePipeline
+
+        segments, _ = BatchedInferencePipeline(model=model).transcribe(
+            audio, batch_size=settings.ASR_BATCH_SIZE, **options
+        )
+    else:
+        segments, _ = model.transcribe(audio, **options)
+
+    return [
+        TranscriptSegment(
+            start=offset + seg.start,
+            end=offset + seg.end,
+            text=seg.text.strip(),
+            words=[
+                TranscriptWord(start=offset + w.start, end=offset + w.end, word=w.word.strip())
+                for w in (getattr(seg, "words", None) or [])
+                if w.word.strip()
+            ]
+        )
+        for seg in segments
+    ]
+
+
+def speech_metrics(segments: List[TranscriptSegment]) -> Optional[SpeechMetrics]:
+    """
+    根据识别时间戳计算语速和停顿（不需要再处理音频）
+
+    有逐词时间戳时按词计算停顿，否则按片段之间的间隔计算
+
+    Returns:
+        没有识别出文字时返回 None
+    """
+    units = []
+    for seg in segments:
+        if seg.words:
+            units.extend((w.start, w.end) for w in seg.words)
+        elif seg.text:
+            units.append((seg.start, seg.end))
+    if not units:
+        return None
+
+    units.sort()
+    pauses = [
+        gap for gap in (current[0] - previous[1] for previous, current in zip(units, units[1:]))
+        if gap >= settings.ASR_PAUSE_SECONDS
+    ]
+    duration = max(end for _, end in units) - units[0][0]
+    total_pause = sum(pauses)
+    char_count = sum(ch.isalnum() for seg in segments for ch in seg.text)
+
+    return SpeechMetrics(
+        duration=round(duration, 2),
+        speech_duration=round(max(0.0, duration - total_pause), 2),
+        char_count=char_count,
+        chars_per_minute=round(char_count / duration * 60, 1) if duration > 0 else 0.0,
+        pause_count=len(pauses),
+        total_pause=round(total_pause, 2),
+        longest_pause=round(max(pauses, default=0.0), 2),
+        mean_pause=round(total_pause / len(pauses), 2) if pauses else 0.0,
+    )
+
+
+def build_transcription(segments: List[TranscriptSegment], duration: float) -> TranscriptionResult:
+    """由分段结果组装完整识别结果（全文 + 语速统计）"""
+    return TranscriptionResult(
+        text=" ".join(seg.text for seg in segments if seg.text).strip(),
+        segments=segments,
+        duration=duration,
+        metrics=speech_metrics(segments)
+    )
+
+
+def plan_chunks(
+    speech: List[Dict[str, int]],
+    total_samples: int,
+    max_samples: int
+) -> List[Tuple[int, int]]:
+    """
+    按语音活动边界把整段音频切成若干块
+
+    相邻语音段合并到同一块，直到超过 max_samples；块的边界放在两段语音之间静音的中点，
+    所有块首尾相接覆盖整段音频。单段语音本身超过 max_samples 时按长度硬切
+
+    Args:
+        speech: VAD 输出的语音段 [{"start": 采样点, "end": 采样点}, ...]
+        total_samples: 音频总采样点数
+        max_samples: 每块的最大采样点数
+
+    Returns:
+        [(起始采样点, 结束采样点), ...]
+    """
+    if not speech:
+        return [(0, total_samples)]
+
+    boundaries = [0]
+    for previous, current in zip(speech, speech[1:]):
+        if current["end"] - boundaries[-1] > max_samples:
+            cut = (previous["end"] + current["start"]) // 2
+            if cut > boundaries[-1]:
+                boundaries.append(cut)
+    boundaries.append(total_samples)
+
+    chunks = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        # 单段语音过长时按长度切开
+        while end - start > max_samples:
+            chunks.append((start, start + max_samples))
+            start += max_samples
+        if end > start:
+            chunks.append((start, end))
+    return chunks
+
+
+def _stitch(
+    chunk_segments: List[List[TranscriptSegment]],
+    cores: List[Tuple[float, float]]
+) -> List[TranscriptSegment]:
+    """
+    拼接各块的识别结果
+
+    每块前后多带了一段重叠音频作为上下文，只保留中点落在本块范围内的片段；
+    边界处两块都识别出同一句时只保留一次
+    """
+    merged: List[TranscriptSegment] = []
+    for segments, (core_start, core_end) in zip(chunk_segments, cores):
+        for seg in segments:
+            middle = (seg.start + seg.end) / 2
+            if not core_start <= middle < core_end or not seg.text:
+                continue
+            if merged and merged[-1].text == seg.text and seg.start - merged[-1].end < 1.0:
+                continue
+            merged.append(seg)
+    merged.sort(key=lambda seg: seg.start)
+    return merged
+
+
+async def transcribe_long_audio(audio: np.ndarray, profile: str = "beam") -> TranscriptionResult:
+    """
+    长音频识别：按语音活动切块，多个 worker 并行识别后拼接
+
+    短于 ASR_CHUNK_SECONDS 的音频直接整段识别；batched 配置由 faster-whisper
+    自己切块并批量推理，只占用一个 worker
+
+    Args:
+        audio: 16kHz 单声道 float32 数组
+        profile: 解码配置名（见 DECODE_PROFILES）
+
+    Returns:
+        带时间戳的识别结果
+
+    Raises:
+        ASRBusyError: 识别队列已满
+    """
+    duration = len(audio) / SAMPLE_RATE
+    max_samples = int(settings.ASR_CHUNK_SECONDS * SAMPLE_RATE)
+    decode = get_decode_profile(profile)
+    started = time.monotonic()
+
+    if len(audio) <= max_samples or decode.batched:
+        segments = await asr_pool.run(run_whisper, audio, 0.0, decode.name)
+    else:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+        # VAD 只需要几百毫秒，放到线程池里避免阻塞事件循环
+        speech = await asyncio.to_thread(
+            get_speech_timestamps,
+            audio,
+            VadOptions(min_silence_duration_ms=500, speech_pad_ms=200)
+        )
+        chunks = plan_chunks(speech, len(audio), max_samples)
+        overlap = int(settings.ASR_CHUNK_OVERLAP_SECONDS * SAMPLE_RATE)
+
+        arg_list = []
+        cores = []
+        for start, end in chunks:
+            padded_start = max(0, start - overlap)
+            padded_end = min(len(audio), end + overlap)
+            arg_list.append((audio[padded_start:padded_end], padded_start / SAMPLE_RATE, decode.name))
+            cores.append((start / SAMPLE_RATE, end / SAMPLE_RATE))
+
+        logger.info(f"长音频分块识别: 时长 {duration:.1f} 秒，{len(chunks)} 块，{asr_pool.workers} 路并行")
+        chunk_segments = await asr_pool.run_many(run_whisper, arg_list)
+        segments = _stitch(chunk_segments, cores)
+
+    decode_stats.record(decode.name, duration, time.monotonic() - started)
+    return build_transcription(segments, duration)
+
+
+class StreamingTranscriber:
+    """
+    边录边识别
+
+    音频不断追加到缓冲区，每新增 ASR_STREAM_STEP_SECONDS 就对"未固定"的部分（滚动窗口）
+    重新识别一次并给出临时结果。窗口超过 ASR_STREAM_WINDOW_SECONDS 时，把已经稳定的片段
+    （不是最后一段、且结束于窗口末尾 1 秒之前）固定下来，窗口从其后开始，
+    因此每次识别的音频长度有上限，录音结束时只需要再识别最后一小段
+    """
+
+    def __init__(self):
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.committed: List[TranscriptSegment] = []
+        self.tentative: List[TranscriptSegment] = []
+        self._committed_until = 0  # 已固定部分的结束采样点
+        self._decoded_until = 0  # 上次识别时的缓冲区长度
+        self._step = int(settings.ASR_STREAM_STEP_SECONDS * SAMPLE_RATE)
+        self._window = int(settings.ASR_STREAM_WINDOW_SECONDS * SAMPLE_RATE)
+
+    def append(self, samples: np.ndarray):
+        """追加新录到的音频"""
+        if len(samples):
+            self.audio = np.concatenate([self.audio, samples])
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+    @property
+    def text(self) -> str:
+        return " ".join(seg.text for seg in self.committed + self.tentative if seg.text).strip()
+
+    def ready(self) -> bool:
+        """新增音频是否足够进行一次临时识别"""
+        return len(self.audio) - self._decoded_until >= self._step
+
+    async def partial(self) -> Optional[str]:
+        """
+        识别当前窗口，返回临时全文
+
+        识别队列已满时跳过本次（返回 None），不影响最终结果
+        """
+        if asr_pool.saturated():
+            return None
+        await self._decode(final=False)
+        return self.text
+
+    async def finish(self) -> TranscriptionResult:
+        """
+        录音结束：识别剩余部分并返回最终结果
+
+        Raises:
+            ASRBusyError: 识别队列已满
+        """
+        if len(self.audio) > self._committed_until:
+            await self._decode(final=True)
+        return build_transcription(list(self.committed), self.duration)
+
+    async def _decode(self, final: bool):
+        end = len(self.audio)
+        window = self.audio[self._committed_until:end]
+        offset = self._committed_until / SAMPLE_RATE
+        # 实时识别固定用贪心解码；临时识别只需要文字，最后一段同时对齐逐词时间戳，用于停顿统计
+        started = time.monotonic()
+        segments = await asr_pool.run(run_whisper, window, offset, "greedy", final)
+        decode_stats.record("stream", len(window) / SAMPLE_RATE, time.monotonic() - started)
+        self._decoded_until = end
+
+        if final:
+            self.committed.extend(segments)
+            self.tentative = []
+            self._committed_until = end
+            return
+
+        if end - self._committed_until > self._window:
+            window_end = end / SAMPLE_RATE
+            stable = [seg for seg in segments[:-1] if seg.end < window_end - 1.0]
+            if not stable and end - self._committed_until > 2 * self._window:
+                # 长时间没有停顿，只能整体固定
+                stable = segments
+            if stable:
+                self.committed.extend(stable)
+                self._committed_until = min(end, int(stable[-1].end * SAMPLE_RATE))
+                segments = segments[len(stable):]
+
+        self.tentative = segments
@@ -0,0 +1,456 @@
+"""
+音频解码 / 编码
+把上传的音频（webm / ogg / mp3 / wav / mp4 等）直接在内存中解码为 Whisper 需要的
+16kHz 单声道 float32 数组，不写临时文件，也不阻塞事件循环。
+已经是 16kHz 单声道 PCM 的 WAV 直接取出采样，不经过解码器。
+合成的语音可以转码为其他格式（Opus / 低码率 MP3），数据边输入边输出
+"""
+
+import asyncio
+import io
+import logging
+import shutil
+import struct
+import threading
+import wave
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper 模型的输入采样率
+SAMPLE_RATE = 16000
+
+
+class AudioDecodeError(ValueError):
+    """音频无法解码（格式不支持或文件损坏）"""
+
+
+class AudioEncodeError(RuntimeError):
+    """音频转码失败"""
+
+
+async def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    解码音频为单声道 float32 数组（取值范围 [-1, 1]）
+
+    优先在线程池中用 PyAV 解码（内存中的可随机访问文件，mp4 等容器也能处理）；
+    PyAV 不可用或解码失败时，把数据通过管道送入异步 ffmpeg 子进程
+
+    Args:
+        data: 音频文件的二进制内容
+        sample_rate: 目标采样率
+
+    Returns:
+        一维 float32 数组
+
+    Raises:
+        AudioDecodeError: 两种方式都无法解码时
+    """
+    audio = passthrough_wav(data, sample_rate)
+    if audio is not None:
+        return audio
+
+    try:
+        return await asyncio.to_thread(_decode_with_pyav, data, sample_rate)
+    except ImportError:
+        logger.warning("未安装 PyAV，改用 ffmpeg 解码（pip install av）")
+    except Exception as e:
+        logger.warning(f"PyAV 解码失败，改用 ffmpeg: {str(e)}")
+
+    return await _decode_with_ffmpeg(data, sample_rate)
+
+
+class _BlockingPipe:
+    """供 PyAV 读取的只读文件对象：没有新数据时阻塞等待，关闭后返回 EOF"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def write(self, data: bytes):
+        with self._condition:
+            self._buffer.extend(data)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def read(self, size: int = -1) -> bytes:
+        with self._condition:
+            while not self._buffer and not self._closed:
+                self._condition.wait()
+            if size < 0:
+                size = len(self._buffer)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+
+class StreamingDecoder:
+    """
+    容器格式（webm / ogg 等，如 MediaRecorder 分片）的增量解码
+
+    分片写入管道，后台线程中的 PyAV 边收边解码，每个字节只解码一次；
+    解码出的 16kHz 单声道采样通过 take() 取出。每个实例占用一个线程，直到 finish() / close()
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.error: Optional[Exception] = None
+        self._pipe = _BlockingPipe()
+        self._decoded: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, data: bytes):
+        """写入新收到的数据"""
+        self._pipe.write(data)
+
+    def take(self) -> np.ndarray:
+        """取出目前已解码、尚未取出的采样"""
+        with self._lock:
+            chunks, self._decoded = self._decoded, []
+        if not chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(chunks)
+
+    async def finish(self) -> np.ndarray:
+        """
+        数据已全部写入：等待解码完成，返回剩余的采样
+
+        Raises:
+            AudioDecodeError: 解码过程中出错（未安装 PyAV、格式不支持或数据损坏）
+        """
+        self._pipe.close()
+        await asyncio.to_thread(self._thread.join)
+        if self.error is not None:
+            raise AudioDecodeError(f"增量解码失败: {str(self.error)}")
+        return self.take()
+
+    def close(self):
+        """放弃解码（连接中断时），后台线程读到 EOF 后退出"""
+        self._pipe.close()
+
+    def _run(self):
+        try:
+            import av
+
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=self.sample_rate)
+            with av.open(self._pipe, mode="r", metadata_errors="ignore") as container:
+                if not container.streams.audio:
+                    raise AudioDecodeError("文件中没有音频轨道")
+                for frame in _decode_frames(container, container.streams.audio[0]):
+                    self._append(resampler.resample(frame))
+            self._append(resampler.resample(None))
+        except Exception as e:
+            self.error = e
+
+    def _append(self, frames):
+        with self._lock:
+            for frame in frames:
+                self._decoded.append(frame.to_ndarray().reshape(-1).astype(np.float32) / 32768.0)
+
+
+# WAV 格式代码
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def passthrough_wav(data: bytes, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    识别已经是 Whisper 原生格式的 WAV（目标采样率、单声道、16 位整数或 32 位浮点 PCM），
+    直接取出采样，不需要解码和重采样
+
+    只读取文件头，不符合条件时返回 None（交给解码器处理）
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+
+        if chunk_id == b"fmt " and size >= 16:
+            audio_format, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if audio_format == _WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                # 真正的格式在 SubFormat GUID 的前两个字节
+                audio_format = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (audio_format, channels, rate, bits)
+
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            audio_format, channels, rate, bits = fmt
+            if channels != 1 or rate != sample_rate:
+                return None
+
+            # 管道输出的 WAV 长度字段可能为 0 或 0xFFFFFFFF，此时取到文件末尾
+            end = len(data) if size == 0 or body + size > len(data) else body + size
+            payload = data[body:end]
+            if audio_format == _WAVE_FORMAT_PCM and bits == 16:
+                usable = len(payload) - len(payload) % 2
+                return pcm16_to_float32(payload[:usable])
+            if audio_format == _WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+                usable = len(payload) - len(payload) % 4
+                return np.frombuffer(payload[:usable], dtype="<f4").copy()
+            return None
+
+        # 块按偶数字节对齐
+        pos = body + size + (size & 1)
+
+    return None
+
+
+def _decode_with_pyav(data: bytes, sample_rate: int) -> np.ndarray:
+    """用 PyAV 解码并重采样（同步，在线程池中执行）"""
+    import av
+
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+    chunks = []
+
+    with av.open(io.BytesIO(data), mode="r", metadata_errors="ignore") as container:
+        if not container.streams.audio:
+            raise AudioDecodeError("文件中没有音频轨道")
+        stream = container.streams.audio[0]
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        # 取出重采样器中剩余的数据
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32) / 32768.0
+
+
+async def _decode_with_ffmpeg(data: bytes, sample_rate: int) -> np.ndarray:
+    """通过 stdin / stdout 管道调用 ffmpeg，输出原始 float32 PCM"""
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path is None:
+        raise AudioDecodeError("无法解码音频：PyAV 解码失败且未找到 ffmpeg")
+
+    process = await asyncio.create_subprocess_exec(
+        ffmpeg_path,
+        "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn",  # 不要视频
+        "-f", "f32le",  # 原始 32 位浮点 PCM
+        "-acodec", "pcm_f32le",
+        "-ac", "1",  # 单声道
+        "-ar", str(sample_rate),  # 采样率
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(data)
+
+    if process.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg 解码失败: {stderr.decode(errors='ignore').strip()}")
+
+    return np.frombuffer(stdout, dtype=np.float32).copy()
+
+
+def pcm16_to_float32(data: bytes) -> np.ndarray:
+    """16 位小端 PCM 转为 float32 数组（调用方保证字节数为偶数）"""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def float32_to_wav(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """float32 数组封装为 16 位 WAV 文件（用于发送给远程识别接口）"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+async def encode_audio(
+    data: bytes,
+    codec: str,
+    container: str,
+    bitrate: int,
+    sample_rate: Optional[int] = None
+) -> bytes:
+    """
+    把一段完整的音频转码为指定格式
+
+    Args:
+        data: 源音频（任意可解码的格式）
+        codec: 编码器名称（libopus / libmp3lame）
+        container: 输出容器（webm / ogg / mp3）
+        bitrate: 码率（kbps）
+        sample_rate: 输出采样率，None 表示保持源采样率
+
+    Raises:
+        AudioEncodeError: 转码失败时
+    """
+    if shutil.which("ffmpeg") is None:
+        return await _encode_with_pyav(data, codec, container, bitrate, sample_rate)
+
+    async def source() -> AsyncIterator[bytes]:
+        yield data
+
+    return b"".join([chunk async for chunk in encode_audio_stream(source(), codec, container, bitrate, sample_rate)])
+
+
+async def encode_audio_stream(
+    chunks: AsyncIterator[bytes],
+    codec: str,
+    container: str,
+    bitrate: int,
+    sample_rate: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    流式转码：源音频数据块送入 ffmpeg 子进程的 stdin，同时从 stdout 读取输出，
+    首段输出不需要等源音频全部到达
+
+    未安装 ffmpeg 时收集全部源数据后用 PyAV 转码（不再是流式）
+    """
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path is None:
+        logger.warning("未找到 ffmpeg，改用 PyAV 整段转码")
+        data = b"".join([chunk async for chunk in chunks])
+        if data:
+            yield await _encode_with_pyav(data, codec, container, bitrate, sample_rate)
+        return
+
+    args = [
+        ffmpeg_path,
+        "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn",  # 不要视频
+        "-ac", "1",  # 单声道
+        "-c:a", codec,
+        "-b:a", f"{bitrate}k",
+    ]
+    if sample_rate:
+        args += ["-ar", str(sample_rate)]
+    args += ["-f", container, "pipe:1"]
+
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    written = 0
+
+    async def feed():
+        nonlocal written
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                written += len(chunk)
+                await process.stdin.drain()
+        finally:
+            process.stdin.close()
+
+    # 同时写入和读取，避免管道缓冲区写满后互相等待
+    writer = asyncio.create_task(feed())
+    try:
+        while True:
+            chunk = await process.stdout.read(16384)
+            if not chunk:
+                break
+            yield chunk
+        await writer
+        stderr = await process.stderr.read()
+        # 源音频为空（如 Mock 模式）时没有输出，不算错误
+        if await process.wait() != 0 and written:
+            raise AudioEncodeError(f"ffmpeg 转码失败: {stderr.decode(errors='ignore').strip()}")
+    finally:
+        writer.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+async def _encode_with_pyav(
+    data: bytes,
+    codec: str,
+    container: str,
+    bitrate: int,
+    sample_rate: Optional[int]
+) -> bytes:
+    try:
+        return await asyncio.to_thread(_encode_with_pyav_sync, data, codec, container, bitrate, sample_rate)
+    except ImportError:
+        raise AudioEncodeError("无法转码音频：未安装 PyAV 且未找到 ffmpeg")
+    except AudioEncodeError:
+        raise
+    except Exception as e:
+        raise AudioEncodeError(f"PyAV 转码失败: {str(e)}")
+
+
+def _encode_with_pyav_sync(
+    data: bytes,
+    codec: str,
+    container: str,
+    bitrate: int,
+    sample_rate: Optional[int]
+) -> bytes:
+    """用 PyAV 解码并重新编码（同步，在线程池中执行）"""
+    import av
+
+    output = io.BytesIO()
+    with av.open(io.BytesIO(data), mode="r", metadata_errors="ignore") as source, \
+            av.open(output, mode="w", format=container) as target:
+        if not source.streams.audio:
+            raise AudioEncodeError("源音频中没有音频轨道")
+        in_stream = source.streams.audio[0]
+        rate = sample_rate or in_stream.rate
+        out_stream = target.add_stream(codec, rate=rate, layout="mono")
+        out_stream.bit_rate = bitrate * 1000
+        sample_format = out_stream.codec_context.codec.audio_formats[0].name
+        out_stream.codec_context.format = sample_format
+
+        # 按编码器要求的帧长重新分帧（Opus 每帧固定 960 个采样）
+        resampler = None
+
+        def mux(frame):
+            for packet in out_stream.encode(frame):
+                target.mux(packet)
+
+        for frame in _decode_frames(source, in_stream):
+            if resampler is None:
+                resampler = av.AudioResampler(
+                    format=sample_format,
+                    layout="mono",
+                    rate=rate,
+                    frame_size=out_stream.codec_context.frame_size or None
+                )
+            for resampled in resampler.resample(frame):
+                mux(resampled)
+        if resampler is not None:
+            for resampled in resampler.resample(None):
+                mux(resampled)
+        mux(None)
+
+    return output.getvalue()
+
+
+def _decode_frames(container, stream):
+    """逐包解码，跳过损坏的数据包（拼接的 MP3 中间可能有无法解码的帧）"""
+    import av
+
+    for packet in container.demux(stream):
+        try:
+            yield from packet.decode()
+        except av.InvalidDataError:
+            continue
@@ -0,0 +1,209 @@
+"""
+通用缓存模块
+提供内存 LRU 缓存和按容量淘汰的磁盘缓存，供 LLM / ASR / TTS 结果复用
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryLRUCache:
+    """
+    内存 LRU 缓存
+
+    超过条目上限时淘汰最久未访问的条目；可选 TTL，过期条目在读取时删除
+    """
+
+    def __init__(self, max_items: int, ttl_seconds: Optional[float] = None):
+        self.max_items = max(0, max_items)
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, created_at = item
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        """写入缓存"""
+        if self.max_items == 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """命中率统计"""
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "max_items": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class DiskLRUCache:
+    """
+    磁盘缓存（按总容量 LRU 淘汰）
+
+    每个条目一个文件，文件名即缓存键（调用方负责传入哈希值）。
+    mtime 记录写入时间（用于 TTL），atime 记录最近访问时间（用于重启后恢复 LRU 顺序）。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max(0, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (文件大小, 写入时间)，按访问顺序排列
+        self._index: "OrderedDict[str, tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        # 按前两位分目录，避免单目录文件过多
+        return self.directory / key[:2] / key
+
+    def _ensure_loaded(self):
+        """首次使用时扫描磁盘，重建索引（调用方持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            stat = path.stat()
+            entries.append((stat.st_atime, path.name, stat.st_size, stat.st_mtime))
+
+        for _, key, size, created_at in sorted(entries):
+            self._index[key] = (size, created_at)
+            self._total_bytes += size
+
+        self._evict()
+
+    def _remove(self, key: str):
+        size, _ = self._index.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._index and self._total_bytes > self.max_bytes:
+            oldest = next(iter(self._index))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存，未命中或已过期返回 None"""
+        with self._lock:
+            self._ensure_loaded()
+            item = self._index.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            _, created_at = item
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                # 只更新访问时间，保留写入时间用于 TTL
+                os.utime(path, (time.time(), created_at))
+            except FileNotFoundError:
+                # 文件被外部删除
+                size, _ = self._index.pop(key)
+                self._total_bytes -= size
+                self.misses += 1
+                return None
+
+            self._index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def contains(self, key: str) -> bool:
+        """是否缓存了该条目且未过期（不读取文件，不计入命中率）"""
+        with self._lock:
+            self._ensure_loaded()
+            item = self._index.get(key)
+            if item is None:
+                return False
+            _, created_at = item
+            return not (self.ttl_seconds and time.time() - created_at > self.ttl_seconds)
+
+    def set(self, key: str, data: bytes):
+        """写入缓存；单个条目超过总容量时不缓存"""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            if key in self._index:
+                self._remove(key)
+
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换，避免并发读到半个文件
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._index[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self._evict()
+
+    def stats(self) -> Dict:
+        """容量和命中率统计"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -33,25 +33,91 @@ class Settings(BaseSettings):
 
     # Ollama 配置（开源方案）
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_BASE_URLS: str = ""  # 多个 Ollama 节点（逗号分隔），为空时只使用 OLLAMA_BASE_URL
     OLLAMA_MODEL: str = "qwen2.5:3b"  # 轻量级模型，适合 8GB 内存
+    OLLAMA_KEEP_ALIVE: str = "30m"  # 模型在内存中保留的时长，保留期间复用会话前缀的 KV 缓存
+    OLLAMA_NUM_CTX: int = 8192  # 固定上下文长度：所有请求一致可避免模型重新加载，整场面试不被截断
+    OLLAMA_HEALTH_CHECK_INTERVAL: float = 15.0  # 节点健康检查间隔（秒），0 表示关闭
+    OLLAMA_OPENAI_OVERFLOW: bool = False  # 所有 Ollama 节点不可用时改用 OpenAI（需配置 OPENAI_API_KEY）
+
+    # HTTP 连接池配置（Ollama / OpenAI 客户端在应用生命周期内复用）
+    HTTP_MAX_CONNECTIONS: int = 20  # 每个后端的最大连接数
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10  # 最多保留的空闲 keep-alive 连接数
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保留时长（秒）
+    HTTP_CONNECT_TIMEOUT: float = 5.0  # 建立连接超时（秒）
+    HTTP2_ENABLED: bool = True  # 后端支持时启用 HTTP/2（需要安装 h2）
+
+    # LLM 并发调度（超出上限的请求排队，交互请求优先于批量请求）
+    LLM_MAX_CONCURRENCY_OLLAMA: int = 2  # 每个 Ollama 节点同时处理的请求数
+    LLM_MAX_CONCURRENCY_OPENAI: int = 16  # OpenAI API 同时在途的请求数
+
+    # LLM 超时预算 / 重试 / 熔断
+    LLM_DEADLINE_INTERACTIVE: float = 90.0  # 交互接口（聊天、面试、自我介绍）的总超时预算（秒）
+    LLM_DEADLINE_BULK: float = 600.0  # 批量任务（PPT 示范话术、视频分析）的总超时预算（秒）
+    LLM_RETRY_ATTEMPTS: int = 2  # 连接失败或 5xx 时的最大重试次数
+    LLM_RETRY_BACKOFF_BASE: float = 0.5  # 退避基数（秒），实际等待为 [0, base * 2^n] 内随机
+    LLM_RETRY_BACKOFF_MAX: float = 8.0  # 单次退避上限（秒）
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    LLM_BREAKER_RESET_SECONDS: float = 30.0  # 熔断后多久放行探测请求（秒）
+
+    # 示范话术批量生成
+    DEMO_BATCH_MAX_SLIDES: int = 8  # 一次 LLM 请求最多生成几页的话术，1 表示逐页生成
+    DEMO_SCRIPTS_LAZY: bool = False  # 上传后立即返回，示范话术在后台按需生成（可用 lazy_demo 参数覆盖）
+    DEMO_AUDIO_PRERENDER: bool = False  # 上传后在后台按页序预合成示范语音（可用 prerender_audio 参数覆盖）
 
     # ASR 配置
     ASR_API_KEY: str = ""  # OpenAI Whisper API Key（付费）
     WHISPER_MODEL: str = "tiny"  # 本地 Whisper 模型：tiny/base/small（8GB 推荐 tiny 或 base）
+    WHISPER_DEVICE: str = "cpu"  # 推理设备：cpu / cuda
+    WHISPER_COMPUTE_TYPE: str = "int8"  # 计算精度：int8 量化减少内存，GPU 可用 float16
+    WHISPER_PRELOAD: bool = False  # 启动时预先加载模型，避免第一次识别等待加载
+    ASR_EXECUTOR: str = "thread"  # 识别执行器：thread（共用一个模型）/ process（每个进程一份模型）
+    ASR_WORKERS: int = 2  # 同时解码的数量
+    ASR_CPU_THREADS: int = 0  # 每路解码的 CPU 线程数，0 表示按核数平均分配
+    ASR_QUEUE_SIZE: int = 8  # 最多排队的识别请求数，超过时返回 503
+    ASR_CHUNK_SECONDS: float = 30.0  # 长音频按语音边界切块的最大长度（秒），各块并行识别
+    ASR_CHUNK_OVERLAP_SECONDS: float = 1.0  # 每块前后额外带上的重叠音频（秒），拼接时去重
+    ASR_PROFILE_INTERVIEW: str = "greedy"  # 面试回答的解码配置：greedy（贪心，最快）/ beam（束搜索，更准）/ batched（批量推理）
+    ASR_PROFILE_SELF_INTRO: str = "greedy"  # 自我介绍的解码配置
+    ASR_PROFILE_PRESENTATION: str = "beam"  # 演讲视频的解码配置（长音频可改为 batched）
+    ASR_BATCH_SIZE: int = 8  # batched 配置每批送入模型的音频块数
+    ASR_STREAM_STEP_SECONDS: float = 1.0  # 实时识别：每新增多少秒音频刷新一次临时结果
+    ASR_STREAM_WINDOW_SECONDS: float = 15.0  # 实时识别：滚动窗口长度，超过后固定已稳定的片段
+    ASR_PAUSE_SECONDS: float = 0.5  # 相邻两个词间隔超过该值计为一次停顿（语速统计）
+    ASR_CACHE_MAX_BYTES: int = 128 * 1024 * 1024  # 识别结果磁盘缓存容量上限（字节），0 表示不缓存
+    ASR_CACHE_TTL_SECONDS: int = 30 * 24 * 3600  # 识别结果缓存有效期（秒），0 表示不过期
 
     # TTS 配置
     TTS_API_KEY: str = ""  # OpenAI TTS API Key（付费）
     EDGE_TTS_VOICE: str = "zh-CN-XiaoxiaoNeural"  # edge-tts 中文语音
+    EDGE_TTS_RATE: str = "+0%"  # edge-tts 语速，如 -10% / +20%
+    TTS_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 合成音频磁盘缓存容量上限（字节），0 表示不缓存
+    TTS_CACHE_TTL_SECONDS: int = 0  # 合成音频缓存有效期（秒），0 表示不过期
+    TTS_SENTENCE_MAX_CHARS: int = 200  # 流式合成时每段的最大字数（按句切分，过长的句子在逗号处切开）
+    TTS_PARALLELISM: int = 4  # 长文本按句分组后同时合成的最大段数，1 表示不切分
+    TTS_SHARD_MIN_CHARS: int = 120  # 文本达到该字数才分组并发合成
 
     # 文件存储配置
     UPLOAD_DIR: str = "uploads"  # 上传文件存储目录
     STATIC_DIR: str = "static"  # 静态文件（转换后的图片）存储目录
+    CACHE_DIR: str = "data/cache"  # 结果缓存目录（LLM 回复等）
+
+    # LLM 回复缓存（仅对调用方显式开启 cache=True 的确定性提示词生效）
+    LLM_CACHE_MEMORY_ITEMS: int = 512  # 内存 LRU 最多缓存条数
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 磁盘缓存容量上限（字节）
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # 缓存有效期（秒），0 表示不过期
 
     @property
     def cors_origins_list(self) -> List[str]:
         """将 CORS origins 字符串转为列表"""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
 
+    @property
+    def ollama_base_urls(self) -> List[str]:
+        """所有 Ollama 节点地址"""
+        urls = [url.strip() for url in self.OLLAMA_BASE_URLS.split(",") if url.strip()]
+        return urls or [self.OLLAMA_BASE_URL]
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
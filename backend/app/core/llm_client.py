@@ -8,14 +8,710 @@ import os
 os.environ["HF_HUB_DISABLE_PROGRESS_BARS"] = "1"
 
 import asyncio
+import hashlib
+import heapq
+import importlib.util
+import itertools
+import json
 import logging
-from typing import List, Dict
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional, Union
+import httpx
+import numpy as np
+from app.core.asr import (
+    asr_pool, build_transcription, decode_stats, get_decode_profile, run_whisper, transcribe_long_audio,
+    transcription_cache, whisper_model_id
+)
+from app.core.audio import (
+    SAMPLE_RATE, AudioDecodeError, decode_audio, encode_audio, encode_audio_stream, float32_to_wav
+)
+from app.core.cache import DiskLRUCache, MemoryLRUCache
 from app.core.config import settings
+from app.core.stats import percentile
+from app.core.tts import (
+    OPENAI_TTS_MODEL, OPENAI_TTS_VOICE, TTSCodec, join_mp3, resolve_tts_format, shard_text, split_sentences,
+    synthesize_in_order, tts_cache, tts_cache_key, tts_format_label, tts_stats
+)
+from app.models.audio import TranscriptSegment, TranscriptWord, TranscriptionResult
 from app.models.chat import Message
 
 logger = logging.getLogger(__name__)
 
 
+def _http2_available() -> bool:
+    """HTTP/2 需要 h2 包，未安装时回退到 HTTP/1.1"""
+    if not settings.HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("未安装 h2，HTTP/2 已禁用（pip install 'httpx[http2]'）")
+        return False
+    return True
+
+
+def _http_limits() -> httpx.Limits:
+    """根据配置构建连接池限制"""
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class LLMPriority(IntEnum):
+    """LLM 请求优先级（数值越小越先执行）"""
+    INTERACTIVE = 0  # 用户正在等待的请求：聊天、面试、自我介绍
+    BULK = 1  # 后台批量请求：逐页示范话术、整份 PPT 示范讲解
+
+
+class _BackendQueue:
+    """单个后端的并发槽位和等待队列"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self._waiters: list = []  # 堆：(priority, seq, future)
+        self._seq = itertools.count()
+        self._waits = {p: deque(maxlen=500) for p in LLMPriority}
+        self._completed = {p: 0 for p in LLMPriority}
+
+    async def acquire(self, priority: LLMPriority) -> float:
+        """获取一个并发槽位，返回排队等待的秒数"""
+        start = time.monotonic()
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (int(priority), next(self._seq), future)
+            heapq.heappush(self._waiters, entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 槽位已经分配给我们，但调用方被取消，需要归还
+                    self._release_slot()
+                else:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+
+        waited = time.monotonic() - start
+        self._waits[priority].append(waited)
+        return waited
+
+    def release(self, priority: LLMPriority):
+        """归还槽位，并唤醒优先级最高的等待者"""
+        self._completed[priority] += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # 槽位直接转交给下一个等待者，in_flight 不变
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        """当前队列深度和等待时间统计"""
+        queued = {p.name.lower(): 0 for p in LLMPriority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[LLMPriority(priority).name.lower()] += 1
+
+        waits = {}
+        for priority, samples in self._waits.items():
+            values = list(samples)
+            waits[priority.name.lower()] = {
+                "completed": self._completed[priority],
+                "wait_p50_ms": round(percentile(values, 50) * 1000, 1),
+                "wait_p95_ms": round(percentile(values, 95) * 1000, 1),
+                "wait_max_ms": round(max(values, default=0.0) * 1000, 1),
+            }
+
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": queued,
+            "priorities": waits,
+        }
+
+
+class LLMScheduler:
+    """
+    LLM 请求调度器
+
+    按后端限制同时在途的请求数；槽位紧张时交互请求优先于批量请求
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self._queues = {name: _BackendQueue(name, limit) for name, limit in limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, backend: str, priority: LLMPriority = LLMPriority.INTERACTIVE):
+        """
+        占用一个后端并发槽位
+
+        Args:
+            backend: 后端名称（mock / ollama / openai）
+            priority: 请求优先级
+        """
+        queue = self._queues[backend]
+        remaining = remaining_budget()
+        try:
+            waited = await asyncio.wait_for(queue.acquire(priority), remaining)
+        except asyncio.TimeoutError:
+            raise LLMDeadlineExceeded(f"LLM 请求排队超时: backend={backend}")
+        if waited > 1.0:
+            logger.info(f"LLM 请求排队 {waited:.2f} 秒: backend={backend}, priority={priority.name}")
+        try:
+            yield
+        finally:
+            queue.release(priority)
+
+    def snapshot(self) -> Dict:
+        """所有后端的调度指标"""
+        return {name: queue.snapshot() for name, queue in self._queues.items()}
+
+
+class LLMResponseCache:
+    """
+    LLM 回复缓存（内存 LRU + 磁盘两级）
+
+    缓存键由 (后端, 模型, 消息, 生成参数) 的内容哈希得到，
+    相同的提示词无论来自哪个用户都会命中同一条缓存
+    """
+
+    def __init__(self):
+        ttl = settings.LLM_CACHE_TTL_SECONDS or None
+        self.memory = MemoryLRUCache(settings.LLM_CACHE_MEMORY_ITEMS, ttl_seconds=ttl)
+        self.disk = DiskLRUCache(
+            str(Path(settings.CACHE_DIR) / "llm"),
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            ttl_seconds=ttl,
+        )
+
+    @staticmethod
+    def make_key(backend: str, model: str, messages: List[Dict], options: Dict) -> str:
+        """计算请求内容的哈希作为缓存键"""
+        raw = json.dumps(
+            {"backend": backend, "model": model, "messages": messages, "options": options},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """先查内存再查磁盘，磁盘命中时回填内存"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        data = await asyncio.to_thread(self.disk.get, key)
+        if data is None:
+            return None
+
+        value = data.decode("utf-8")
+        self.memory.set(key, value)
+        return value
+
+    async def set(self, key: str, value: str):
+        """同时写入内存和磁盘"""
+        self.memory.set(key, value)
+        try:
+            await asyncio.to_thread(self.disk.set, key, value.encode("utf-8"))
+        except OSError as e:
+            # 磁盘缓存写入失败不影响主流程
+            logger.warning(f"LLM 磁盘缓存写入失败: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        """两级缓存的命中统计"""
+        return {"memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+def request_key(*parts: Any) -> str:
+    """
+    把请求参数规范化后计算哈希（用于合并相同请求）
+
+    bytes / numpy 数组先取 sha256，字符串去掉首尾空白，其余按 JSON 排序序列化
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = {"sha256": hashlib.sha256(part.tobytes()).hexdigest(), "dtype": str(part.dtype)}
+        elif isinstance(part, (bytes, bytearray)):
+            part = {"sha256": hashlib.sha256(part).hexdigest()}
+        elif isinstance(part, str):
+            part = part.strip()
+        normalized.append(part)
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    合并进行中的相同请求
+
+    同一个键在执行期间再次被调用时，不再发起新的请求，而是等待同一个结果
+    （例如多个用户同时对同一份共享 PPT 点击"生成示范讲解"）。
+    底层调用在后台任务中执行，沿用第一个调用方的上下文（包括超时预算）；
+    所有调用方都取消后才取消底层调用
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, list] = {}  # key -> [任务, 等待者数量]
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, kind: str, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行调用，相同键的并发调用共享同一个结果
+
+        Args:
+            kind: 调用类型（llm / asr / tts / vision），用于分类统计
+            key: 规范化后的请求键（见 request_key）
+            call: 实际发起请求的函数
+        """
+        stats = self._stats.setdefault(kind, {"calls": 0, "coalesced": 0})
+        stats["calls"] += 1
+
+        full_key = f"{kind}:{key}"
+        entry = self._inflight.get(full_key)
+        if entry is None:
+            task = asyncio.create_task(call())
+            entry = [task, 0]
+            self._inflight[full_key] = entry
+            task.add_done_callback(lambda t: self._finish(full_key, t))
+        else:
+            stats["coalesced"] += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key, [None])[0] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 没有等待者时也要取出异常，避免 "exception was never retrieved" 警告
+            task.exception()
+
+    def snapshot(self) -> Dict:
+        """各类调用的合并次数"""
+        in_flight: Dict[str, int] = {}
+        for key in self._inflight:
+            kind = key.split(":", 1)[0]
+            in_flight[kind] = in_flight.get(kind, 0) + 1
+        return {
+            kind: {**stats, "in_flight": in_flight.get(kind, 0)}
+            for kind, stats in self._stats.items()
+        }
+
+
+# ============ 超时预算 / 重试 / 熔断 ============
+
+class LLMDeadlineExceeded(TimeoutError):
+    """请求的超时预算已经用完"""
+
+
+class CircuitOpenError(ConnectionError):
+    """后端熔断中，直接失败而不再发送请求"""
+
+    def __init__(self, backend: str, retry_after: float):
+        self.backend = backend
+        self.retry_after = retry_after
+        super().__init__(f"LLM 后端 {backend} 暂时不可用，请 {retry_after:.0f} 秒后重试")
+
+
+# 当前请求的截止时间（time.monotonic()），由接口层通过 llm_deadline() 设置
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def llm_deadline(seconds: float):
+    """
+    为当前请求设置 LLM 调用的总超时预算
+
+    在接口中包住所有 LLM 调用，排队、重试和单次请求都只能使用剩余的预算。
+    嵌套使用时取更早的截止时间。
+    不要在异步生成器中跨 yield 使用（客户端断开时生成器在另一个上下文中关闭，无法复位），
+    流式调用请改用 call_llm_stream 的 timeout 参数
+
+    Args:
+        seconds: 预算秒数
+    """
+    with _deadline_at(time.monotonic() + seconds):
+        yield
+
+
+@contextmanager
+def _deadline_at(deadline: Optional[float]):
+    """在当前上下文中设置截止时间（time.monotonic()），嵌套时取更早的；None 表示不变"""
+    if deadline is None:
+        yield
+        return
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """
+    当前请求剩余的超时预算（秒）
+
+    Returns:
+        未设置预算时返回 None
+
+    Raises:
+        LLMDeadlineExceeded: 预算已用完
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LLMDeadlineExceeded("LLM 请求超时（超出本次请求的时间预算）")
+    return remaining
+
+
+def _is_retryable(error: Exception) -> bool:
+    """连接失败和 5xx 可以重试；读超时说明后端卡住，不重试"""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+
+    # OpenAI SDK 的异常（未安装 openai 时跳过）
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code >= 500
+    error_type = type(error).__name__
+    return error_type == "APIConnectionError"
+
+
+def _is_timeout(error: Exception) -> bool:
+    """请求超时（httpx 或 OpenAI SDK）"""
+    return isinstance(error, (httpx.TimeoutException, TimeoutError)) or \
+        type(error).__name__ == "APITimeoutError"
+
+
+def _is_backend_failure(error: Exception) -> bool:
+    """计入熔断的失败：连接失败、超时和 5xx（4xx 说明后端仍然健康）"""
+    return _is_retryable(error) or _is_timeout(error)
+
+
+def _budget_exhausted() -> bool:
+    """超时预算是否已经（几乎）用完"""
+    deadline = _deadline.get()
+    return deadline is not None and deadline - time.monotonic() < 0.05
+
+
+class CircuitBreaker:
+    """
+    单个后端的熔断器
+
+    closed: 正常放行；连续失败达到阈值后进入 open
+    open: 直接失败，冷却时间过后进入 half_open
+    half_open: 只放行一个探测请求，成功则恢复 closed，失败则重新 open
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """发送请求前检查，熔断中直接抛出 CircuitOpenError"""
+        if self.state == "open":
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_seconds:
+                self.total_rejected += 1
+                raise CircuitOpenError(self.name, self.reset_seconds - elapsed)
+            self.state = "half_open"
+            self._probe_in_flight = False
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.total_rejected += 1
+                raise CircuitOpenError(self.name, self.reset_seconds)
+            self._probe_in_flight = True
+
+    def allows_request(self) -> bool:
+        """当前是否可以放行请求（不改变状态，用于路由选择和健康检查）"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.reset_seconds
+        return not self._probe_in_flight
+
+    def record_success(self):
+        """请求成功"""
+        if self.state != "closed":
+            logger.info(f"LLM 后端恢复: {self.name}")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """后端失败（连接失败、超时或 5xx）"""
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"LLM 后端熔断: {self.name}，连续失败 {self.consecutive_failures} 次")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """探测请求未得出结论（如 4xx 或被取消）时释放探测名额"""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        """熔断器状态"""
+        retry_after = 0.0
+        if self.state == "open":
+            retry_after = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+            "retry_after_seconds": round(retry_after, 1),
+        }
+
+
+def _min_timeout(*timeouts: Optional[float]) -> Optional[float]:
+    """取多个超时中最小的一个（忽略 None）"""
+    values = [t for t in timeouts if t is not None]
+    return min(values) if values else None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """指数退避 + 全抖动"""
+    cap = settings.LLM_RETRY_BACKOFF_BASE * (2 ** attempt)
+    return random.uniform(0, min(cap, settings.LLM_RETRY_BACKOFF_MAX))
+
+
+def _new_breaker(name: str) -> CircuitBreaker:
+    """按配置创建熔断器"""
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+    )
+
+
+class OllamaEndpoint:
+    """一个 Ollama 节点：独立的连接池、熔断器和在途请求计数"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = _new_breaker(self.base_url)
+        self.healthy = True
+        self.outstanding = 0
+        self.total_requests = 0
+        # Ollama 返回的用量统计，prompt_eval 只包含未命中前缀缓存、需要重新计算的部分
+        self.prompt_eval_tokens = 0
+        self.prompt_eval_ms = 0.0
+        self.eval_tokens = 0
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """该节点的 HTTP 客户端（惰性创建，复用 TCP 连接）"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Ollama 生成较慢，读超时保持 120 秒；连接超时单独缩短
+                timeout=httpx.Timeout(120.0, connect=settings.HTTP_CONNECT_TIMEOUT),
+                limits=_http_limits(),
+                http2=_http2_available(),
+                trust_env=False,  # 禁用代理，确保 localhost 连接正常
+            )
+        return self._http
+
+    @property
+    def available(self) -> bool:
+        """健康检查通过且未熔断"""
+        return self.healthy and self.breaker.allows_request()
+
+    def record_usage(self, result: Dict, session_id: Optional[str] = None):
+        """记录一次请求的 prompt 计算量（来自 Ollama 响应的 done 消息）"""
+        tokens = result.get("prompt_eval_count", 0)
+        ms = result.get("prompt_eval_duration", 0) / 1e6
+        self.prompt_eval_tokens += tokens
+        self.prompt_eval_ms += ms
+        self.eval_tokens += result.get("eval_count", 0)
+        if session_id:
+            logger.info(f"Ollama prompt 计算: session={session_id}, tokens={tokens}, {ms:.0f}ms")
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def snapshot(self) -> Dict:
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "total_requests": self.total_requests,
+            "prompt_eval_tokens": self.prompt_eval_tokens,
+            "prompt_eval_ms": round(self.prompt_eval_ms, 1),
+            "eval_tokens": self.eval_tokens,
+            "breaker": self.breaker.snapshot(),
+        }
+
+
+class LLMRouter:
+    """
+    Ollama 多节点路由
+
+    - 在可用节点中选择在途请求最少的节点
+    - 同一会话固定到同一节点（保持模型 KV 缓存命中）
+    - 后台定期探测 /api/tags，节点恢复后自动重新加入
+    """
+
+    MAX_STICKY_SESSIONS = 10000
+
+    def __init__(self, base_urls: List[str]):
+        self.endpoints = [OllamaEndpoint(url) for url in base_urls]
+        self._sticky: "OrderedDict[str, OllamaEndpoint]" = OrderedDict()
+        self._health_task: Optional[asyncio.Task] = None
+
+    def has_available(self) -> bool:
+        """是否至少有一个节点可用"""
+        return any(e.available for e in self.endpoints)
+
+    def ensure_available(self):
+        """没有可用节点时快速失败"""
+        if not self.has_available():
+            retry_after = min(
+                (e.breaker.snapshot()["retry_after_seconds"] for e in self.endpoints),
+                default=settings.LLM_BREAKER_RESET_SECONDS,
+            )
+            raise CircuitOpenError("ollama", retry_after or settings.OLLAMA_HEALTH_CHECK_INTERVAL)
+
+    def pick(self, session_id: Optional[str] = None) -> OllamaEndpoint:
+        """
+        选择一个节点
+
+        Args:
+            session_id: 会话 ID；传入时优先使用该会话之前固定的节点
+        """
+        candidates = [e for e in self.endpoints if e.available]
+        if not candidates:
+            self.ensure_available()
+
+        if session_id:
+            pinned = self._sticky.get(session_id)
+            if pinned in candidates:
+                self._sticky.move_to_end(session_id)
+                return pinned
+
+        # 在途请求最少优先；相同时选累计请求少的，空闲时也能轮流分配
+        endpoint = min(candidates, key=lambda e: (e.outstanding, e.total_requests))
+
+        if session_id:
+            if session_id in self._sticky and self._sticky[session_id] is not endpoint:
+                logger.info(f"会话迁移到新节点: session={session_id}, endpoint={endpoint.base_url}")
+            self._sticky[session_id] = endpoint
+            self._sticky.move_to_end(session_id)
+            while len(self._sticky) > self.MAX_STICKY_SESSIONS:
+                self._sticky.popitem(last=False)
+
+        return endpoint
+
+    def pinned_endpoint(self, session_id: str) -> Optional[OllamaEndpoint]:
+        """会话当前固定的节点"""
+        return self._sticky.get(session_id)
+
+    def release_session(self, session_id: str):
+        """会话结束后解除节点绑定"""
+        self._sticky.pop(session_id, None)
+
+    @contextmanager
+    def track(self, endpoint: OllamaEndpoint):
+        """统计节点的在途请求数"""
+        endpoint.outstanding += 1
+        endpoint.total_requests += 1
+        try:
+            yield
+        finally:
+            endpoint.outstanding -= 1
+
+    async def check_health(self):
+        """探测所有节点"""
+        async def probe(endpoint: OllamaEndpoint):
+            try:
+                response = await endpoint.http.get("/api/tags", timeout=settings.HTTP_CONNECT_TIMEOUT)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+
+            if healthy != endpoint.healthy:
+                logger.warning(f"Ollama 节点{'恢复' if healthy else '不可用'}: {endpoint.base_url}")
+            endpoint.healthy = healthy
+
+        await asyncio.gather(*[probe(e) for e in self.endpoints])
+
+    async def _health_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Ollama 健康检查失败: {str(e)}")
+
+    def start_health_checks(self, interval: float):
+        """启动后台健康检查"""
+        if interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(interval))
+
+    async def close(self):
+        """停止健康检查并关闭所有连接"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for endpoint in self.endpoints:
+            await endpoint.close()
+
+    def snapshot(self) -> Dict:
+        return {
+            "endpoints": [e.snapshot() for e in self.endpoints],
+            "sticky_sessions": len(self._sticky),
+        }
+
+
 class LLMClient:
     """LLM 客户端类"""
 
@@ -23,22 +719,351 @@ class LLMClient:
         self.use_mock = settings.USE_MOCK_LLM
         self.use_opensource = settings.USE_OPENSOURCE
 
-    async def call_llm(self, messages: List[Message]) -> str:
+        # 长连接客户端：在 FastAPI lifespan 中创建，关闭时统一释放
+        self._openai = None
+
+        # Ollama 节点池：按在途请求数负载均衡，会话粘性路由
+        self.router = LLMRouter(settings.ollama_base_urls)
+
+        # 按后端限制并发，交互请求优先（mock 模拟单个本地模型，沿用单节点的限制）
+        self.scheduler = LLMScheduler({
+            "mock": settings.LLM_MAX_CONCURRENCY_OLLAMA,
+            "ollama": settings.LLM_MAX_CONCURRENCY_OLLAMA * len(self.router.endpoints),
+            "openai": settings.LLM_MAX_CONCURRENCY_OPENAI,
+        })
+
+        # 确定性提示词的回复缓存，调用方按次开启（cache=True）
+        self.cache = LLMResponseCache()
+
+        # 合并进行中的相同请求（LLM / ASR / TTS / Vision）
+        self.singleflight = SingleFlight()
+
+        # OpenAI 熔断器（Ollama 每个节点各有一个，见 OllamaEndpoint）
+        self.openai_breaker = _new_breaker("openai")
+
+    @property
+    def backend(self) -> str:
+        """当前使用的 LLM 后端名称"""
+        if self.use_mock:
+            return "mock"
+        return "ollama" if self.use_opensource else "openai"
+
+    async def startup(self):
+        """
+        应用启动时创建连接池
+
+        只预先创建当前配置用到的后端；另一个后端在首次使用时惰性创建
+        """
+        if self.use_mock:
+            return
+        if self.use_opensource:
+            await self.router.check_health()
+            self.router.start_health_checks(settings.OLLAMA_HEALTH_CHECK_INTERVAL)
+        else:
+            _ = self.openai
+        logger.info("LLM 连接池已就绪")
+
+    async def shutdown(self):
+        """应用关闭时释放连接池"""
+        await self.router.close()
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        logger.info("LLM 连接池已关闭")
+
+    def health(self) -> Dict:
+        """
+        后端健康状态（用于 /api/health）
+
+        Returns:
+            healthy: 当前后端是否可以接收请求
+        """
+        if self.backend == "mock":
+            healthy = True
+        elif self.backend == "ollama":
+            healthy = self.router.has_available() or self._can_overflow()
+        else:
+            healthy = self.openai_breaker.allows_request()
+
+        return {
+            "healthy": healthy,
+            "backend": self.backend,
+            "ollama": self.router.snapshot(),
+            "openai_breaker": self.openai_breaker.snapshot(),
+        }
+
+    def _can_overflow(self) -> bool:
+        """Ollama 全部不可用时能否溢出到 OpenAI"""
+        return settings.OLLAMA_OPENAI_OVERFLOW and bool(settings.OPENAI_API_KEY)
+
+    @property
+    def openai(self):
+        """共享的 AsyncOpenAI 客户端（LLM / ASR / TTS 共用一个连接池）"""
+        if self._openai is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            self._openai = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=0,  # 重试由 _guarded_call 统一处理（带超时预算和熔断）
+                http_client=DefaultAsyncHttpxClient(
+                    limits=_http_limits(),
+                    http2=_http2_available(),
+                ),
+            )
+        return self._openai
+
+    async def call_llm(
+        self,
+        messages: List[Message],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
         """
         调用 LLM 获取回复
 
         Args:
             messages: 消息列表,包含 system prompt、历史对话和当前用户输入
+            priority: 调度优先级,后台批量任务传 LLMPriority.BULK
+            cache: 是否使用回复缓存（只对只依赖输入内容的提示词开启）
+            session_id: 会话 ID，同一会话固定路由到同一个 Ollama 节点
 
         Returns:
             AI 的回复文本
         """
-        if self.use_mock:
-            return await self._mock_llm_response(messages)
-        elif self.use_opensource:
-            return await self._call_ollama(messages)
-        else:
-            return await self._call_openai(messages)
+        async def call() -> str:
+            if self.use_mock:
+                async with self.scheduler.slot("mock", priority):
+                    return await self._mock_llm_response(messages)
+            elif self.use_opensource:
+                return await self._call_ollama(messages, priority, cache, session_id)
+            else:
+                return await self._call_openai(messages, priority, cache)
+
+        # 会话 ID 决定路由节点，不同会话的相同请求不合并
+        key = request_key(self.backend, session_id, [(m.role, m.content) for m in messages])
+        return await self.singleflight.do("llm", key, call)
+
+    async def call_llm_stream(
+        self,
+        messages: List[Message],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式调用 LLM，逐段产出回复文本
+
+        并发槽位在整个流式输出期间保持占用
+
+        Args:
+            messages: 消息列表,与 call_llm 相同
+            priority: 调度优先级
+            session_id: 会话 ID，同一会话固定路由到同一个 Ollama 节点
+            timeout: 整个流式调用的超时预算（秒），从第一次迭代开始计算；
+                     与外层 llm_deadline 同时存在时取更早的截止时间
+
+        Yields:
+            模型新生成的文本片段（拼接后即完整回复）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stream = self._stream_llm(messages, priority, session_id)
+        try:
+            while True:
+                # 截止时间只在每一步内部生效，不跨越 yield
+                with _deadline_at(deadline):
+                    try:
+                        chunk = await stream.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _stream_llm(
+        self,
+        messages: List[Message],
+        priority: LLMPriority,
+        session_id: Optional[str]
+    ) -> AsyncIterator[str]:
+        """call_llm_stream 的实现：选择后端并在并发槽位内流式输出"""
+        backend = self.backend
+        if backend == "ollama" and not self.router.has_available() and self._can_overflow():
+            logger.warning("Ollama 节点全部不可用，流式请求溢出到 OpenAI")
+            backend = "openai"
+
+        async with self.scheduler.slot(backend, priority):
+            if backend == "mock":
+                stream = self._mock_llm_stream(messages)
+            elif backend == "ollama":
+                stream = self._guarded_stream(
+                    "ollama", lambda endpoint: self._stream_ollama(endpoint, messages, session_id), session_id
+                )
+            else:
+                stream = self._guarded_stream("openai", lambda _: self._stream_openai(messages))
+
+            async for chunk in stream:
+                if chunk:
+                    yield chunk
+
+    def _ensure_available(self, backend: str):
+        """排队前检查后端是否可用，全部熔断时直接失败"""
+        if backend == "ollama":
+            self.router.ensure_available()
+        elif not self.openai_breaker.allows_request():
+            raise CircuitOpenError("openai", self.openai_breaker.snapshot()["retry_after_seconds"])
+
+    def _select_target(
+        self,
+        backend: str,
+        session_id: Optional[str]
+    ) -> tuple[CircuitBreaker, Optional[OllamaEndpoint]]:
+        """选择本次尝试的目标：Ollama 走节点路由，OpenAI 只有一个目标"""
+        if backend == "ollama":
+            endpoint = self.router.pick(session_id)
+            return endpoint.breaker, endpoint
+        return self.openai_breaker, None
+
+    async def _guarded_call(
+        self,
+        backend: str,
+        priority: LLMPriority,
+        send: Callable[[Optional[OllamaEndpoint], Optional[float]], Awaitable[Any]],
+        session_id: Optional[str] = None
+    ) -> Any:
+        """
+        带路由、熔断、重试和超时预算的后端调用
+
+        每次尝试都重新排队获取槽位（退避期间不占用槽位），并重新选择节点，
+        因此 Ollama 节点故障时重试会自动切换到其他节点；
+        连接失败和 5xx 按指数退避 + 抖动重试，重试总时长受超时预算约束
+
+        Args:
+            backend: 后端名称（ollama / openai）
+            priority: 调度优先级
+            send: 发送一次请求的函数，参数为 (目标节点, 本次请求可用的超时秒数)；
+                  OpenAI 的目标节点为 None，超时为 None 表示使用默认值
+            session_id: 会话 ID（粘性路由）
+        """
+        attempts = settings.LLM_RETRY_ATTEMPTS + 1
+
+        for attempt in range(attempts):
+            self._ensure_available(backend)
+            async with self.scheduler.slot(backend, priority):
+                # 排队结束后再选节点，保证在途计数是最新的
+                breaker, endpoint = self._select_target(backend, session_id)
+                breaker.before_call()
+                try:
+                    if endpoint is not None:
+                        with self.router.track(endpoint):
+                            result = await send(endpoint, remaining_budget())
+                    else:
+                        result = await send(None, remaining_budget())
+                except Exception as e:
+                    if _is_backend_failure(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.release_probe()
+                    error = e
+                except BaseException:
+                    # 被取消等情况，不计入熔断
+                    breaker.release_probe()
+                    raise
+                else:
+                    breaker.record_success()
+                    return result
+
+            if _is_timeout(error) and _budget_exhausted():
+                raise LLMDeadlineExceeded("LLM 请求超时（超出本次请求的时间预算）") from error
+            if not _is_retryable(error) or attempt == attempts - 1:
+                raise error
+
+            delay = _backoff_delay(attempt)
+            remaining = remaining_budget()
+            if remaining is not None and delay >= remaining:
+                raise error
+            logger.warning(
+                f"LLM 调用失败，{delay:.2f} 秒后重试 ({attempt + 1}/{attempts - 1}): "
+                f"backend={backend}, error={type(error).__name__}"
+            )
+            await asyncio.sleep(delay)
+
+    async def _guarded_stream(
+        self,
+        backend: str,
+        open_stream: Callable[[Optional[OllamaEndpoint]], AsyncIterator[str]],
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        带路由、熔断和重试的流式调用（调用方已持有调度槽位）
+
+        只有在尚未输出任何内容时才重试，避免前端收到重复的片段
+        """
+        attempts = settings.LLM_RETRY_ATTEMPTS + 1
+
+        for attempt in range(attempts):
+            self._ensure_available(backend)
+            breaker, endpoint = self._select_target(backend, session_id)
+            breaker.before_call()
+            emitted = False
+            try:
+                if endpoint is not None:
+                    with self.router.track(endpoint):
+                        async for chunk in open_stream(endpoint):
+                            emitted = True
+                            yield chunk
+                else:
+                    async for chunk in open_stream(None):
+                        emitted = True
+                        yield chunk
+            except Exception as e:
+                if _is_backend_failure(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release_probe()
+
+                if _is_timeout(e) and _budget_exhausted():
+                    raise LLMDeadlineExceeded("LLM 请求超时（超出本次请求的时间预算）") from e
+                if emitted or not _is_retryable(e) or attempt == attempts - 1:
+                    raise
+
+                delay = _backoff_delay(attempt)
+                remaining = remaining_budget()
+                if remaining is not None and delay >= remaining:
+                    raise
+                await asyncio.sleep(delay)
+            except BaseException:
+                breaker.release_probe()
+                raise
+            else:
+                breaker.record_success()
+                return
+
+    async def _cached(
+        self,
+        enabled: bool,
+        backend: str,
+        model: str,
+        messages: List[Dict],
+        options: Dict,
+        call: Callable[[], Awaitable[str]]
+    ) -> str:
+        """
+        缓存包装：命中时直接返回，不占用调度槽位；未命中时执行 call 并写入缓存
+        """
+        if not enabled:
+            return await call()
+
+        key = LLMResponseCache.make_key(backend, model, messages, options)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM 缓存命中: backend={backend}, key={key[:12]}")
+            return cached
+
+        result = await call()
+        await self.cache.set(key, result)
+        return result
 
     async def _mock_llm_response(self, messages: List[Message]) -> str:
         """
@@ -47,7 +1072,22 @@ class LLMClient:
         """
         # 模拟网络延迟
         await asyncio.sleep(0.5)
+        return self._mock_reply_text(messages)
 
+    async def _mock_llm_stream(self, messages: List[Message]) -> AsyncIterator[str]:
+        """
+        Mock 流式响应：模拟首字延迟后按固定速率逐段输出
+        便于在没有模型的情况下测量前端首字时间
+        """
+        await asyncio.sleep(0.1)
+        text = self._mock_reply_text(messages)
+        chunk_size = 4
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+            await asyncio.sleep(0.02)
+
+    def _mock_reply_text(self, messages: List[Message]) -> str:
+        """根据 system prompt 的内容选择 mock 回复"""
         # 获取 system prompt 来判断当前模式
         system_prompt = ""
         user_message = ""
@@ -131,168 +1171,406 @@ class LLMClient:
 
 💡 **练习建议：** 试着用这个结构再说一遍，记得加入你自己的具体事例！"""
 
-    async def _call_ollama(self, messages: List[Message]) -> str:
+    async def _call_ollama(
+        self,
+        messages: List[Message],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
         """
         调用本地 Ollama API（开源方案）
         """
-        import httpx
-
-        url = f"{settings.OLLAMA_BASE_URL}/api/chat"
-
-        payload = {
-            "model": settings.OLLAMA_MODEL,
-            "messages": [{"role": m.role, "content": m.content} for m in messages],
-            "stream": False,
-            "options": {
+        return await self.ollama_chat(
+            [{"role": m.role, "content": m.content} for m in messages],
+            options={
                 "temperature": 0.7,
                 "num_predict": 2500  # 增加最大 token 数，避免面试评价被截断
-            }
-        }
+            },
+            priority=priority,
+            cache=cache,
+            session_id=session_id
+        )
+
+    async def ollama_chat(
+        self,
+        messages: List[Dict],
+        options: Dict,
+        timeout: Optional[float] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        cache: bool = False,
+        session_id: Optional[str] = None,
+        format: Optional[str] = None
+    ) -> str:
+        """
+        通过节点池调用 Ollama /api/chat
+
+        Args:
+            messages: Ollama 格式的消息列表
+            options: 生成参数（temperature、num_predict 等）
+            timeout: 单次请求的读超时（秒），默认使用连接池配置
+            priority: 调度优先级
+            cache: 是否使用回复缓存
+            session_id: 会话 ID（粘性路由）
+            format: 输出格式约束，"json" 时模型只输出合法 JSON
+
+        Returns:
+            模型回复文本
+        """
+        payload = self._ollama_payload(messages, options, stream=False)
+        if format:
+            payload["format"] = format
+
+        async def send(endpoint: OllamaEndpoint, budget: Optional[float]) -> str:
+            return await self._post_ollama(
+                endpoint, payload, _min_timeout(timeout, budget), session_id
+            )
+
+        async def call() -> str:
+            try:
+                return await self._guarded_call("ollama", priority, send, session_id)
+            except CircuitOpenError:
+                if not self._can_overflow():
+                    raise
+                logger.warning("Ollama 节点全部不可用，请求溢出到 OpenAI")
+                return await self.openai_chat(
+                    messages,
+                    model=settings.OPENAI_MODEL,
+                    max_tokens=options.get("num_predict", 1500),
+                    temperature=options.get("temperature", 0.7),
+                    priority=priority
+                )
+            except httpx.ConnectError:
+                logger.error("无法连接到 Ollama，请确保 Ollama 正在运行")
+                raise ConnectionError("无法连接到 Ollama。请运行: ollama serve")
+            except Exception as e:
+                logger.error(f"Ollama 调用失败: {str(e)}")
+                raise
+
+        cache_options = {**options, "format": format} if format else options
+        return await self._cached(cache, "ollama", payload["model"], messages, cache_options, call)
+
+    async def _post_ollama(
+        self,
+        endpoint: OllamaEndpoint,
+        payload: Dict,
+        timeout: Optional[float],
+        session_id: Optional[str] = None
+    ) -> str:
+        """向指定节点发送一次非流式 Ollama 请求"""
+        response = await endpoint.http.post(
+            "/api/chat", json=payload, timeout=self._ollama_timeout(timeout)
+        )
+        response.raise_for_status()
+        result = response.json()
+        endpoint.record_usage(result, session_id)
+        return result["message"]["content"]
+
+    async def _stream_ollama(
+        self,
+        endpoint: OllamaEndpoint,
+        messages: List[Message],
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式调用 Ollama：/api/chat 在 stream=True 时按行返回 NDJSON
+        """
+        payload = self._ollama_payload(
+            [{"role": m.role, "content": m.content} for m in messages],
+            options={"temperature": 0.7, "num_predict": 2500},
+            stream=True
+        )
 
         try:
-            # trust_env=False 禁用代理,确保 localhost 连接正常
-            async with httpx.AsyncClient(timeout=120.0, trust_env=False) as client:
-                response = await client.post(url, json=payload)
+            async with endpoint.http.stream(
+                "POST", "/api/chat", json=payload,
+                timeout=self._ollama_timeout(remaining_budget())
+            ) as response:
                 response.raise_for_status()
-                result = response.json()
-                return result["message"]["content"]
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise RuntimeError(f"Ollama 返回错误: {data['error']}")
+                    yield data.get("message", {}).get("content", "")
+                    if data.get("done"):
+                        endpoint.record_usage(data, session_id)
+                        break
         except httpx.ConnectError:
-            logger.error("无法连接到 Ollama，请确保 Ollama 正在运行")
-            raise ConnectionError("无法连接到 Ollama。请运行: ollama serve")
-        except Exception as e:
-            logger.error(f"Ollama 调用失败: {str(e)}")
+            logger.error(f"无法连接到 Ollama 节点: {endpoint.base_url}")
             raise
 
-    async def _call_openai(self, messages: List[Message]) -> str:
+    def _ollama_payload(self, messages: List[Dict], options: Dict, stream: bool) -> Dict:
         """
-        调用 OpenAI API（付费方案）
+        构建 Ollama /api/chat 请求体
+
+        Ollama 会复用上一次请求已计算的消息前缀（KV 缓存），前提是模型没有被卸载、
+        num_ctx 等加载参数不变。因此所有请求使用同一个 num_ctx 并设置 keep_alive，
+        同一会话的后续轮次只需计算新追加的消息
         """
-        from openai import AsyncOpenAI
+        return {
+            "model": settings.OLLAMA_MODEL,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": {"num_ctx": settings.OLLAMA_NUM_CTX, **options}
+        }
 
-        client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
+    def _ollama_timeout(self, timeout: Optional[float]):
+        """单次请求超时；未指定时使用连接池默认值"""
+        if timeout is None:
+            return httpx.USE_CLIENT_DEFAULT
+        return httpx.Timeout(timeout, connect=settings.HTTP_CONNECT_TIMEOUT)
+
+    async def _call_openai(
+        self,
+        messages: List[Message],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        cache: bool = False
+    ) -> str:
+        """
+        调用 OpenAI API（付费方案）
+        """
+        return await self.openai_chat(
+            [{"role": m.role, "content": m.content} for m in messages],
+            model=settings.OPENAI_MODEL,
+            max_tokens=1500,
+            priority=priority,
+            cache=cache
         )
 
-        response = await client.chat.completions.create(
+    async def openai_chat(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        max_tokens: int,
+        temperature: float = 0.7,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        cache: bool = False
+    ) -> str:
+        """
+        通过共享客户端调用 OpenAI chat completions
+
+        Args:
+            messages: OpenAI 格式的消息列表（content 可以是图文混合列表）
+            model: 模型名称
+            max_tokens: 最大生成 token 数
+            temperature: 采样温度
+            priority: 调度优先级
+            cache: 是否使用回复缓存
+
+        Returns:
+            模型回复文本
+        """
+        options = {"temperature": temperature, "max_tokens": max_tokens}
+
+        async def send(_, budget: Optional[float]) -> str:
+            extra = {"timeout": budget} if budget is not None else {}
+            response = await self.openai.chat.completions.create(
+                model=model,
+                messages=messages,
+                **options,
+                **extra
+            )
+            return response.choices[0].message.content
+
+        async def call() -> str:
+            return await self._guarded_call("openai", priority, send)
+
+        return await self._cached(cache, "openai", model, messages, options, call)
+
+    async def _stream_openai(self, messages: List[Message]) -> AsyncIterator[str]:
+        """
+        流式调用 OpenAI API（stream=True）
+        """
+        budget = remaining_budget()
+        extra = {"timeout": budget} if budget is not None else {}
+        stream = await self.openai.chat.completions.create(
             model=settings.OPENAI_MODEL,
             messages=[{"role": m.role, "content": m.content} for m in messages],
             temperature=0.7,
-            max_tokens=1500
+            max_tokens=1500,
+            stream=True,
+            **extra
         )
 
-        return response.choices[0].message.content
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 # ============ ASR (语音转文字) ============
 
-async def transcribe_audio(audio_content: bytes, filename: str = "audio.webm") -> str:
+async def transcribe_audio(
+    audio_content: bytes,
+    filename: str = "audio.webm",
+    profile: str = "beam"
+) -> str:
     """
     将语音文件转为文字
 
     Args:
         audio_content: 音频文件的二进制内容
         filename: 文件名（用于指定文件类型）
+        profile: 本地 Whisper 的解码配置（greedy / beam / batched）
 
     Returns:
         识别出的文字
     """
+    result = await transcribe_audio_result(audio_content, filename, profile)
+    return result.text
+
+
+async def transcribe_audio_result(
+    audio_content: bytes,
+    filename: str = "audio.webm",
+    profile: str = "beam"
+) -> TranscriptionResult:
+    """
+    将语音文件转为文字，同时返回分段 / 逐词时间戳和语速统计
+
+    时间戳在识别时一并得到，语速和停顿分析不需要再处理一遍音频
+
+    Args:
+        audio_content: 音频文件的二进制内容
+        filename: 文件名（用于指定文件类型）
+        profile: 本地 Whisper 的解码配置（greedy / beam / batched）
+
+    Returns:
+        TranscriptionResult（全文、分段、时长、语速统计）
+    """
+    profile = get_decode_profile(profile).name
+    # 相同音频同时提交多次时只识别一次
+    key = request_key(llm_client.backend, audio_content, filename.rsplit(".", 1)[-1], profile)
+    return await llm_client.singleflight.do(
+        "asr", key, lambda: _transcribe_audio(audio_content, filename, profile)
+    )
+
+
+async def transcribe_audio_segments(
+    audio_content: Union[bytes, np.ndarray],
+    filename: str = "audio.webm",
+    profile: str = "beam"
+) -> TranscriptionResult:
+    """
+    识别长录音（演讲视频等），返回带时间戳的分段结果
+
+    开源方案下按语音活动切块、多个 worker 并行识别，耗时随可用核数下降
+
+    Args:
+        audio_content: 音频 / 视频文件的二进制内容，或已解码的 16kHz 单声道 float32 数组
+        filename: 文件名（用于指定文件类型）
+        profile: 本地 Whisper 的解码配置（greedy / beam / batched）
+
+    Returns:
+        TranscriptionResult（完整文字、分段时间戳、时长）
+    """
+    profile = get_decode_profile(profile).name
+    key = request_key(llm_client.backend, audio_content, filename.rsplit(".", 1)[-1], profile)
+    return await llm_client.singleflight.do(
+        "asr_long", key, lambda: _transcribe_audio_segments(audio_content, filename, profile)
+    )
+
+
+async def _transcribe_audio_segments(
+    audio_content: Union[bytes, np.ndarray],
+    filename: str,
+    profile: str
+) -> TranscriptionResult:
+    """按当前配置选择长音频识别方案"""
+    if settings.USE_OPENSOURCE and not settings.USE_MOCK_LLM:
+        if isinstance(audio_content, np.ndarray):
+            audio = audio_content
+        else:
+            audio = await decode_audio(audio_content)
+        fingerprint = await asyncio.to_thread(transcription_cache.fingerprint, audio)
+        key = transcription_cache.make_key(fingerprint, f"{whisper_model_id()}:{profile}", "segments")
+        cached = await transcription_cache.get(key)
+        if cached is not None:
+            logger.info(f"长音频识别命中缓存: {filename}")
+            return TranscriptionResult.model_validate_json(cached)
+
+        result = await transcribe_long_audio(audio, profile)
+        await transcription_cache.set(key, result.model_dump_json().encode("utf-8"))
+        return result
+
+    # Mock 和 OpenAI 方案直接整段识别
+    if isinstance(audio_content, np.ndarray):
+        audio_content, filename = float32_to_wav(audio_content), "audio.wav"
+    return await _transcribe_audio(audio_content, filename, profile)
+
+
+async def _transcribe_audio(audio_content: bytes, filename: str, profile: str = "beam") -> TranscriptionResult:
+    """按当前配置选择语音识别方案"""
     if settings.USE_MOCK_LLM:
-        # Mock 模式：返回示例文本
+        # Mock 模式：返回示例文本（按每分钟 180 字模拟时间戳）
         await asyncio.sleep(0.5)
-        return """大家好，我叫小明，目前是一名高中二年级的学生。
+        lines = """大家好，我叫小明，目前是一名高中二年级的学生。
 我对计算机编程和人工智能特别感兴趣，平时喜欢自学一些编程课程。
 在学校里，我担任学生会的技术部长，负责维护学校的网站和一些小程序。
 我的性格比较外向，喜欢和同学们交流学习经验。
 未来我希望能够进入一所好的大学，继续深造计算机科学，
-并且能够用技术帮助更多的人解决实际问题。谢谢大家！"""
+并且能够用技术帮助更多的人解决实际问题。谢谢大家！""".split("\n")
+        segments = []
+        cursor = 0.0
+        for line in lines:
+            end = cursor + len(line) / 3
+            segments.append(TranscriptSegment(start=cursor, end=end, text=line))
+            cursor = end + 0.6
+        result = build_transcription(segments, cursor)
+        result.text = "\n".join(lines)
+        return result
 
     elif settings.USE_OPENSOURCE:
         # 开源方案：使用 faster-whisper 本地模型
-        return await _transcribe_with_faster_whisper(audio_content, filename)
+        return await _transcribe_with_faster_whisper(audio_content, filename, profile)
     else:
         # 付费方案：调用 OpenAI Whisper API
         return await _transcribe_with_openai(audio_content, filename)
 
 
-async def _transcribe_with_faster_whisper(audio_content: bytes, filename: str) -> str:
+async def _transcribe_with_faster_whisper(
+    audio_content: bytes,
+    filename: str,
+    profile: str
+) -> TranscriptionResult:
     """
     使用 faster-whisper 本地模型进行语音识别
-    """
-    import tempfile
-    import os
-
-    # 将音频内容保存到临时文件
-    suffix = "." + filename.split(".")[-1] if "." in filename else ".webm"
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
-        tmp_file.write(audio_content)
-        tmp_path = tmp_file.name
 
-    # 如果是 WebM 格式，先转换为 WAV（faster-whisper 更好支持）
-    wav_path = None
-    if suffix.lower() in ['.webm', '.ogg', '.opus']:
-        wav_path = tmp_path.replace(suffix, '.wav')
-        try:
-            import subprocess
-            result = subprocess.run([
-                'ffmpeg', '-y',
-                '-i', tmp_path,
-                '-acodec', 'pcm_s16le',
-                '-ar', '16000',
-                '-ac', '1',
-                wav_path
-            ], capture_output=True, text=True)
-
-            if result.returncode == 0:
-                logger.info(f"音频转换成功: {suffix} -> .wav")
-                audio_path_to_use = wav_path
-            else:
-                logger.warning(f"ffmpeg 转换失败: {result.stderr}, 尝试直接使用原始文件")
-                audio_path_to_use = tmp_path
-        except Exception as e:
-            logger.warning(f"ffmpeg 转换异常: {e}, 尝试直接使用原始文件")
-            audio_path_to_use = tmp_path
-    else:
-        audio_path_to_use = tmp_path
-
-    try:
-        # 在线程池中运行同步代码（faster-whisper 是同步的）
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, _run_faster_whisper, audio_path_to_use)
-        return result
-    finally:
-        # 清理临时文件
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-        if wav_path and os.path.exists(wav_path):
-            os.remove(wav_path)
-
-
-def _run_faster_whisper(audio_path: str) -> str:
+    音频在内存中解码为 16kHz float32 数组后直接交给模型，不写临时文件
     """
-    同步运行 faster-whisper（在线程池中执行）
+    audio = await decode_audio(audio_content)
+    logger.info(f"音频解码完成: {filename}, 时长 {len(audio) / SAMPLE_RATE:.1f} 秒")
+
+    # 同一段录音（哪怕换了容器格式）已经识别过时直接返回
+    fingerprint = await asyncio.to_thread(transcription_cache.fingerprint, audio)
+    key = transcription_cache.make_key(fingerprint, f"{whisper_model_id()}:{profile}", "result")
+    cached = await transcription_cache.get(key)
+    if cached is not None:
+        logger.info(f"识别命中缓存: {filename}")
+        return TranscriptionResult.model_validate_json(cached)
+
+    # 在识别专用执行器中运行同步代码（faster-whisper 是同步的），排队已满时抛出 ASRBusyError
+    started = time.monotonic()
+    result = await asr_pool.run(_run_faster_whisper, audio, profile)
+    decode_stats.record(profile, result.duration, time.monotonic() - started)
+    await transcription_cache.set(key, result.model_dump_json().encode("utf-8"))
+    return result
+
+
+def _run_faster_whisper(audio: np.ndarray, profile: str = "beam") -> TranscriptionResult:
     """
-    try:
-        from faster_whisper import WhisperModel
-
-        # 使用轻量级模型，适合 8GB 内存
-        # local_files_only=True 避免重新下载，模型已经预先下载好了
-        model = WhisperModel(
-            settings.WHISPER_MODEL,  # tiny / base / small
-            device="cpu",
-            compute_type="int8",  # 使用 int8 量化减少内存
-            local_files_only=True  # 只使用本地已下载的模型
-        )
-
-        segments, info = model.transcribe(
-            audio_path,
-            language="zh",
-            beam_size=5
-        )
+    同步运行 faster-whisper（在识别执行器中执行）
 
-        # 合并所有片段
-        text = " ".join([segment.text for segment in segments])
-        return text.strip()
+    Args:
+        audio: 16kHz 单声道 float32 数组
+        profile: 解码配置名（见 app.core.asr.DECODE_PROFILES）
+    """
+    try:
+        # 模型在进程内只加载一次（见 app.core.asr）；逐词时间戳在解码时一并得到
+        segments = run_whisper(audio, profile=profile)
+        return build_transcription(segments, len(audio) / SAMPLE_RATE)
 
     except ImportError:
         logger.error("faster-whisper 未安装，请运行: pip install faster-whisper")
@@ -302,108 +1580,262 @@ def _run_faster_whisper(audio_path: str) -> str:
         raise
 
 
-async def _transcribe_with_openai(audio_content: bytes, filename: str) -> str:
+async def _transcribe_with_openai(audio_content: bytes, filename: str) -> TranscriptionResult:
     """
     使用 OpenAI Whisper API 进行语音识别（付费）
     """
-    from openai import AsyncOpenAI
     import io
 
-    client = AsyncOpenAI(
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_BASE_URL
-    )
+    # 按解码后的音频计算指纹；本地无法解码时退回按文件内容
+    try:
+        audio = await decode_audio(audio_content)
+        fingerprint = await asyncio.to_thread(transcription_cache.fingerprint, audio)
+    except AudioDecodeError:
+        fingerprint = hashlib.sha256(audio_content).hexdigest()
+    key = transcription_cache.make_key(fingerprint, "openai:whisper-1", "result")
+    cached = await transcription_cache.get(key)
+    if cached is not None:
+        logger.info(f"识别命中缓存: {filename}")
+        return TranscriptionResult.model_validate_json(cached)
 
     # 将 bytes 转换为文件对象
     audio_file = io.BytesIO(audio_content)
     audio_file.name = filename
 
-    transcript = await client.audio.transcriptions.create(
+    # verbose_json 同时返回分段和逐词时间戳
+    transcript = await llm_client.openai.audio.transcriptions.create(
         model="whisper-1",
         file=audio_file,
-        language="zh"
+        language="zh",
+        response_format="verbose_json",
+        timestamp_granularities=["segment", "word"]
     )
 
-    return transcript.text
+    words = [
+        TranscriptWord(start=w.start, end=w.end, word=w.word.strip())
+        for w in (getattr(transcript, "words", None) or [])
+    ]
+    segments = []
+    for seg in getattr(transcript, "segments", None) or []:
+        segments.append(TranscriptSegment(
+            start=seg.start,
+            end=seg.end,
+            text=seg.text.strip(),
+            words=[w for w in words if seg.start <= (w.start + w.end) / 2 < seg.end]
+        ))
+    result = build_transcription(segments, getattr(transcript, "duration", 0.0) or 0.0)
+    result.text = transcript.text
+
+    await transcription_cache.set(key, result.model_dump_json().encode("utf-8"))
+    return result
 
 
 # ============ TTS (文字转语音) ============
 
-async def synthesize_speech(text: str) -> bytes:
+async def synthesize_speech(text: str, format: str = "mp3", bitrate: Optional[int] = None) -> bytes:
     """
     将文字转为语音
 
+    相同的 (引擎, 音色, 语速, 文本, 格式) 只合成一次，结果缓存在磁盘上（见 app.core.tts）。
+    非原生格式由原生 MP3 转码得到，原生 MP3 同样缓存，切换格式时不需要重新合成
+
     Args:
         text: 要转换的文字
+        format: 输出格式（mp3 / opus-webm / opus-ogg，见 TTS_CODECS）
+        bitrate: 码率（kbps）；mp3 不指定时直接返回原生音频，其余格式默认使用格式自带的码率
 
     Returns:
-        音频文件的二进制内容（MP3 格式）
+        音频文件的二进制内容
+
+    Raises:
+        ValueError: 格式不存在或码率超出范围
+    """
+    codec, bitrate = resolve_tts_format(format, bitrate)
+    start = time.perf_counter()
+    key = tts_cache_key(text, codec.name, bitrate)
+
+    audio = await tts_cache.get(key)
+    cached = audio is not None
+    if audio is None:
+        if bitrate is None:
+            audio = await llm_client.singleflight.do("tts", key, lambda: _synthesize_and_cache(key, text))
+        else:
+            audio = await llm_client.singleflight.do(
+                "tts", key, lambda: _transcode_and_cache(key, text, codec, bitrate)
+            )
+
+    tts_stats.record(tts_format_label(codec, bitrate), len(audio), time.perf_counter() - start, cached)
+    return audio
+
+
+async def _native_speech(text: str) -> bytes:
+    """引擎原生的 MP3（先查缓存）"""
+    key = tts_cache_key(text)
+    cached = await tts_cache.get(key)
+    if cached is not None:
+        return cached
+    return await llm_client.singleflight.do("tts", key, lambda: _synthesize_and_cache(key, text))
+
+
+async def _synthesize_and_cache(key: str, text: str) -> bytes:
+    audio = await _synthesize_speech(text)
+    await tts_cache.set(key, audio)
+    return audio
+
+
+async def _transcode_and_cache(key: str, text: str, codec: TTSCodec, bitrate: int) -> bytes:
+    source = await _native_speech(text)
+    if not source:
+        return b""
+    audio = await encode_audio(source, codec.codec, codec.container, bitrate, codec.sample_rate)
+    await tts_cache.set(key, audio)
+    return audio
+
+
+async def synthesize_speech_stream(
+    text: str,
+    format: str = "mp3",
+    bitrate: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    流式语音合成：按句切分，第一句边合成边产出，后续句子并发合成后按顺序产出音频数据块
+
+    开始播放前只需要等第一句合成，与全文长度无关；
+    非原生格式在 ffmpeg 子进程中边合成边转码。
+    完整合成后写入缓存，之后的请求（包括非流式的 synthesize_speech）直接命中
+
+    Args:
+        text: 要转换的文字
+        format: 输出格式（见 synthesize_speech）
+        bitrate: 码率（kbps）
+
+    Yields:
+        音频数据块（按顺序拼接即为完整音频）
+
+    Raises:
+        ValueError: 格式不存在或码率超出范围（在第一次迭代时抛出）
     """
+    codec, bitrate = resolve_tts_format(format, bitrate)
+    start = time.perf_counter()
+    key = tts_cache_key(text, codec.name, bitrate)
+    label = tts_format_label(codec, bitrate)
+
+    cached = await tts_cache.get(key)
+    if cached is not None:
+        tts_stats.record(label, len(cached), time.perf_counter() - start, cached=True)
+        yield cached
+        return
+
+    source = _native_speech_stream(text)
+    if bitrate is not None:
+        source = encode_audio_stream(source, codec.codec, codec.container, bitrate, codec.sample_rate)
+
+    chunks = []
+    async for chunk in source:
+        chunks.append(chunk)
+        yield chunk
+    audio = b"".join(chunks)
+    if bitrate is not None:
+        await tts_cache.set(key, audio)
+    tts_stats.record(label, len(audio), time.perf_counter() - start)
+
+
+async def _native_speech_stream(text: str) -> AsyncIterator[bytes]:
+    """引擎原生 MP3 的流式合成（先查缓存，合成完写入缓存）"""
+    key = tts_cache_key(text)
+    cached = await tts_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    async for chunk in _stream_speech(text):
+        chunks.append(chunk)
+        yield chunk
+    await tts_cache.set(key, b"".join(chunks))
+
+
+async def _stream_speech(text: str) -> AsyncIterator[bytes]:
+    """按当前配置选择流式合成方案"""
+    if settings.USE_MOCK_LLM:
+        # Mock 模式：没有音频数据
+        return
+
+    elif settings.USE_OPENSOURCE:
+        # edge-tts：第一句边合成边返回，之后的句子同时在后台并发合成，按顺序返回
+        first, *rest = split_sentences(text) or [text]
+        async with synthesize_in_order(rest, _synthesize_with_edge_tts) as parts:
+            async for chunk in _stream_edge_tts(first):
+                yield chunk
+            async for audio in parts:
+                yield audio
+    else:
+        # OpenAI TTS 本身支持流式返回
+        async for chunk in _stream_openai_tts(text):
+            yield chunk
+
+
+async def _synthesize_speech(text: str) -> bytes:
+    """按当前配置选择语音合成方案"""
     if settings.USE_MOCK_LLM:
         # Mock 模式：返回空的音频数据
         return b""
 
     elif settings.USE_OPENSOURCE:
         # 开源方案：使用 edge-tts（微软免费 TTS）
-        return await _synthesize_with_edge_tts(text)
+        synthesize = _synthesize_with_edge_tts
     else:
         # 付费方案：调用 OpenAI TTS API
-        return await _synthesize_with_openai(text)
+        synthesize = _synthesize_with_openai
+
+    # 长文本按句分组并发合成，MP3 按顺序直接拼接
+    shards = shard_text(text)
+    if len(shards) == 1:
+        return await synthesize(text)
+    async with synthesize_in_order(shards, synthesize) as parts:
+        return join_mp3([audio async for audio in parts])
 
 
 async def _synthesize_with_edge_tts(text: str) -> bytes:
     """
     使用 edge-tts（微软免费 TTS）生成语音
+
+    直接在内存中收集音频数据，不写临时文件
     """
     try:
-        import edge_tts
-        import tempfile
-        import os
-
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-
-        try:
-            # 生成语音
-            communicate = edge_tts.Communicate(
-                text,
-                voice=settings.EDGE_TTS_VOICE  # zh-CN-XiaoxiaoNeural
-            )
-            await communicate.save(tmp_path)
+        return b"".join([chunk async for chunk in _stream_edge_tts(text)])
+    except ImportError:
+        raise
+    except Exception as e:
+        logger.error(f"edge-tts 生成失败: {str(e)}")
+        raise
 
-            # 读取音频内容
-            with open(tmp_path, "rb") as f:
-                audio_content = f.read()
-
-            return audio_content
-        finally:
-            # 清理临时文件
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
 
+async def _stream_edge_tts(text: str) -> AsyncIterator[bytes]:
+    """edge-tts 流式合成，逐块产出 MP3 数据"""
+    try:
+        import edge_tts
     except ImportError:
         logger.error("edge-tts 未安装，请运行: pip install edge-tts")
         raise ImportError("请安装 edge-tts: pip install edge-tts")
-    except Exception as e:
-        logger.error(f"edge-tts 生成失败: {str(e)}")
-        raise
+
+    communicate = edge_tts.Communicate(
+        text,
+        voice=settings.EDGE_TTS_VOICE,  # zh-CN-XiaoxiaoNeural
+        rate=settings.EDGE_TTS_RATE
+    )
+    async for message in communicate.stream():
+        if message["type"] == "audio":
+            yield message["data"]
 
 
 async def _synthesize_with_openai(text: str) -> bytes:
     """
     使用 OpenAI TTS API 生成语音（付费）
     """
-    from openai import AsyncOpenAI
-
-    client = AsyncOpenAI(
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_BASE_URL
-    )
-
-    response = await client.audio.speech.create(
-        model="tts-1",
-        voice="nova",
+    response = await llm_client.openai.audio.speech.create(
+        model=OPENAI_TTS_MODEL,
+        voice=OPENAI_TTS_VOICE,
         input=text,
         response_format="mp3"
     )
@@ -411,13 +1843,27 @@ async def _synthesize_with_openai(text: str) -> bytes:
     return response.content
 
 
+async def _stream_openai_tts(text: str) -> AsyncIterator[bytes]:
+    """OpenAI TTS 流式返回（付费）"""
+    async with llm_client.openai.audio.speech.with_streaming_response.create(
+        model=OPENAI_TTS_MODEL,
+        voice=OPENAI_TTS_VOICE,
+        input=text,
+        response_format="mp3"
+    ) as response:
+        async for chunk in response.iter_bytes():
+            yield chunk
+
+
 # ============ Vision (图片识别) ============
 
 async def analyze_slide_with_vision(
     slide_image_url: str,
     user_transcript: str,
     slide_number: int,
-    slide_text: str = ""
+    slide_text: str = "",
+    priority: LLMPriority = LLMPriority.INTERACTIVE,
+    cache: bool = False
 ) -> str:
     """
     分析 PPT 幻灯片和用户讲解
@@ -430,22 +1876,48 @@ async def analyze_slide_with_vision(
         user_transcript: 用户讲解的转写文本
         slide_number: 幻灯片编号
         slide_text: 从 PPT 提取的文字内容
+        priority: 调度优先级
+        cache: 是否使用回复缓存
 
     Returns:
         AI 的分析和示范教学反馈
     """
+    key = request_key(
+        llm_client.backend, slide_image_url, user_transcript, slide_number, slide_text
+    )
+    return await llm_client.singleflight.do(
+        "vision",
+        key,
+        lambda: _analyze_slide(
+            slide_image_url, user_transcript, slide_number, slide_text, priority, cache
+        )
+    )
+
+
+async def _analyze_slide(
+    slide_image_url: str,
+    user_transcript: str,
+    slide_number: int,
+    slide_text: str,
+    priority: LLMPriority,
+    cache: bool
+) -> str:
+    """按当前配置选择幻灯片分析方案"""
     if settings.USE_MOCK_LLM:
         # Mock 模式
-        await asyncio.sleep(1.0)
-        return _get_mock_vision_response(slide_number, slide_text, user_transcript)
+        async with llm_client.scheduler.slot("mock", priority):
+            await asyncio.sleep(1.0)
+            return _get_mock_vision_response(slide_number, slide_text, user_transcript)
 
     elif settings.USE_OPENSOURCE:
         # 开源方案：使用 Ollama 进行文字分析（8GB 内存无法运行 Vision 模型）
-        return await _analyze_slide_with_ollama(slide_number, slide_text, user_transcript)
+        return await _analyze_slide_with_ollama(
+            slide_number, slide_text, user_transcript, priority, cache
+        )
     else:
         # 付费方案：使用 GPT-4 Vision
         return await _analyze_slide_with_gpt4_vision(
-            slide_image_url, user_transcript, slide_number, slide_text
+            slide_image_url, user_transcript, slide_number, slide_text, priority, cache
         )
 
 
@@ -482,13 +1954,14 @@ def _get_mock_vision_response(slide_number: int, slide_text: str, user_transcrip
 async def _analyze_slide_with_ollama(
     slide_number: int,
     slide_text: str,
-    user_transcript: str
+    user_transcript: str,
+    priority: LLMPriority = LLMPriority.INTERACTIVE,
+    cache: bool = False
 ) -> str:
     """
     使用 Ollama 进行文字分析（开源方案）
     注意：8GB 内存无法运行 Vision 模型，所以只分析提取的文字
     """
-    import httpx
 
     system_prompt = """你是一位专业的 PPT 演讲教练，采用"示范教学法"指导用户。
 
@@ -524,38 +1997,26 @@ async def _analyze_slide_with_ollama(
 
 请用鼓励、实用的语气回复。"""
 
-    url = f"{settings.OLLAMA_BASE_URL}/api/chat"
-    payload = {
-        "model": settings.OLLAMA_MODEL,
-        "messages": [
+    return await llm_client.ollama_chat(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ],
-        "stream": False,
-        "options": {
+        options={
             "temperature": 0.7,
             "num_predict": 2000
-        }
-    }
-
-    try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            return result["message"]["content"]
-    except httpx.ConnectError:
-        logger.error("无法连接到 Ollama")
-        raise ConnectionError("无法连接到 Ollama。请运行: ollama serve")
-    except Exception as e:
-        logger.error(f"Ollama 调用失败: {str(e)}")
-        raise
+        },
+        priority=priority,
+        cache=cache
+    )
 
 
 async def generate_slide_demo_script(
     slide_number: int,
     slide_text: str,
-    slide_image_path: str = None
+    slide_image_path: str = None,
+    priority: LLMPriority = LLMPriority.BULK,
+    cache: bool = False
 ) -> str:
     """
     为指定幻灯片生成 AI 示范讲解话术
@@ -566,31 +2027,37 @@ async def generate_slide_demo_script(
         slide_number: 幻灯片编号
         slide_text: 从 PPT 提取的文字内容
         slide_image_path: 幻灯片图片路径（可选，开源方案不使用）
+        priority: 调度优先级（上传时批量生成，默认 BULK）
+        cache: 是否使用回复缓存（话术只依赖幻灯片内容，相同的 PPT 可直接复用）
 
     Returns:
         AI 示范讲解话术（30-60秒的演讲稿）
     """
     if settings.USE_MOCK_LLM:
         # Mock 模式
-        await asyncio.sleep(0.5)
-        return f"大家好，请看第 {slide_number} 页。{slide_text[:50] if slide_text else '这页展示了我们的核心内容'}。让我为大家详细讲解一下..."
+        async with llm_client.scheduler.slot("mock", priority):
+            await asyncio.sleep(0.5)
+            return f"大家好，请看第 {slide_number} 页。{slide_text[:50] if slide_text else '这页展示了我们的核心内容'}。让我为大家详细讲解一下..."
 
     elif settings.USE_OPENSOURCE:
         # 开源方案：使用 Ollama 生成示范话术
-        return await _generate_demo_script_with_ollama(slide_number, slide_text)
+        return await _generate_demo_script_with_ollama(slide_number, slide_text, priority, cache)
     else:
         # 付费方案：使用 GPT-4 Vision 生成示范话术
-        return await _generate_demo_script_with_gpt4_vision(slide_number, slide_text, slide_image_path)
+        return await _generate_demo_script_with_gpt4_vision(
+            slide_number, slide_text, slide_image_path, priority, cache
+        )
 
 
 async def _generate_demo_script_with_ollama(
     slide_number: int,
-    slide_text: str
+    slide_text: str,
+    priority: LLMPriority = LLMPriority.BULK,
+    cache: bool = False
 ) -> str:
     """
     使用 Ollama 生成示范讲解话术（开源方案）
     """
-    import httpx
 
     system_prompt = """你是一位专业的演讲教练，帮助用户学习如何讲解 PPT。
 
@@ -612,55 +2079,220 @@ async def _generate_demo_script_with_ollama(
 请生成一段30-60秒的示范讲解话术，演示如何讲解这一页 PPT。
 只输出讲解话术本身，不要加标题或解释。"""
 
-    url = f"{settings.OLLAMA_BASE_URL}/api/chat"
-    payload = {
-        "model": settings.OLLAMA_MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ],
-        "stream": False,
-        "options": {
-            "temperature": 0.7,
-            "num_predict": 500
-        }
-    }
-
     try:
-        async with httpx.AsyncClient(timeout=60.0, trust_env=False) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            demo_script = result["message"]["content"].strip()
-
-            # 移除可能的标题或格式
-            demo_script = demo_script.replace("**示范讲解：**", "")
-            demo_script = demo_script.replace("**话术：**", "")
-            demo_script = demo_script.strip()
-
-            return demo_script
+        demo_script = await llm_client.ollama_chat(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            options={
+                "temperature": 0.7,
+                "num_predict": 500
+            },
+            timeout=60.0,
+            priority=priority,
+            cache=cache
+        )
+        demo_script = demo_script.strip()
+
+        # 移除可能的标题或格式
+        demo_script = demo_script.replace("**示范讲解：**", "")
+        demo_script = demo_script.replace("**话术：**", "")
+        demo_script = demo_script.strip()
+
+        return demo_script
     except Exception as e:
         logger.error(f"生成示范话术失败: {str(e)}")
         # 返回简单的示范
         return f"大家好，请看第 {slide_number} 页。{slide_text[:100] if slide_text else '这页展示了我们的核心内容'}。"
 
 
+# 批量生成示范话术时每页预留的输出 token（30-60 秒讲稿约 200-300 字）
+DEMO_SCRIPT_OUTPUT_TOKENS = 400
+
+BATCH_DEMO_SYSTEM_PROMPT = """你是一位专业的演讲教练，帮助用户学习如何讲解 PPT。
+
+你的任务：
+- 为每一页幻灯片分别生成一段30-60秒的示范讲解话术
+- 讲解要清晰、有条理、引人入胜
+- 使用\"大家请看\"、\"第一\"、\"第二\"等过渡词
+- 语言要口语化，像真人在演讲
+
+**输出格式：只输出 JSON，不要加任何解释：**
+{"scripts": [{"slide": 页码, "script": "该页的讲解话术"}]}
+每一页都必须有对应的条目。"""
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（中文约 1 字 1 token，英文约 3 字符 1 token，偏保守）"""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def plan_demo_batches(slides: List[tuple[int, str]]) -> List[List[tuple[int, str]]]:
+    """
+    按模型上下文长度切分批次
+
+    每批的输入（系统提示 + 幻灯片文字）加上预留的输出不超过 num_ctx 的 90%，
+    且页数不超过 DEMO_BATCH_MAX_SLIDES
+    """
+    budget = int(settings.OLLAMA_NUM_CTX * 0.9) - _estimate_tokens(BATCH_DEMO_SYSTEM_PROMPT)
+    max_slides = max(1, settings.DEMO_BATCH_MAX_SLIDES)
+
+    batches: List[List[tuple[int, str]]] = []
+    current: List[tuple[int, str]] = []
+    used = 0
+    for slide in slides:
+        cost = _estimate_tokens(slide[1] or "") + 20 + DEMO_SCRIPT_OUTPUT_TOKENS
+        if current and (used + cost > budget or len(current) >= max_slides):
+            batches.append(current)
+            current, used = [], 0
+        current.append(slide)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch_demo_scripts(reply: str) -> Dict[int, str]:
+    """解析批量话术的 JSON，跳过格式不对的条目"""
+    try:
+        data = json.loads(reply)
+    except json.JSONDecodeError:
+        # 模型偶尔会在 JSON 前后加说明文字，截取最外层的大括号
+        start, end = reply.find("{"), reply.rfind("}")
+        if start < 0 or end <= start:
+            return {}
+        try:
+            data = json.loads(reply[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+
+    items = data.get("scripts", []) if isinstance(data, dict) else data
+    scripts = {}
+    if not isinstance(items, list):
+        return scripts
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        script = item.get("script")
+        try:
+            slide_number = int(item.get("slide"))
+        except (TypeError, ValueError):
+            continue
+        if isinstance(script, str) and script.strip():
+            scripts[slide_number] = script.strip()
+    return scripts
+
+
+async def generate_slide_demo_scripts(
+    slides: List[tuple[int, str]],
+    slide_image_paths: Optional[Dict[int, str]] = None,
+    priority: LLMPriority = LLMPriority.BULK,
+    cache: bool = False
+) -> Dict[int, str]:
+    """
+    批量生成多页幻灯片的示范讲解话术
+
+    开源方案把多页打包到一次请求中（共用同一份系统提示），按上下文长度自动分批；
+    解析失败或缺失的页面再逐页生成。付费方案需要逐页发送图片，仍按页并行生成
+
+    Args:
+        slides: [(幻灯片编号, 文字内容), ...]
+        slide_image_paths: {幻灯片编号: 图片路径}（付费方案使用）
+        priority: 调度优先级
+        cache: 是否使用回复缓存
+
+    Returns:
+        {幻灯片编号: 示范讲解话术}（生成失败的页面不在结果中）
+
+    Raises:
+        LLMDeadlineExceeded / CircuitOpenError: 所有批次都因超时或熔断失败时
+    """
+    slide_image_paths = slide_image_paths or {}
+
+    async def single(slide_number: int, slide_text: str) -> tuple[int, str]:
+        try:
+            script = await generate_slide_demo_script(
+                slide_number, slide_text, slide_image_paths.get(slide_number), priority, cache
+            )
+        except Exception as e:
+            logger.error(f"第 {slide_number} 页示范生成失败: {str(e)}")
+            script = ""
+        return slide_number, script
+
+    if settings.USE_MOCK_LLM or not settings.USE_OPENSOURCE or settings.DEMO_BATCH_MAX_SLIDES <= 1:
+        results = dict(await asyncio.gather(*[single(n, text) for n, text in slides]))
+        return {n: script for n, script in results.items() if script}
+
+    async def run_batch(batch: List[tuple[int, str]]) -> Dict[int, str]:
+        if len(batch) == 1:
+            return dict([await single(*batch[0])])
+
+        user_message = "\n\n".join(
+            f"### 第 {n} 页\n{text if text else '（图表或图片，无文字）'}" for n, text in batch
+        )
+        user_message += f"\n\n---\n\n请为以上 {len(batch)} 页分别生成示范讲解话术，按 JSON 格式输出。"
+
+        try:
+            reply = await llm_client.ollama_chat(
+                [
+                    {"role": "system", "content": BATCH_DEMO_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_message}
+                ],
+                options={
+                    "temperature": 0.7,
+                    "num_predict": DEMO_SCRIPT_OUTPUT_TOKENS * len(batch)
+                },
+                timeout=60.0 * len(batch),
+                priority=priority,
+                cache=cache,
+                format="json"
+            )
+            scripts = _parse_batch_demo_scripts(reply)
+        except (LLMDeadlineExceeded, CircuitOpenError):
+            raise
+        except Exception as e:
+            logger.error(f"批量生成示范话术失败，改为逐页生成: {str(e)}")
+            scripts = {}
+
+        scripts = {n: scripts[n] for n, _ in batch if n in scripts}
+        missing = [(n, text) for n, text in batch if n not in scripts]
+        if missing:
+            logger.warning(f"批量话术缺少 {len(missing)} 页，逐页补充生成: {[n for n, _ in missing]}")
+            scripts.update(await asyncio.gather(*[single(n, text) for n, text in missing]))
+        return scripts
+
+    batches = plan_demo_batches(slides)
+    logger.info(f"示范话术分 {len(batches)} 批生成: 每批页数 {[len(b) for b in batches]}")
+
+    # 某一批超时或熔断时保留其他批次的结果，失败批次的页面不在结果中（由调用方使用简单示范）
+    results: Dict[int, str] = {}
+    errors: List[BaseException] = []
+    for batch, outcome in zip(batches, await asyncio.gather(*[run_batch(batch) for batch in batches], return_exceptions=True)):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            logger.error(f"第 {[n for n, _ in batch]} 页示范话术生成失败: {str(outcome)}")
+            errors.append(outcome)
+        else:
+            results.update(outcome)
+    if errors and len(errors) == len(batches):
+        raise errors[0]
+    return {n: script for n, script in results.items() if script}
+
+
 async def _generate_demo_script_with_gpt4_vision(
     slide_number: int,
     slide_text: str,
-    slide_image_path: str = None
+    slide_image_path: str = None,
+    priority: LLMPriority = LLMPriority.BULK,
+    cache: bool = False
 ) -> str:
     """
     使用 GPT-4 Vision 生成示范讲解话术（付费方案）
     """
-    from openai import AsyncOpenAI
     import base64
 
-    client = AsyncOpenAI(
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_BASE_URL
-    )
-
     # 如果有图片，读取并编码
     image_data = None
     if slide_image_path and os.path.exists(slide_image_path):
@@ -676,37 +2308,34 @@ async def _generate_demo_script_with_gpt4_vision(
     else:
         content = f"这是第 {slide_number} 页 PPT，内容如下：\n\n{slide_text}\n\n请生成一段30-60秒的示范讲解话术。只输出话术本身。"
 
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
+    demo_script = await llm_client.openai_chat(
+        [
             {"role": "system", "content": "你是演讲教练，生成示范讲解话术。"},
             {"role": "user", "content": content}
         ],
+        model="gpt-4o",
         max_tokens=500,
-        temperature=0.7
+        priority=priority,
+        cache=cache
     )
 
-    return response.choices[0].message.content.strip()
+    return demo_script.strip()
 
 
 async def _analyze_slide_with_gpt4_vision(
     slide_image_url: str,
     user_transcript: str,
     slide_number: int,
-    slide_text: str
+    slide_text: str,
+    priority: LLMPriority = LLMPriority.INTERACTIVE,
+    cache: bool = False
 ) -> str:
     """
     使用 GPT-4 Vision 分析幻灯片（付费方案）
     """
-    from openai import AsyncOpenAI
     import base64
     from pathlib import Path
 
-    client = AsyncOpenAI(
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_BASE_URL
-    )
-
     # 构建图片内容
     image_content = None
     if slide_image_url.startswith('http'):
@@ -758,9 +2387,8 @@ async def _analyze_slide_with_gpt4_vision(
 
 请用鼓励、实用的语气回复。"""
 
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
+    return await llm_client.openai_chat(
+        [
             {"role": "system", "content": system_prompt},
             {
                 "role": "user",
@@ -770,12 +2398,12 @@ async def _analyze_slide_with_gpt4_vision(
                 ]
             }
         ],
+        model="gpt-4o",
         max_tokens=2000,
-        temperature=0.7
+        priority=priority,
+        cache=cache
     )
 
-    return response.choices[0].message.content
-
 
 # 创建全局 LLM 客户端实例
 llm_client = LLMClient()
@@ -0,0 +1,58 @@
+"""
+Server-Sent Events 工具
+将 LLM 的流式输出包装成 text/event-stream 响应
+"""
+
+import json
+import logging
+from typing import Any, AsyncIterator
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    格式化一条 SSE 消息
+
+    Args:
+        event: 事件类型（token / transcript / done / error）
+        data: 事件数据，会被序列化为 JSON
+
+    Returns:
+        符合 SSE 协议的文本块
+    """
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def _guard_stream(events: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    流已经开始后无法再返回 HTTP 错误码，异常转为 error 事件发给前端
+    """
+    try:
+        async for chunk in events:
+            yield chunk
+    except Exception as e:
+        logger.error(f"SSE 流处理失败: {str(e)}", exc_info=True)
+        yield sse_event("error", {"detail": f"处理失败: {str(e)}"})
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """
+    构建 SSE 流式响应
+
+    Args:
+        events: 产出 sse_event() 文本块的异步生成器
+
+    Returns:
+        StreamingResponse（禁用缓存和反向代理缓冲，保证逐字推送）
+    """
+    return StreamingResponse(
+        _guard_stream(events),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -0,0 +1,14 @@
+"""
+指标统计工具
+"""
+
+from typing import List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（values 为空时返回 0）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
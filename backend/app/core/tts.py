@@ -0,0 +1,387 @@
+"""
+语音合成（TTS）基础设施
+- 合成结果按 (引擎, 音色, 语速, 规范化文本) 缓存到磁盘，相同文字重复播放不再合成
+- 缓存键同时作为 HTTP ETag，浏览器重复请求时可以直接返回 304
+- 长文本按句切分，流式合成时第一句合成好就可以开始播放
+- 长文本按句分组并发合成（并发数有上限），MP3 帧按顺序直接拼接，不重新编码
+- 可按请求选择输出格式和码率（Opus / 低码率 MP3），减小移动端下载体积
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import unicodedata
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.cache import DiskLRUCache
+from app.core.config import settings
+from app.core.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# OpenAI TTS 参数
+OPENAI_TTS_MODEL = "tts-1"
+OPENAI_TTS_VOICE = "nova"
+
+
+class TTSCodec:
+    """
+    一种 TTS 输出格式
+
+    Args:
+        name: 格式名（请求参数 format 中使用）
+        media_type: HTTP Content-Type
+        extension: 文件扩展名
+        codec: 转码时使用的编码器
+        container: 转码输出的容器格式
+        default_bitrate: 未指定码率时的默认码率（kbps）
+        sample_rate: 输出采样率，None 表示保持源采样率（Opus 只支持 48kHz 等固定采样率）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        media_type: str,
+        extension: str,
+        codec: str,
+        container: str,
+        default_bitrate: int,
+        sample_rate: Optional[int] = None
+    ):
+        self.name = name
+        self.media_type = media_type
+        self.extension = extension
+        self.codec = codec
+        self.container = container
+        self.default_bitrate = default_bitrate
+        self.sample_rate = sample_rate
+
+
+# 可选的输出格式。TTS 引擎原生输出 MP3（edge-tts 为 24kHz 48kbps 单声道），
+# mp3 不指定码率时直接返回原生音频，其余情况由原生 MP3 转码得到
+TTS_CODECS: Dict[str, TTSCodec] = {
+    "mp3": TTSCodec("mp3", "audio/mpeg", "mp3", "libmp3lame", "mp3", default_bitrate=32),
+    # Opus 在 16-24kbps 下的语音质量与 48kbps MP3 接近，体积约为一半
+    "opus-webm": TTSCodec("opus-webm", "audio/webm", "webm", "libopus", "webm", default_bitrate=24, sample_rate=48000),
+    "opus-ogg": TTSCodec("opus-ogg", "audio/ogg", "ogg", "libopus", "ogg", default_bitrate=24, sample_rate=48000),
+}
+
+# 转码码率范围（kbps）
+TTS_BITRATE_RANGE = (8, 192)
+
+
+def resolve_tts_format(format: str = "mp3", bitrate: Optional[int] = None) -> Tuple[TTSCodec, Optional[int]]:
+    """
+    校验输出格式和码率
+
+    Returns:
+        (格式, 转码码率)；码率为 None 表示直接使用引擎原生的 MP3，不转码
+
+    Raises:
+        ValueError: 格式不存在或码率超出范围
+    """
+    codec = TTS_CODECS.get(format)
+    if codec is None:
+        raise ValueError(f"不支持的音频格式 {format}（可选: {', '.join(TTS_CODECS)}）")
+    if bitrate is not None and not TTS_BITRATE_RANGE[0] <= bitrate <= TTS_BITRATE_RANGE[1]:
+        raise ValueError(f"码率超出范围（{TTS_BITRATE_RANGE[0]}-{TTS_BITRATE_RANGE[1]} kbps）")
+    if codec.name == "mp3" and bitrate is None:
+        return codec, None
+    return codec, bitrate or codec.default_bitrate
+
+
+def tts_format_label(codec: TTSCodec, bitrate: Optional[int]) -> str:
+    """统计中使用的格式名，如 mp3 / opus-webm@24k"""
+    return codec.name if bitrate is None else f"{codec.name}@{bitrate}k"
+
+
+def detect_tts_codec(audio: bytes) -> TTSCodec:
+    """根据文件头判断缓存音频的格式"""
+    if audio[:4] == b"OggS":
+        return TTS_CODECS["opus-ogg"]
+    if audio[:4] == b"\x1a\x45\xdf\xa3":  # EBML（WebM / Matroska）
+        return TTS_CODECS["opus-webm"]
+    return TTS_CODECS["mp3"]
+
+
+def normalize_tts_text(text: str) -> str:
+    """
+    规范化文本（只用于计算缓存键，发给 TTS 的仍是原文）
+
+    全角 / 半角统一（NFKC），连续空白合并为一个空格，去掉首尾空白
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def tts_voice_params() -> Tuple[str, str, str]:
+    """当前配置下的 (引擎, 音色, 语速)"""
+    if settings.USE_MOCK_LLM:
+        return "mock", "", ""
+    if settings.USE_OPENSOURCE:
+        return "edge-tts", settings.EDGE_TTS_VOICE, settings.EDGE_TTS_RATE
+    return f"openai:{OPENAI_TTS_MODEL}", OPENAI_TTS_VOICE, "+0%"
+
+
+def tts_cache_key(text: str, format: str = "mp3", bitrate: Optional[int] = None) -> str:
+    """
+    当前配置下合成这段文字的缓存键（也用作 ETag）
+
+    format / bitrate 为 resolve_tts_format 的结果；原生 MP3（bitrate 为 None）的键不含格式
+    """
+    engine, voice, rate = tts_voice_params()
+    raw = f"{engine}|{voice}|{rate}|{normalize_tts_text(text)}"
+    if bitrate is not None:
+        raw += f"|{format}@{bitrate}k"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# 句末标点（切分后标点留在句尾）
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;…\n])")
+# 句中停顿标点（句子过长时在这里切开）
+_CLAUSE_END = re.compile(r"(?<=[，,、：:])")
+# 出现在句末标点之后、应归属上一句的右引号 / 右括号
+_CLOSERS = "”’」』）)》"
+# 不区分左右的半角引号：只有上一句中引号未闭合时才归属上一句
+_ASCII_QUOTES = "\"'"
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """超长句子在逗号等处切开，仍然超长的部分按长度硬切"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    pieces = []
+    current = ""
+    for clause in _CLAUSE_END.split(sentence):
+        while len(clause) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(clause[:max_chars])
+            clause = clause[max_chars:]
+        if current and len(current) + len(clause) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text: str, max_chars: Optional[int] = None, min_chars: int = 8) -> List[str]:
+    """
+    按句切分待合成的文本
+
+    - 在句末标点处切开，右引号 / 右括号跟随上一句
+    - 超过 max_chars（默认 TTS_SENTENCE_MAX_CHARS）的句子在逗号处继续切开
+    - 第一句保持原样（尽快开始播放），之后短于 min_chars 的句子与后一句合并，减少请求次数
+    """
+    max_chars = max_chars or settings.TTS_SENTENCE_MAX_CHARS
+
+    pieces: List[str] = []
+    for piece in _SENTENCE_END.split(text):
+        piece = piece.strip()
+        while pieces and piece and (
+            piece[0] in _CLOSERS
+            or (piece[0] in _ASCII_QUOTES and pieces[-1].count(piece[0]) % 2 == 1)
+        ):
+            pieces[-1] += piece[0]
+            piece = piece[1:].lstrip()
+        if piece:
+            pieces.extend(_split_long(piece, max_chars))
+
+    sentences: List[str] = []
+    for piece in pieces:
+        if (
+            len(sentences) > 1
+            and len(sentences[-1]) < min_chars
+            and len(sentences[-1]) + len(piece) <= max_chars
+        ):
+            sentences[-1] += piece
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def shard_sentences(sentences: List[str], max_shards: int) -> List[str]:
+    """
+    把连续的句子合并为不超过 max_shards 组，各组字数尽量接近
+
+    每组作为一次独立的合成请求并发执行
+    """
+    if max_shards <= 1 or len(sentences) <= 1:
+        return ["".join(sentences)] if sentences else []
+
+    total = sum(len(sentence) for sentence in sentences)
+    shards: List[str] = []
+    current = ""
+    consumed = 0
+    for index, sentence in enumerate(sentences):
+        current += sentence
+        consumed += len(sentence)
+        remaining_shards = max_shards - len(shards) - 1
+        remaining_sentences = len(sentences) - index - 1
+        # 当前组达到剩余字数的平均值后结束（剩下的句子不够分时也结束）
+        if remaining_shards > 0 and remaining_sentences > 0 and (
+            len(current) >= (total - consumed + len(current)) / (remaining_shards + 1)
+            or remaining_sentences <= remaining_shards
+        ):
+            shards.append(current)
+            current = ""
+    if current:
+        shards.append(current)
+    return shards
+
+
+def shard_text(text: str) -> List[str]:
+    """长文本按句分组用于并发合成；短文本（少于 TTS_SHARD_MIN_CHARS）不切分"""
+    if settings.TTS_PARALLELISM <= 1 or len(text) < settings.TTS_SHARD_MIN_CHARS:
+        return [text]
+    return shard_sentences(split_sentences(text), settings.TTS_PARALLELISM) or [text]
+
+
+@asynccontextmanager
+async def synthesize_in_order(
+    shards: List[str],
+    synthesize: Callable[[str], Awaitable[bytes]],
+    limit: Optional[int] = None
+) -> AsyncIterator[AsyncIterator[bytes]]:
+    """
+    并发合成各段文本（同时最多 limit 个，默认 TTS_PARALLELISM），按原顺序产出结果
+
+    进入时即开始合成；前面的段落合成好就立即产出，不等待后面的段落。
+    退出时（包括调用方提前结束，如客户端断开）取消尚未完成的合成
+
+    用法：
+        async with synthesize_in_order(shards, synthesize) as parts:
+            async for audio in parts:
+                ...
+    """
+    semaphore = asyncio.Semaphore(max(1, limit or settings.TTS_PARALLELISM))
+
+    async def run(shard: str) -> bytes:
+        async with semaphore:
+            return await synthesize(shard)
+
+    tasks = [asyncio.create_task(run(shard)) for shard in shards]
+
+    async def results() -> AsyncIterator[bytes]:
+        for task in tasks:
+            yield await task
+
+    try:
+        yield results()
+    finally:
+        for task in tasks:
+            task.cancel()
+        # 取回已取消 / 失败任务的结果，避免 "exception was never retrieved" 警告
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _id3v2_length(data: bytes) -> int:
+    """开头 ID3v2 标签的总长度（没有标签时为 0）"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    # 标签长度为 4 个 7 位字节（syncsafe 整数），不含 10 字节的头；flags 第 4 位表示带 10 字节尾部
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return min(len(data), 10 + size + footer)
+
+
+def join_mp3(parts: List[bytes]) -> bytes:
+    """
+    按顺序拼接多段 MP3（不重新编码）
+
+    MP3 由独立的帧组成，可以直接首尾相接；只去掉第二段起开头的 ID3v2 标签，
+    避免元数据出现在音频中间
+    """
+    return b"".join(
+        part if index == 0 else part[_id3v2_length(part):]
+        for index, part in enumerate(parts)
+    )
+
+
+class TTSCache:
+    """合成音频磁盘缓存（按总容量 LRU 淘汰）"""
+
+    def __init__(self):
+        self.disk = DiskLRUCache(
+            str(Path(settings.CACHE_DIR) / "tts"),
+            max_bytes=settings.TTS_CACHE_MAX_BYTES,
+            ttl_seconds=settings.TTS_CACHE_TTL_SECONDS or None,
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self.disk.max_bytes == 0:
+            return None
+        return await asyncio.to_thread(self.disk.get, key)
+
+    async def contains(self, key: str) -> bool:
+        if self.disk.max_bytes == 0:
+            return False
+        return await asyncio.to_thread(self.disk.contains, key)
+
+    async def set(self, key: str, audio: bytes):
+        if self.disk.max_bytes == 0 or not audio:
+            return
+        try:
+            await asyncio.to_thread(self.disk.set, key, audio)
+        except OSError as e:
+            # 磁盘缓存写入失败不影响主流程
+            logger.warning(f"TTS 缓存写入失败: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        """容量和命中率统计"""
+        stats = self.disk.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# 全局 TTS 缓存
+tts_cache = TTSCache()
+
+
+class TTSStats:
+    """
+    各输出格式的音频体积和合成耗时
+
+    耗时从请求开始计算，包括合成和转码；命中缓存的请求只计入次数和体积
+    """
+
+    def __init__(self, max_samples: int = 500):
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, List[int]] = {}  # 格式 -> [次数, 命中缓存次数, 总字节数]
+        self.max_samples = max_samples
+
+    def record(self, label: str, size: int, elapsed: float, cached: bool = False):
+        if label not in self._samples:
+            self._samples[label] = deque(maxlen=self.max_samples)
+            self._totals[label] = [0, 0, 0]
+        if not cached:
+            self._samples[label].append(elapsed)
+        totals = self._totals[label]
+        totals[0] += 1
+        totals[1] += int(cached)
+        totals[2] += size
+
+    def snapshot(self) -> Dict:
+        result = {}
+        for label, latencies in self._samples.items():
+            calls, hits, total_bytes = self._totals[label]
+            result[label] = {
+                "calls": calls,
+                "cache_hits": hits,
+                "avg_bytes": round(total_bytes / calls) if calls else 0,
+                "latency_p50_ms": round(percentile(list(latencies), 50) * 1000, 1),
+                "latency_p95_ms": round(percentile(list(latencies), 95) * 1000, 1),
+            }
+        return result
+
+
+# 全局 TTS 统计
+tts_stats = TTSStats()
@@ -2,18 +2,48 @@
 FastAPI 应用主入口
 """
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
-from app.api.v1 import chat, self_intro_audio, ppt, tts, interview, auth, user_profile
+from app.core.llm_client import llm_client
+from app.core.asr import asr_pool, whisper_models
+from app.services.demo_script_service import demo_script_service
+from app.services.demo_audio_service import demo_audio_service
+from app.api.v1 import chat, self_intro_audio, ppt, tts, interview, auth, user_profile, metrics
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时建立 LLM 连接池（可选预加载 Whisper 模型），关闭时取消后台任务并释放连接池"""
+    await llm_client.startup()
+    if settings.WHISPER_PRELOAD and settings.USE_OPENSOURCE and not settings.USE_MOCK_LLM:
+        try:
+            await asyncio.to_thread(whisper_models.warmup)
+        except Exception as e:
+            # 预加载失败不阻止启动，第一次识别时会再次尝试
+            logger.error(f"Whisper 模型预加载失败: {str(e)}")
+    try:
+        yield
+    finally:
+        demo_audio_service.shutdown()
+        demo_script_service.shutdown()
+        asr_pool.shutdown()
+        await llm_client.shutdown()
+
+
 # 创建 FastAPI 应用实例
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="AI 口语教练后端服务 - 帮助用户练习演讲、面试和自我介绍",
+    lifespan=lifespan,
 )
 
 # 配置 CORS - 允许前端访问
@@ -42,6 +72,7 @@ app.include_router(
 app.include_router(ppt.router, prefix="/api/v1/ppt", tags=["ppt"])
 app.include_router(tts.router, prefix="/api/v1", tags=["tts"])
 app.include_router(interview.router, prefix="/api/v1", tags=["interview"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
 
 @app.get("/")
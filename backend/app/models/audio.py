@@ -3,6 +3,7 @@
 用于音频上传接口的请求和响应
 """
 
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -23,3 +24,42 @@ class AudioTranscriptionResponse(BaseModel):
                 "mode": "self_intro",
             }
         }
+
+
+class TranscriptWord(BaseModel):
+    """一个词（中文通常是一到两个字）的识别结果"""
+
+    start: float = Field(..., description="开始时间（秒）")
+    end: float = Field(..., description="结束时间（秒）")
+    word: str = Field(..., description="识别文字")
+
+
+class TranscriptSegment(BaseModel):
+    """一段识别结果（时间相对于整段音频开头）"""
+
+    start: float = Field(..., description="开始时间（秒）")
+    end: float = Field(..., description="结束时间（秒）")
+    text: str = Field(..., description="识别文字")
+    words: List[TranscriptWord] = Field(default_factory=list, description="逐词时间戳（未开启时为空）")
+
+
+class SpeechMetrics(BaseModel):
+    """由识别时间戳计算的语速和停顿统计"""
+
+    duration: float = Field(..., description="说话时长：第一个字到最后一个字（秒）")
+    speech_duration: float = Field(..., description="去掉停顿后的发声时长（秒）")
+    char_count: int = Field(..., description="字数（不含空白和标点）")
+    chars_per_minute: float = Field(..., description="语速：每分钟字数（按说话时长）")
+    pause_count: int = Field(..., description="停顿次数（间隔超过 ASR_PAUSE_SECONDS）")
+    total_pause: float = Field(..., description="停顿总时长（秒）")
+    longest_pause: float = Field(..., description="最长停顿（秒）")
+    mean_pause: float = Field(..., description="平均停顿（秒）")
+
+
+class TranscriptionResult(BaseModel):
+    """带时间戳的识别结果"""
+
+    text: str = Field(..., description="完整识别文字")
+    segments: List[TranscriptSegment] = Field(default_factory=list, description="分段结果")
+    duration: float = Field(default=0.0, description="音频时长（秒）")
+    metrics: Optional[SpeechMetrics] = Field(default=None, description="语速和停顿统计（没有时间戳时为空）")
@@ -4,6 +4,7 @@ PPT 相关的数据模型
 
 from pydantic import BaseModel
 from typing import List, Optional
+from app.models.audio import SpeechMetrics, TranscriptSegment
 
 
 class SlideContent(BaseModel):
@@ -12,6 +13,7 @@ class SlideContent(BaseModel):
     image_url: str  # 幻灯片图片 URL
     text_content: str  # 幻灯片文字内容
     demo_script: Optional[str] = None  # AI 示范讲解话术（可选）
+    audio_url: Optional[str] = None  # 预先合成的示范讲解语音 URL（开启预合成且已完成时）
 
 
 class PPTUploadResponse(BaseModel):
@@ -21,6 +23,14 @@ class PPTUploadResponse(BaseModel):
     slides: List[SlideContent]  # 所有幻灯片内容
 
 
+class SlideDemoScriptResponse(BaseModel):
+    """单页示范话术响应"""
+    slide_number: int  # 幻灯片编号
+    demo_script: str  # AI 示范讲解话术
+    ready_slides: int  # 已生成话术的页数
+    total_slides: int  # 总页数
+
+
 class SlideAnalysisRequest(BaseModel):
     """幻灯片分析请求"""
     presentation_id: str  # PPT 演示文稿 ID
@@ -47,3 +57,5 @@ class VideoAnalysisResponse(BaseModel):
     improvements: List[str]  # 需要改进的地方
     demo_script: str  # AI 示范讲解（如何更好地讲解这个 PPT）
     suggestions: List[str]  # 具体建议
+    segments: List[TranscriptSegment] = []  # 带时间戳的分段转写
+    speech_metrics: Optional[SpeechMetrics] = None  # 语速和停顿统计
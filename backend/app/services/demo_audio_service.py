@@ -0,0 +1,162 @@
+"""
+幻灯片示范语音后台预合成服务
+上传 PPT 后按页序把每页已生成的示范话术合成为语音，保存在幻灯片图片旁边，
+用户点击播放时直接返回音频地址，不再临时生成话术和合成语音
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.models.ppt import SlideContent
+from app.core.llm_client import synthesize_speech
+from app.services.demo_script_service import demo_script_service, fallback_demo_script
+
+logger = logging.getLogger(__name__)
+
+
+def demo_audio_filename(slide_number: int) -> str:
+    """预合成语音的文件名（与 slide_N.png 放在同一目录）"""
+    return f"demo_slide_{slide_number}.mp3"
+
+
+class PresentationAudioJob:
+    """
+    单个演示文稿的示范语音预合成任务
+
+    按页序逐页合成（同一时间只合成一页，不与用户的交互请求争抢 TTS）；
+    话术在后台生成时，先等待该页话术生成完。每页对应一个 Future，结果为音频 URL，
+    合成失败或没有音频时为 None
+    """
+
+    def __init__(self, presentation_id: str, slides: List[SlideContent], static_dir: str):
+        self.presentation_id = presentation_id
+        self.slides = sorted(slides, key=lambda slide: slide.slide_number)
+        self.static_dir = Path(static_dir)
+        self.current: Optional[int] = None  # 正在合成的页
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+
+    def _future(self, slide_number: int) -> asyncio.Future:
+        if slide_number not in self._futures:
+            self._futures[slide_number] = asyncio.get_running_loop().create_future()
+        return self._futures[slide_number]
+
+    async def _script(self, slide: SlideContent) -> str:
+        """该页的示范话术（后台生成中时等待）"""
+        script = slide.demo_script
+        if not script:
+            script = await demo_script_service.wait_script(self.presentation_id, slide.slide_number)
+        return script or slide.demo_script or fallback_demo_script(slide)
+
+    async def _render(self, slide: SlideContent) -> Optional[str]:
+        """合成一页并保存，返回音频 URL"""
+        audio_content = await synthesize_speech(await self._script(slide))
+        if not audio_content:
+            return None
+
+        filename = demo_audio_filename(slide.slide_number)
+        await asyncio.to_thread((self.static_dir / filename).write_bytes, audio_content)
+        return f"/static/{self.presentation_id}/{filename}"
+
+    async def _run(self):
+        try:
+            for slide in self.slides:
+                self.current = slide.slide_number
+                try:
+                    audio_url = await self._render(slide)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"第 {slide.slide_number} 页示范语音预合成失败: {str(e)}")
+                    audio_url = None
+
+                slide.audio_url = audio_url
+                future = self._future(slide.slide_number)
+                if not future.done():
+                    future.set_result(audio_url)
+
+            self.current = None
+            logger.info(f"示范语音预合成完成: presentation={self.presentation_id}")
+        except asyncio.CancelledError:
+            logger.info(f"示范语音预合成已取消: presentation={self.presentation_id}")
+            raise
+
+    async def get(self, slide_number: int) -> Optional[str]:
+        """
+        获取某一页的预合成语音 URL
+
+        已完成时直接返回；正在合成时等待；还没轮到时返回 None（由调用方自行生成）
+        """
+        future = self._future(slide_number)
+        if future.done() or slide_number == self.current:
+            # shield：请求被取消时不影响正在进行的合成
+            return await asyncio.shield(future)
+        return None
+
+    def status(self) -> Dict:
+        ready = sum(1 for slide in self.slides if slide.audio_url)
+        return {"total": len(self.slides), "ready": ready, "current": self.current}
+
+
+class DemoAudioService:
+    """管理所有演示文稿的示范语音预合成"""
+
+    def __init__(self):
+        self._jobs: Dict[str, PresentationAudioJob] = {}
+
+    def start(self, presentation_id: str, slides: List[SlideContent], static_dir: str):
+        """开始后台预合成（上传完成后调用）"""
+        job = PresentationAudioJob(presentation_id, slides, static_dir)
+        self._jobs[presentation_id] = job
+        job.start()
+        # 合成完成后释放任务（结果已记录在 slide.audio_url 上）
+        job._task.add_done_callback(lambda _: self._release(presentation_id, job))
+        logger.info(f"示范语音转入后台预合成: presentation={presentation_id}, {len(slides)} 页")
+
+    def _release(self, presentation_id: str, job: PresentationAudioJob):
+        if self._jobs.get(presentation_id) is job:
+            del self._jobs[presentation_id]
+
+    def has_job(self, presentation_id: str) -> bool:
+        return presentation_id in self._jobs
+
+    async def get_audio_url(self, presentation_id: str, slide_number: int) -> Optional[str]:
+        """
+        获取某一页的预合成语音 URL（正在合成时等待，还没轮到时返回 None）
+
+        没有预合成任务（未开启或已完成并释放）时返回 None，已合成的结果在 slide.audio_url 上
+        """
+        job = self._jobs.get(presentation_id)
+        if job is None:
+            return None
+        return await job.get(slide_number)
+
+    def status(self, presentation_id: str) -> Optional[Dict]:
+        job = self._jobs.get(presentation_id)
+        return job.status() if job else None
+
+    def cancel(self, presentation_id: str):
+        job = self._jobs.pop(presentation_id, None)
+        if job:
+            job.cancel()
+
+    def shutdown(self):
+        """应用关闭时取消所有后台任务"""
+        for presentation_id in list(self._jobs):
+            self.cancel(presentation_id)
+
+
+# 全局示范语音预合成服务实例
+demo_audio_service = DemoAudioService()
@@ -0,0 +1,208 @@
+"""
+幻灯片示范话术后台生成服务
+上传 PPT 后立即返回，示范话术在后台按页生成，优先生成用户正在查看的页面附近
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from app.models.ppt import SlideContent
+from app.core.llm_client import (
+    generate_slide_demo_script, generate_slide_demo_scripts, plan_demo_batches, LLMPriority
+)
+
+logger = logging.getLogger(__name__)
+
+
+def fallback_demo_script(slide: SlideContent) -> str:
+    """生成失败时使用的简单示范"""
+    return f"大家好，请看第 {slide.slide_number} 页。{slide.text_content[:100] if slide.text_content else '这页展示了重要内容'}。"
+
+
+class PresentationDemoJob:
+    """
+    单个演示文稿的示范话术生成任务
+
+    后台任务每次取一批待生成的页面（从用户当前查看的页开始往后，再回头补前面的页），
+    每批生成完再重新按当前页排序，因此用户翻页后很快就会切换到新位置附近。
+    每页对应一个 Future，请求某一页时等待同一个 Future，不会重复生成
+    """
+
+    def __init__(self, presentation_id: str, slides: List[SlideContent], image_paths: Dict[int, str]):
+        self.presentation_id = presentation_id
+        self.slides = {slide.slide_number: slide for slide in slides}
+        self.image_paths = image_paths
+        self.focus = 1  # 用户当前查看的页
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._pending = set(self.slides)  # 尚未开始生成的页
+        self._task: Optional[asyncio.Task] = None
+        self._urgent_tasks = set()  # 用户请求触发的单页生成（保留引用，避免任务被回收）
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+        for task in self._urgent_tasks:
+            task.cancel()
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+
+    def _future(self, slide_number: int) -> asyncio.Future:
+        if slide_number not in self._futures:
+            self._futures[slide_number] = asyncio.get_running_loop().create_future()
+        return self._futures[slide_number]
+
+    def _resolve(self, slide_number: int, script: Optional[str]):
+        """记录生成结果，失败时使用简单示范"""
+        slide = self.slides[slide_number]
+        slide.demo_script = script or fallback_demo_script(slide)
+        future = self._future(slide_number)
+        if not future.done():
+            future.set_result(slide.demo_script)
+
+    def _next_batch(self) -> List[int]:
+        """按与当前页的距离排序，取第一批"""
+        order = sorted(
+            self._pending,
+            key=lambda n: (n < self.focus, abs(n - self.focus))
+        )
+        batches = plan_demo_batches([(n, self.slides[n].text_content) for n in order])
+        return [n for n, _ in batches[0]]
+
+    async def _run(self):
+        try:
+            while self._pending:
+                batch = self._next_batch()
+                self._pending.difference_update(batch)
+                for n in batch:
+                    self._future(n)
+
+                try:
+                    scripts = await generate_slide_demo_scripts(
+                        [(n, self.slides[n].text_content) for n in batch],
+                        slide_image_paths=self.image_paths,
+                        priority=LLMPriority.BULK,
+                        cache=True  # 相同 PPT 重复上传时直接复用
+                    )
+                except Exception as e:
+                    logger.error(f"示范话术生成失败: presentation={self.presentation_id}, {str(e)}")
+                    scripts = {}
+
+                for n in batch:
+                    self._resolve(n, scripts.get(n))
+
+            # 用户请求触发的单页生成可能还没结束（之后不会再有新的）
+            await asyncio.gather(*self._urgent_tasks, return_exceptions=True)
+            logger.info(f"示范话术后台生成完成: presentation={self.presentation_id}")
+        except asyncio.CancelledError:
+            logger.info(f"示范话术后台生成已取消: presentation={self.presentation_id}")
+            raise
+
+    async def _generate_now(self, slide_number: int):
+        """用户请求的页还没开始生成：立即以交互优先级单独生成"""
+        slide = self.slides[slide_number]
+        try:
+            script = await generate_slide_demo_script(
+                slide_number,
+                slide.text_content,
+                self.image_paths.get(slide_number),
+                priority=LLMPriority.INTERACTIVE,
+                cache=True
+            )
+        except Exception as e:
+            logger.error(f"第 {slide_number} 页示范生成失败: {str(e)}")
+            script = None
+        self._resolve(slide_number, script)
+
+    async def get(self, slide_number: int) -> str:
+        """
+        获取某一页的示范话术，未生成完时等待
+
+        同时把该页设为当前页，后台任务后续优先生成它附近的页面
+        """
+        self.focus = slide_number
+        future = self._future(slide_number)
+
+        if slide_number in self._pending:
+            self._pending.discard(slide_number)
+            task = asyncio.create_task(self._generate_now(slide_number))
+            self._urgent_tasks.add(task)
+            task.add_done_callback(self._urgent_tasks.discard)
+
+        # shield：请求被取消时不影响正在进行的生成，其他等待者仍能拿到结果
+        return await asyncio.shield(future)
+
+    async def wait(self, slide_number: int) -> str:
+        """等待某一页按后台顺序生成完（不改变当前页，也不触发单独生成）"""
+        return await asyncio.shield(self._future(slide_number))
+
+    def status(self) -> Dict:
+        ready = sum(1 for slide in self.slides.values() if slide.demo_script)
+        return {"total": len(self.slides), "ready": ready, "focus": self.focus}
+
+
+class DemoScriptService:
+    """管理所有演示文稿的后台示范话术生成"""
+
+    def __init__(self):
+        self._jobs: Dict[str, PresentationDemoJob] = {}
+
+    def start(self, presentation_id: str, slides: List[SlideContent], image_paths: Dict[int, str]):
+        """开始后台生成（上传完成后调用）"""
+        job = PresentationDemoJob(presentation_id, slides, image_paths)
+        self._jobs[presentation_id] = job
+        job.start()
+        # 全部生成完成后释放任务（结果已记录在 slide.demo_script 上）
+        job._task.add_done_callback(lambda _: self._release(presentation_id, job))
+        logger.info(f"示范话术转入后台生成: presentation={presentation_id}, {len(slides)} 页")
+
+    def _release(self, presentation_id: str, job: PresentationDemoJob):
+        if self._jobs.get(presentation_id) is job:
+            del self._jobs[presentation_id]
+
+    def has_job(self, presentation_id: str) -> bool:
+        return presentation_id in self._jobs
+
+    async def get_script(self, presentation_id: str, slide_number: int) -> Optional[str]:
+        """
+        获取某一页的示范话术（等待进行中的生成）
+
+        没有后台任务（未开启或已全部生成完并释放）时返回 None，结果已记录在 slide.demo_script 上
+        """
+        job = self._jobs.get(presentation_id)
+        if job is None:
+            return None
+        return await job.get(slide_number)
+
+    async def wait_script(self, presentation_id: str, slide_number: int) -> Optional[str]:
+        """
+        等待后台生成某一页的示范话术（供后续的后台阶段使用，不影响用户翻页的优先级）
+
+        没有后台任务时返回 None
+        """
+        job = self._jobs.get(presentation_id)
+        if job is None:
+            return None
+        return await job.wait(slide_number)
+
+    def status(self, presentation_id: str) -> Optional[Dict]:
+        job = self._jobs.get(presentation_id)
+        return job.status() if job else None
+
+    def cancel(self, presentation_id: str):
+        job = self._jobs.pop(presentation_id, None)
+        if job:
+            job.cancel()
+
+    def shutdown(self):
+        """应用关闭时取消所有后台任务"""
+        for presentation_id in list(self._jobs):
+            self.cancel(presentation_id)
+
+
+# 全局示范话术服务实例
+demo_script_service = DemoScriptService()
@@ -152,19 +152,15 @@ class UserProfileService:
         """
         分析用户的语速
         """
-        if len(profile.recent_records) < 3:
-            return profile
-
-        # 计算平均每分钟字数
+        # 只有语音练习才有说话时长（由识别时间戳得到）
         valid_records = [r for r in profile.recent_records if r.duration and r.duration > 0]
-        if not valid_records:
+        if len(valid_records) < 3:
             return profile
 
-        words_per_minute = [
-            (r.word_count / r.duration) * 60
-            for r in valid_records
-        ]
-        avg_wpm = sum(words_per_minute) / len(words_per_minute)
+        # 计算平均每分钟字数（按总字数 / 总时长，避免很短的录音影响过大）
+        total_words = sum(r.word_count for r in valid_records)
+        total_minutes = sum(r.duration for r in valid_records) / 60
+        avg_wpm = total_words / total_minutes
 
         # 根据中文语速标准分类
         # 中文正常语速：150-200字/分钟
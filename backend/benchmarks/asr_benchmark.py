@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+语音识别（faster-whisper）基准测试
+
+在本机 CPU 上比较不同模型、精度、线程数、解码配置和并发数下的识别性能，
+输出实时率（RTF）、p50/p95 延迟、峰值内存和吞吐量。完全离线运行：
+模型需要提前下载（或用 --models 指定本地 CTranslate2 模型目录），
+测试音频可以用本地文件，也可以自动合成。
+
+用法（在 backend 目录下）：
+    python benchmarks/asr_benchmark.py --lengths 5,30,120 --models tiny,base \\
+        --compute-types int8 --threads 2,4 --concurrency 1,2 --profiles greedy,beam \\
+        --json results.json --csv results.csv
+
+    # 使用本地录音（文件或目录，支持 wav / webm / mp3 / m4a 等）
+    python benchmarks/asr_benchmark.py --audio fixtures/ --repeat 3
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.core.asr import (
+    ASRWorkerPool, DECODE_PROFILES, asr_cpu_threads, resident_memory_bytes, run_whisper, whisper_models
+)
+from app.core.audio import SAMPLE_RATE, decode_audio
+from app.core.config import settings
+from app.core.stats import percentile
+
+AUDIO_EXTENSIONS = {".wav", ".webm", ".ogg", ".opus", ".mp3", ".m4a", ".mp4", ".flac"}
+
+
+def synthesize_speech_like(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+    合成类语音信号（不需要网络和 TTS）
+
+    基频逐音节变化的谐波 + 每秒约 4 个音节的包络 + 每隔几秒一次停顿。
+    解码耗时与识别出的内容有关，合成音频适合比较不同配置之间的相对差异，
+    绝对数值请用真实录音（--audio）测量
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    syllable = int(0.25 * SAMPLE_RATE)
+
+    # 每个音节一个基频（100-250Hz）
+    f0 = np.repeat(rng.uniform(100, 250, total // syllable + 1), syllable)[:total]
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 9))
+
+    # 音节包络
+    envelope = np.tile(np.hanning(syllable), total // syllable + 1)[:total]
+
+    # 每 2-4 秒停顿 0.4-0.8 秒
+    position = 0
+    while position < total:
+        position += int(rng.uniform(2, 4) * SAMPLE_RATE)
+        pause = int(rng.uniform(0.4, 0.8) * SAMPLE_RATE)
+        envelope[position:position + pause] = 0
+        position += pause
+
+    audio = signal * envelope + rng.normal(0, 0.003, total)
+    return (audio / np.abs(audio).max() * 0.3).astype(np.float32)
+
+
+async def load_fixtures(paths: List[str], lengths: List[float]) -> List[Tuple[str, np.ndarray]]:
+    """读取本地音频（文件或目录）；没有指定时按 lengths 合成"""
+    if not paths:
+        return [(f"synthetic_{seconds:g}s", synthesize_speech_like(seconds, seed=i)) for i, seconds in enumerate(lengths)]
+
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+
+    fixtures = []
+    for path in files:
+        audio = await decode_audio(path.read_bytes())
+        fixtures.append((path.name, audio))
+    return fixtures
+
+
+class PeakRSSSampler:
+    """后台线程定期采样进程常驻内存，记录一组测试期间的峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, resident_memory_bytes() or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_memory_bytes() or 0)
+
+
+async def run_config(
+    fixture: Tuple[str, np.ndarray],
+    profile: str,
+    concurrency: int,
+    repeat: int
+) -> Dict:
+    """同一段音频以给定并发数提交 concurrency * repeat 次，统计延迟和吞吐量"""
+    name, audio = fixture
+    audio_seconds = len(audio) / SAMPLE_RATE
+    # worker 数取自 ASR_WORKERS（run_benchmark 中已设为 concurrency），全部请求一次提交，不限制排队
+    pool = ASRWorkerPool()
+    pool.queue_size = concurrency * repeat
+
+    latencies: List[float] = []
+
+    async def one_request():
+        start = time.perf_counter()
+        await pool.run(run_whisper, audio, 0.0, profile, True)
+        latencies.append(time.perf_counter() - start)
+
+    try:
+        with PeakRSSSampler() as sampler:
+            wall_start = time.perf_counter()
+            await asyncio.gather(*[one_request() for _ in range(concurrency * repeat)])
+            wall = time.perf_counter() - wall_start
+    finally:
+        pool.shutdown()
+
+    rtfs = [latency / audio_seconds for latency in latencies]
+    return {
+        "fixture": name,
+        "audio_seconds": round(audio_seconds, 2),
+        "profile": profile,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "rtf_p50": round(percentile(rtfs, 50), 4),
+        "rtf_p95": round(percentile(rtfs, 95), 4),
+        "throughput_rps": round(len(latencies) / wall, 3),
+        "throughput_audio_x": round(audio_seconds * len(latencies) / wall, 2),
+        "peak_rss_mb": round(sampler.peak / 1024 / 1024, 1),
+    }
+
+
+async def probe_model(model: str, compute_type: str) -> bool:
+    """试加载一次模型；失败时整个 模型 / 精度 组合跳过，不再对每组线程数、并发数重复尝试"""
+    whisper_models.clear()
+    try:
+        await asyncio.to_thread(whisper_models.get)
+        return True
+    except Exception as e:
+        print(f"⚠️  跳过 {model}/{compute_type}: 模型加载失败（需要提前下载）: {e}")
+        return False
+
+
+async def run_benchmark(args) -> List[Dict]:
+    fixtures = await load_fixtures(args.audio, args.lengths)
+    print(f"测试音频: {', '.join(f'{name} ({len(audio) / SAMPLE_RATE:.1f}s)' for name, audio in fixtures)}")
+
+    settings.WHISPER_DEVICE = "cpu"
+    settings.ASR_EXECUTOR = "thread"
+    rows = []
+
+    for model in args.models:
+        for compute_type in args.compute_types:
+            settings.WHISPER_MODEL = model
+            settings.WHISPER_COMPUTE_TYPE = compute_type
+            if not await probe_model(model, compute_type):
+                continue
+
+            for threads in args.threads:
+                for concurrency in args.concurrency:
+                    # 线程数和 worker 数在加载模型时确定，每组配置重新加载
+                    settings.ASR_CPU_THREADS = threads
+                    settings.ASR_WORKERS = concurrency
+                    whisper_models.clear()
+
+                    load_start = time.perf_counter()
+                    await asyncio.to_thread(whisper_models.get)
+                    load_seconds = time.perf_counter() - load_start
+
+                    # 预热一次，排除首次推理的初始化开销
+                    if args.warmup:
+                        await asyncio.to_thread(run_whisper, fixtures[0][1][:SAMPLE_RATE * 5], 0.0, "greedy", False)
+
+                    for fixture in fixtures:
+                        for profile in args.profiles:
+                            row = {
+                                "model": model,
+                                "compute_type": compute_type,
+                                "cpu_threads": asr_cpu_threads(),
+                                "load_seconds": round(load_seconds, 2),
+                            }
+                            row.update(await run_config(fixture, profile, concurrency, args.repeat))
+                            rows.append(row)
+                            print(
+                                f"{model:>8} {compute_type:>8} 线程={row['cpu_threads']:<2} 并发={concurrency:<2} "
+                                f"{profile:>7} {row['fixture']:<20} RTF p50={row['rtf_p50']:.3f} "
+                                f"p95 延迟={row['latency_p95_ms']:.0f}ms 吞吐={row['throughput_audio_x']:.1f}x "
+                                f"峰值内存={row['peak_rss_mb']:.0f}MB"
+                            )
+
+    whisper_models.clear()
+    return rows
+
+
+def write_results(rows: List[Dict], json_path: str, csv_path: str):
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"✅ JSON 结果: {json_path}")
+    if csv_path and rows:
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"✅ CSV 结果: {csv_path}")
+
+
+def parse_args(argv=None):
+    def str_list(value: str) -> List[str]:
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+    def int_list(value: str) -> List[int]:
+        return [int(item) for item in str_list(value)]
+
+    def float_list(value: str) -> List[float]:
+        return [float(item) for item in str_list(value)]
+
+    parser = argparse.ArgumentParser(description="faster-whisper 识别性能基准测试（离线，CPU）")
+    parser.add_argument("--audio", nargs="*", default=[], help="本地音频文件或目录；不指定时自动合成")
+    parser.add_argument("--lengths", type=float_list, default=[5.0, 30.0, 120.0], help="合成音频的时长（秒），逗号分隔")
+    parser.add_argument("--models", type=str_list, default=[settings.WHISPER_MODEL], help="模型名或本地模型目录，逗号分隔")
+    parser.add_argument("--compute-types", type=str_list, default=[settings.WHISPER_COMPUTE_TYPE], help="计算精度，如 int8,float32")
+    parser.add_argument("--threads", type=int_list, default=[0], help="每路解码的 CPU 线程数，0 表示按核数平均分配")
+    parser.add_argument("--concurrency", type=int_list, default=[1], help="同时解码的数量")
+    parser.add_argument("--profiles", type=str_list, default=["greedy", "beam"], help=f"解码配置：{','.join(DECODE_PROFILES)}")
+    parser.add_argument("--repeat", type=int, default=2, help="每个并发槽位重复的次数")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="不做预热")
+    parser.add_argument("--json", default="", help="JSON 结果输出路径")
+    parser.add_argument("--csv", default="", help="CSV 结果输出路径")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("🔍 开始语音识别基准测试...")
+    results = asyncio.run(run_benchmark(args))
+    write_results(results, args.json, args.csv)
+    if not results:
+        sys.exit(1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+测试 Ollama 多节点路由
+在本进程内启动两个模拟 Ollama 节点，不需要真实的 Ollama
+"""
+import asyncio
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(__file__))
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.llm_client import LLMClient, CircuitOpenError, Message
+
+
+def make_fake_ollama(name: str, delay: float) -> FastAPI:
+    """模拟 Ollama：/api/chat 回复节点名，/api/tags 用于健康检查"""
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.down = False
+
+    @app.get("/api/tags")
+    async def tags():
+        if app.state.down:
+            return JSONResponse({"error": "down"}, status_code=503)
+        return {"models": []}
+
+    @app.post("/api/chat")
+    async def chat():
+        app.state.calls += 1
+        await asyncio.sleep(delay)
+        return {"message": {"role": "assistant", "content": name}, "done": True}
+
+    return app
+
+
+async def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def run_router_checks():
+    ports = (11601, 11602)
+    apps = [make_fake_ollama(f"node{i}", 0.2) for i in range(len(ports))]
+    servers = [await start_server(app, port) for app, port in zip(apps, ports)]
+
+    original = (settings.OLLAMA_BASE_URLS, settings.OLLAMA_HEALTH_CHECK_INTERVAL)
+    settings.OLLAMA_BASE_URLS = ",".join(f"http://127.0.0.1:{p}" for p in ports)
+    settings.OLLAMA_HEALTH_CHECK_INTERVAL = 0
+    client = LLMClient()
+    client.use_mock = False
+    client.use_opensource = True
+    await client.startup()
+
+    messages = [Message(role="user", content="你好")]
+
+    def distinct(i: int):
+        # 内容不同的请求（相同内容的并发请求会被合并为一次）
+        return [Message(role="user", content=f"你好 {i}")]
+
+    try:
+        # 测试 1: 并发请求均匀分配到两个节点
+        print("\n📝 测试 1: 负载均衡")
+        replies = await asyncio.gather(*[client.call_llm(distinct(i)) for i in range(4)])
+        print(f"  回复节点: {replies}")
+        assert sorted(replies) == ["node0", "node0", "node1", "node1"], replies
+
+        # 测试 2: 同一会话固定到同一节点
+        print("\n📝 测试 2: 会话粘性")
+        first = await client.call_llm(messages, session_id="s1")
+        await asyncio.gather(*[client.call_llm(distinct(i)) for i in range(3)])
+        for _ in range(3):
+            assert await client.call_llm(messages, session_id="s1") == first
+
+        # 测试 3: 节点下线后自动切换，恢复后重新加入
+        print("\n📝 测试 3: 故障切换")
+        down = int(first[-1])
+        apps[down].state.down = True
+        await client.router.check_health()
+        other = f"node{1 - down}"
+        assert await client.call_llm(messages, session_id="s1") == other
+        assert client.health()["healthy"]
+
+        apps[1 - down].state.down = True
+        await client.router.check_health()
+        assert not client.health()["healthy"]
+        try:
+            await client.call_llm(messages)
+            raise AssertionError("所有节点下线时应快速失败")
+        except CircuitOpenError:
+            pass
+
+        apps[down].state.down = False
+        apps[1 - down].state.down = False
+        await client.router.check_health()
+        replies = await asyncio.gather(*[client.call_llm(distinct(i)) for i in range(2)])
+        assert sorted(replies) == ["node0", "node1"], replies
+        print("✅ 多节点路由测试通过")
+    finally:
+        await client.shutdown()
+        settings.OLLAMA_BASE_URLS, settings.OLLAMA_HEALTH_CHECK_INTERVAL = original
+        for server in servers:
+            server.should_exit = True
+        await asyncio.sleep(0.2)
+
+
+def test_llm_router():
+    asyncio.run(run_router_checks())
+
+
+if __name__ == "__main__":
+    print("🔍 开始测试 Ollama 多节点路由...")
+    test_llm_router()